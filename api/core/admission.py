@@ -0,0 +1,268 @@
+"""
+Adaptive concurrency limiting and load shedding
+
+Sync endpoints run in anyio's threadpool. Once it is busy, further requests
+wait for a thread in an unbounded, invisible queue, and during a spike their
+latency grows until clients time out. AdmissionMiddleware admits requests up
+to a concurrency limit instead. Requests beyond it wait in a bounded queue
+and are shed with a fast 503 (and Retry-After) when the queue is full or
+they have waited longer than their class's queue-time target.
+
+Requests are classified by route:
+
+- ingest: writes (meal logging, webhooks, registration), any non-GET request,
+- read: user-facing reads (status, meals, dashboard, BMR),
+- admin: /admin scans.
+
+ADMISSION_CLASSES sets, for each class, its own in-flight cap, queue-time
+target (milliseconds) and queue size. The classes are listed in priority
+order. A freed slot goes to the highest-priority waiting request, and a new
+request doesn't jump ahead of waiting higher-priority ones. Ingest keeps
+flowing while analytics waits or is shed, and the short targets of read and
+admin requests shed them first.
+
+The overall limit adapts to latency, in the manner of the gradient
+algorithm: while recent latency of ingest and read requests stays near its
+long-term average the limit grows toward THREADPOOL_SIZE, and when latency
+rises (the threads are contending for the CPU, or the store is slow) it
+shrinks toward ADMISSION_MIN_LIMIT, so queueing happens here where it is
+bounded rather than among the threads.
+
+Event streams and anything outside /api/v1 are not limited. State is per
+process and only touched from the event loop.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional
+
+import anyio.to_thread
+from starlette.responses import JSONResponse
+
+from api.core.metrics import LOAD_SHED
+
+# Set to "false" to remove the admission middleware entirely
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+
+# Worker threads for sync endpoints (anyio's default is 40); also the highest concurrency limit
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "40"))
+
+# Lowest the adaptive concurrency limit goes
+ADMISSION_MIN_LIMIT = int(os.getenv("ADMISSION_MIN_LIMIT", "4"))
+
+# Route classes in priority order: comma-separated name=max_in_flight:queue_target_ms:queue_size
+ADMISSION_CLASSES = os.getenv("ADMISSION_CLASSES", "ingest=40:1000:256,read=40:250:256,admin=2:100:4")
+
+# Requests under these path prefixes are never limited (long-lived event streams)
+ADMISSION_EXCLUDE_PREFIXES = ("/api/v1/stream/",)
+
+API_PREFIX = "/api/v1/"
+ADMIN_PREFIX = "/api/v1/admin/"
+
+# Classes whose latency steers the limit (admin scans are expected to be slow)
+ADAPTIVE_CLASSES = ("ingest", "read")
+
+# Latency ratio (recent / long-term) tolerated before the limit shrinks
+LATENCY_TOLERANCE = 1.5
+
+# Weights of the recent and long-term latency averages, and of each limit update
+SHORT_WEIGHT = 0.1
+LONG_WEIGHT = 2 / (600 + 1)
+LIMIT_SMOOTHING = 0.2
+
+
+class RouteClass(NamedTuple):
+    name: str
+    priority: int               # 0 is served first
+    max_in_flight: int
+    queue_target: float         # seconds a request may wait before it is shed
+    queue_size: int
+
+
+def parse_classes(spec: str) -> List[RouteClass]:
+    classes = []
+    for priority, entry in enumerate(part.strip() for part in spec.split(",") if part.strip()):
+        name, _, limits = entry.partition("=")
+        try:
+            max_in_flight, queue_target_ms, queue_size = limits.split(":")
+            classes.append(RouteClass(name, priority, int(max_in_flight), float(queue_target_ms) / 1000, int(queue_size)))
+        except ValueError:
+            raise ValueError(f"Invalid ADMISSION_CLASSES entry '{entry}', expected name=max_in_flight:queue_target_ms:queue_size")
+    return classes
+
+
+class AdmissionController:
+    """Concurrency limit with per-class caps and bounded, prioritized wait queues"""
+
+    def __init__(self, classes: List[RouteClass], min_limit: int = ADMISSION_MIN_LIMIT, max_limit: int = THREADPOOL_SIZE):
+        self.classes = sorted(classes, key=lambda route_class: route_class.priority)
+        self.by_name = {route_class.name: route_class for route_class in self.classes}
+        self.min_limit = min(min_limit, max_limit)
+        self.max_limit = max_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._in_flight: Dict[str, int] = {route_class.name: 0 for route_class in self.classes}
+        self._queues: Dict[str, Deque[asyncio.Future]] = {route_class.name: deque() for route_class in self.classes}
+        self._short_latency: Optional[float] = None
+        self._long_latency: Optional[float] = None
+        self._counts: Dict[str, Dict[str, int]] = {
+            route_class.name: {"admitted": 0, "queued": 0, "shed_queue_full": 0, "shed_queue_timeout": 0}
+            for route_class in self.classes
+        }
+
+    def _can_admit(self, route_class: RouteClass) -> bool:
+        return self.in_flight < int(self.limit) and self._in_flight[route_class.name] < route_class.max_in_flight
+
+    def _admit(self, route_class: RouteClass):
+        self.in_flight += 1
+        self._in_flight[route_class.name] += 1
+        self._counts[route_class.name]["admitted"] += 1
+
+    async def acquire(self, route_class: RouteClass) -> Optional[str]:
+        """
+        Wait for a slot
+
+        Returns: None once admitted (release() must follow), or why the request was shed
+        """
+        # Waiting requests of higher classes are only ever held back by their own cap (release() admits
+        # them first), so they don't stand in the way of a request that fits under the limit
+        queue = self._queues[route_class.name]
+        if not queue and self._can_admit(route_class):
+            self._admit(route_class)
+            return None
+        if len(queue) >= route_class.queue_size:
+            self._counts[route_class.name]["shed_queue_full"] += 1
+            return "queue_full"
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        queue.append(waiter)
+        self._counts[route_class.name]["queued"] += 1
+        timer = loop.call_later(route_class.queue_target, self._expire, route_class, waiter)
+        try:
+            admitted = await waiter
+        except asyncio.CancelledError:
+            # Client gone while waiting; hand back a slot granted in the meantime
+            if waiter.done() and not waiter.cancelled() and waiter.result():
+                self.release(route_class)
+            elif waiter in queue:
+                queue.remove(waiter)
+            raise
+        finally:
+            timer.cancel()
+        if not admitted:
+            self._counts[route_class.name]["shed_queue_timeout"] += 1
+            return "queue_timeout"
+        return None
+
+    def _expire(self, route_class: RouteClass, waiter: asyncio.Future):
+        if not waiter.done():
+            self._queues[route_class.name].remove(waiter)
+            waiter.set_result(False)
+
+    def release(self, route_class: RouteClass, latency: Optional[float] = None):
+        """Free a slot, adapt the limit to the request's latency and admit waiting requests"""
+        self.in_flight -= 1
+        self._in_flight[route_class.name] -= 1
+        if latency is not None:
+            self._observe(latency)
+
+        # Highest priority first; lower classes only get slots the higher ones can't use
+        for waiting_class in self.classes:
+            queue = self._queues[waiting_class.name]
+            while queue and self._can_admit(waiting_class):
+                waiter = queue.popleft()
+                self._admit(waiting_class)
+                waiter.set_result(True)
+
+    def _observe(self, latency: float):
+        if self._short_latency is None:
+            self._short_latency = self._long_latency = latency
+            return
+        self._short_latency += SHORT_WEIGHT * (latency - self._short_latency)
+        self._long_latency += LONG_WEIGHT * (latency - self._long_latency)
+        if self._long_latency > 2 * self._short_latency:
+            # Recover quickly after a period of unusually slow requests
+            self._long_latency *= 0.95
+        if self.in_flight < self.limit / 2:
+            # Too little load to say anything about the limit
+            return
+
+        gradient = max(0.5, min(1.0, LATENCY_TOLERANCE * self._long_latency / self._short_latency))
+        target = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit + LIMIT_SMOOTHING * (target - self.limit)
+        self.limit = max(float(self.min_limit), min(float(self.max_limit), limit))
+
+    def stats(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "latency_ms": {
+                "recent": round(self._short_latency * 1000, 2) if self._short_latency is not None else None,
+                "long_term": round(self._long_latency * 1000, 2) if self._long_latency is not None else None
+            },
+            "classes": {
+                route_class.name: {
+                    "priority": route_class.priority,
+                    "max_in_flight": route_class.max_in_flight,
+                    "queue_target_ms": route_class.queue_target * 1000,
+                    "queue_size": route_class.queue_size,
+                    "in_flight": self._in_flight[route_class.name],
+                    "waiting": len(self._queues[route_class.name]),
+                    **self._counts[route_class.name]
+                }
+                for route_class in self.classes
+            }
+        }
+
+
+admission = AdmissionController(parse_classes(ADMISSION_CLASSES))
+
+
+def configure_threadpool(size: int = THREADPOOL_SIZE):
+    """Size anyio's default thread limiter; call from the event loop at startup"""
+    anyio.to_thread.current_default_thread_limiter().total_tokens = size
+
+
+def classify(scope) -> Optional[str]:
+    """Route class name for a request, or None if it isn't limited"""
+    path = scope["path"]
+    if not path.startswith(API_PREFIX) or path.startswith(ADMISSION_EXCLUDE_PREFIXES):
+        return None
+    if path.startswith(ADMIN_PREFIX):
+        return "admin"
+    if scope["method"] not in ("GET", "HEAD"):
+        return "ingest"
+    return "read"
+
+
+class AdmissionMiddleware:
+    """ASGI middleware holding each limited request to a slot of the admission controller"""
+
+    def __init__(self, app, controller: AdmissionController = admission):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        route_class = self.controller.by_name.get(classify(scope)) if scope["type"] == "http" else None
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        shed = await self.controller.acquire(route_class)
+        if shed is not None:
+            LOAD_SHED.inc(route_class.name, shed)
+            response = JSONResponse({"detail": "Server busy; retry later"}, status_code=503, headers={"Retry-After": "1"})
+            await response(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            latency = time.perf_counter() - start if route_class.name in ADAPTIVE_CLASSES else None
+            self.controller.release(route_class, latency)
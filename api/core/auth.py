@@ -1,10 +1,28 @@
 """
 Enhanced authentication for BMR Tracker with user-specific access control
+
+API keys are resolved through the key registry (api.core.keys). The resolved
+principal (an immutable AuthUser) is cached per (key digest, X-User-Id) in a
+small LRU, so a request with a known key costs one HMAC and one cache hit.
+Entries expire after API_KEY_CACHE_TTL seconds, which bounds how long a key
+revoked by another worker keeps working in this one; revoking a key clears
+its entries in the revoking worker immediately.
+
+Middleware that only needs to know what a key is (admin, bound to a user)
+uses lookup_key, which caches unknown keys as well as registered ones, each
+in its own LRU so a flood of invalid keys can't evict valid ones, and runs
+registry misses through run_store so no store query blocks the event loop.
 """
+import os
+
 from fastapi import HTTPException, Header, Depends, Security, status
 from fastapi.security import APIKeyHeader
 from typing import Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+
+from api.core.cache import UserCache
+from api.core.keys import ADMIN_API_KEY, SECRET_API_KEY, ApiKey, api_keys, hash_key
+from api.db.async_store import run_store
 
 # Security scheme definitions
 API_KEY_NAME = "X-API-Key"
@@ -14,17 +32,85 @@ api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=True)
 # Define User ID header - keep auto_error=False so it doesn't require it globally
 user_id_header = APIKeyHeader(name=USER_ID_NAME, auto_error=False)
 
-# API keys for different roles
-# In a production environment, these would be stored securely in environment variables
-# For demonstration purposes, we're using the actual string values
-SECRET_API_KEY = "SECRET_API_KEY"  # For regular users - Use this exact string in X-API-Key header
-ADMIN_API_KEY = "ADMIN_API_KEY"    # For admin access - Use this exact string in X-API-Key header
+# Maximum number of cached principals per process
+API_KEY_CACHE_SIZE = int(os.getenv("API_KEY_CACHE_SIZE", "1024"))
+
+# Seconds a resolved principal is reused without looking the key up again
+API_KEY_CACHE_TTL = float(os.getenv("API_KEY_CACHE_TTL", "30"))
 
 class AuthUser(BaseModel):
     """Authentication user model with role-based access control"""
+    # Immutable, so cached instances can be shared between requests
+    model_config = ConfigDict(frozen=True)
+
     user_id: str
     role: str = "user"  # "user" or "admin"
 
+# (key digest, X-User-Id) -> AuthUser; the digest comes first so a key's entries can be dropped together
+principal_cache = UserCache(API_KEY_CACHE_SIZE, API_KEY_CACHE_TTL)
+
+# (key digest,) -> ApiKey, and (key digest,) -> True for digests no key is registered under
+key_cache = UserCache(API_KEY_CACHE_SIZE, API_KEY_CACHE_TTL)
+unknown_key_cache = UserCache(API_KEY_CACHE_SIZE, API_KEY_CACHE_TTL)
+
+def _unauthorized(detail: str, header: str = API_KEY_NAME) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": f"APIKey {header}"}
+    )
+
+def resolve_principal(key_hash: str, user_id: Optional[str]) -> AuthUser:
+    """Look up a key digest and build the principal it grants, without the cache"""
+    key = api_keys.lookup(key_hash)
+    if key is None:
+        # Invalid API key
+        raise _unauthorized("Invalid API key")
+
+    if key.role == "admin":
+        # Admin can access any resource
+        return AuthUser(user_id=user_id or key.user_id or "admin", role="admin")
+
+    if key.user_id is not None:
+        # Bound keys act as their own user only
+        if user_id and user_id != key.user_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="API key is not valid for this user"
+            )
+        return AuthUser(user_id=key.user_id, role="user")
+
+    # Regular users need to provide their user_id
+    if not user_id:
+        raise _unauthorized("User ID required for non-admin access", USER_ID_NAME)
+    return AuthUser(user_id=user_id, role="user")
+
+async def lookup_key(api_key: str) -> Optional[ApiKey]:
+    """The registered key for a presented key, or None; cached, and looked up off the event loop on a miss"""
+    key_hash = hash_key(api_key)
+    key = key_cache.get((key_hash,))
+    if key is not None:
+        return key
+    if unknown_key_cache.get((key_hash,)) is not None:
+        return None
+    key = await run_store(api_keys.lookup, key_hash)
+    if key is None:
+        unknown_key_cache.put((key_hash,), True)
+    else:
+        key_cache.put((key_hash,), key)
+    return key
+
+async def is_admin_key(api_key: str) -> bool:
+    key = await lookup_key(api_key)
+    return key is not None and key.role == "admin"
+
+def revoke_api_key(key_hash: str) -> bool:
+    """Revoke an issued key and forget its cached principals"""
+    revoked = api_keys.revoke(key_hash)
+    principal_cache.invalidate_user(key_hash)
+    key_cache.invalidate_user(key_hash)
+    return revoked
+
 # Authentication dependency
 def get_current_user(
     api_key: str = Security(api_key_header),
@@ -32,37 +118,20 @@ def get_current_user(
 ) -> AuthUser:
     """
     Authenticate user based on API key and return AuthUser object
-    
-    For non-admin users, X-User-Id must be provided
-    For admin users, X-User-Id is optional
+
+    For unbound user keys, X-User-Id must be provided
+    For admin keys and keys bound to a user, X-User-Id is optional
     """
     if not api_key:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="API key required",
-            headers={"WWW-Authenticate": f"APIKey {API_KEY_NAME}"}
-        )
+        raise _unauthorized("API key required")
 
-    if api_key == ADMIN_API_KEY:
-        # Admin can access any resource
-        return AuthUser(user_id=user_id or "admin", role="admin")
-
-    elif api_key == SECRET_API_KEY:
-        # Regular users need to provide their user_id
-        if not user_id:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User ID required for non-admin access",
-                headers={"WWW-Authenticate": f"APIKey {USER_ID_NAME}"}
-            )
-        return AuthUser(user_id=user_id, role="user")
-
-    # Invalid API key
-    raise HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Invalid API key",
-        headers={"WWW-Authenticate": f"APIKey {API_KEY_NAME}"}
-    )
+    key_hash = hash_key(api_key)
+    cache_key = (key_hash, user_id)
+    principal = principal_cache.get(cache_key)
+    if principal is None:
+        principal = resolve_principal(key_hash, user_id)
+        principal_cache.put(cache_key, principal)
+    return principal
 
 # Check if user has access to a specific user_id
 def check_user_access(auth_user: AuthUser, user_id: str) -> bool:
@@ -70,7 +139,7 @@ def check_user_access(auth_user: AuthUser, user_id: str) -> bool:
     # Admins can access any user
     if auth_user.role == "admin":
         return True
-    
+
     # Regular users can only access their own resources
     return auth_user.user_id == user_id
 
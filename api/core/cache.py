@@ -0,0 +1,144 @@
+"""
+Per-user LRU/TTL cache for computed read responses
+
+Entries are keyed by a tuple whose first element is the userId, so the ingest
+path can drop everything cached for a user (or for one of their days) the
+moment it logs a meal. Each entry also carries a stamp supplied by the caller
+(the user's version for status responses); a hit is only served if the
+caller's current stamp matches, which keeps workers sharing a store correct
+even though each holds its own cache.
+
+Size is bounded (least recently used entries are evicted first) and entries
+expire after a TTL. Hit/miss/eviction counters are exposed through stats().
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from api.core.memory import estimate_size, usage
+
+# Maximum number of cached status responses per process
+STATUS_CACHE_SIZE = int(os.getenv("STATUS_CACHE_SIZE", "4096"))
+
+# Seconds before a cached status response is recomputed regardless of writes
+STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL", "300"))
+
+_MISSING = object()
+
+
+class UserCache:
+    """Thread-safe LRU cache with TTL expiry and per-user invalidation"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple, Tuple[Any, Any, float]]" = OrderedDict()  # key -> (stamp, value, expires)
+        self._keys_by_user: Dict[str, Set[Tuple]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Tuple, stamp: Hashable = None) -> Optional[Any]:
+        """Cached value for key, or None if absent, expired or stale for this stamp"""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return None
+            cached_stamp, value, expires = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            if cached_stamp != stamp:
+                self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Tuple, value: Any, stamp: Hashable = None):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self._entries[key] = (stamp, value, time.monotonic() + self.ttl)
+            self._keys_by_user.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.maxsize:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: Tuple):
+        del self._entries[key]
+        keys = self._keys_by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[key[0]]
+
+    def invalidate_user(self, user_id: str, dates: Optional[Iterable[str]] = None) -> int:
+        """
+        Drop a user's cached entries
+
+        With dates, only entries for those days and the all-time entries
+        (date None) are dropped; otherwise everything for the user goes.
+        """
+        if user_id not in self._keys_by_user:
+            return 0
+        affected = None if dates is None else {None, *dates}
+        with self._lock:
+            keys = [
+                key for key in self._keys_by_user.get(user_id, ())
+                if affected is None or key[1] in affected
+            ]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> int:
+        """Drop every entry; returns how many were removed"""
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+            self._keys_by_user.clear()
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "users": len(self._keys_by_user),
+                "max_entries": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+    def memory_usage(self) -> dict:
+        """Entry count and estimated bytes, including the per-user key index"""
+        with self._lock:
+            entries = dict(self._entries)
+            keys_by_user = self._keys_by_user.copy()
+        # The index's sets hold the same key tuples as the entries
+        index_size = estimate_size(keys_by_user, shallow=True)
+        return usage(len(entries), estimate_size(entries) + index_size)
+
+
+# Nutrition status responses, keyed by (userId, date or None for all time, catalog version)
+status_cache = UserCache(STATUS_CACHE_SIZE, STATUS_CACHE_TTL)
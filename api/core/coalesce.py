@@ -0,0 +1,186 @@
+"""
+Single-flight coalescing for identical concurrent read requests
+
+A read endpoint opts in with the @coalesce(name) decorator. While one request
+for a given set of parameters is being computed, identical requests arriving
+in the meantime wait for it instead of running the same work again; they all
+receive the same serialized JSON body (or the same error). The body is
+produced by the fast serializer in api.core.responses, so coalesced handlers
+must return plain dicts of their documented shape.
+
+Sync endpoints run in the threadpool, so waiters block their worker thread on
+an Event while the leader computes; waiters of async endpoints await an
+asyncio.Event on the event loop instead. Nothing is cached: once the leader
+finishes, the next request starts a new flight.
+
+Coalesced endpoints must only take hashable parameters (path/query values);
+FastAPI passes them as keyword arguments, which form the flight key together
+with flight_version. Wrappers outside the endpoint set flight_version to the
+version their response is labelled with (user_etag sets the version its ETag
+names), so a request only joins a flight that started at that version or
+later and never gets a body older than its label.
+
+If the leader's request is cancelled (the client went away), its waiters
+don't inherit the cancellation: the first of them starts a new flight.
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from fastapi.responses import Response
+
+from api.core.responses import dumps
+
+# Part of the flight key set by outer wrappers: the version the response will be labelled with
+flight_version: contextvars.ContextVar[Optional[Hashable]] = contextvars.ContextVar("flight_version", default=None)
+
+
+class _Flight:
+    __slots__ = ("done", "body", "error", "abandoned")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.body = None
+        self.error = None
+        # The leader stopped without a result or an error to share (cancelled, interrupted)
+        self.abandoned = False
+
+
+class _AsyncFlight:
+    __slots__ = ("done", "body", "error", "abandoned")
+
+    def __init__(self):
+        self.done = asyncio.Event()
+        self.body = None
+        self.error = None
+        self.abandoned = False
+
+
+class SingleFlight:
+    """Runs at most one computation per key at a time and shares its result"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def _join(self, key: Hashable, flight_type: type):
+        """(flight, whether the caller leads it)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = flight_type()
+                self.executions += 1
+            else:
+                self.coalesced += 1
+        return flight, leader
+
+    def do(self, key: Hashable, compute: Callable[[], bytes]) -> bytes:
+        while True:
+            flight, leader = self._join(key, _Flight)
+            if leader:
+                break
+            flight.done.wait()
+            if flight.abandoned:
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return flight.body
+
+        try:
+            flight.body = compute()
+        except Exception as e:
+            flight.error = e
+            raise
+        except BaseException:
+            flight.abandoned = True
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.body
+
+    async def do_async(self, key: Hashable, compute: Callable[[], Awaitable[bytes]]) -> bytes:
+        """do() for async endpoints, on the event loop"""
+        while True:
+            flight, leader = self._join(key, _AsyncFlight)
+            if leader:
+                break
+            await flight.done.wait()
+            if flight.abandoned:
+                # The leader's request was cancelled; that isn't this request's error
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return flight.body
+
+        try:
+            flight.body = await compute()
+        except Exception as e:
+            flight.error = e
+            raise
+        except BaseException:
+            flight.abandoned = True
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.body
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.executions + self.coalesced
+            return {
+                "in_flight": len(self._flights),
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "coalesced_ratio": round(self.coalesced / requests, 4) if requests else 0.0
+            }
+
+
+# Route name -> SingleFlight, for the admin metrics endpoint
+flight_groups: Dict[str, SingleFlight] = {}
+
+
+def _render(result: Any) -> bytes:
+    return result.body if isinstance(result, Response) else dumps(result)
+
+
+def coalesce(name: str):
+    """Opt a JSON read endpoint in to single-flight coalescing"""
+    group = flight_groups.setdefault(name, SingleFlight(name))
+
+    def decorator(endpoint: Callable[..., Any]):
+        if inspect.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def async_wrapper(**params):
+                key = (flight_version.get(), *sorted(params.items()))
+
+                async def compute():
+                    return _render(await endpoint(**params))
+
+                body = await group.do_async(key, compute)
+                return Response(content=body, media_type="application/json")
+            return async_wrapper
+
+        @functools.wraps(endpoint)
+        def wrapper(**params):
+            key = (flight_version.get(), *sorted(params.items()))
+            # Serialize once in the leader; every caller gets its own Response around the shared body
+            body = group.do(key, lambda: _render(endpoint(**params)))
+            return Response(content=body, media_type="application/json")
+        return wrapper
+
+    return decorator
+
+
+def coalescing_stats() -> dict:
+    return {name: group.stats() for name, group in flight_groups.items()}
@@ -0,0 +1,124 @@
+"""
+On-the-fly gzip compression of API responses
+
+CompressionMiddleware gzips a response when the client accepts gzip, the body
+is at least COMPRESS_MIN_SIZE bytes, it is of a compressible type (JSON,
+text, JavaScript, SVG) and it isn't encoded already. Meal histories and the
+food list shrink several times over; small bodies are sent as they are,
+since compressing them costs more than the bytes it saves. A 16 KB meal
+history takes about 0.2 ms at the default level; very large bodies are
+compressed in the threadpool so they don't stall the event loop.
+
+Only responses sent in a single body message are compressed, which covers
+every regular JSON response. Streaming responses (server-sent events, large
+files) pass through untouched, so nothing is buffered that the client is
+waiting on. The frontend is precompressed at build time instead (see
+api.core.static).
+"""
+import os
+import zlib
+from typing import FrozenSet
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from api.core.metrics import COMPRESSED_RESPONSES, COMPRESSION_BYTES_SAVED
+
+# Smallest response body (bytes) worth compressing
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+
+# zlib compression level, 1 (fastest) to 9 (smallest)
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "4"))
+
+# Bodies at least this large (bytes) are compressed in the threadpool rather than on the event loop
+OFFLOAD_SIZE = 256 * 1024
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+def accepted_encodings(accept_encoding: str) -> FrozenSet[str]:
+    """Content codings an Accept-Encoding header allows (those not weighted q=0)"""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(coding)
+    return frozenset(accepted)
+
+
+def is_compressible(content_type: str) -> bool:
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith("text/event-stream")
+
+
+class CompressionMiddleware:
+    """ASGI middleware gzipping large single-message responses for clients that accept it"""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE, level: int = COMPRESS_LEVEL):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.level = level
+
+    def compress(self, body: bytes) -> bytes:
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)  # 31: gzip container
+        return compressor.compress(body) + compressor.flush()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or "gzip" not in accepted_encodings(Headers(scope=scope).get("accept-encoding", "")):
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if ("content-encoding" in headers
+                        or "content-range" in headers
+                        or int(headers.get("content-length", self.minimum_size)) < self.minimum_size
+                        or not is_compressible(headers.get("content-type", ""))):
+                    # Decided by the headers alone, so e.g. event streams start right away
+                    await send(message)
+                else:
+                    # Held back until the first body message shows whether to compress
+                    start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                await send(start)
+                await send(message)
+                return
+
+            if len(body) >= OFFLOAD_SIZE:
+                compressed = await run_in_threadpool(self.compress, body)
+            else:
+                compressed = self.compress(body)
+            if "accept-encoding" not in headers.get("vary", "").lower():
+                headers.add_vary_header("Accept-Encoding")
+            if len(compressed) < len(body):
+                headers["Content-Encoding"] = "gzip"
+                headers["Content-Length"] = str(len(compressed))
+                COMPRESSED_RESPONSES.inc()
+                COMPRESSION_BYTES_SAVED.inc(value=len(body) - len(compressed))
+                message = {"type": "http.response.body", "body": compressed}
+            await send(start)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,107 @@
+"""
+Conditional GETs for per-user resources
+
+Endpoints opt in with @user_etag(). The user's version counter (bumped by the
+store on every change to the user's record or meals) becomes a weak ETag. When
+the request's If-None-Match already names that ETag, the wrapper answers 304
+Not Modified before the endpoint runs, so polling clients cost one version
+lookup instead of a full rebuild and serialization.
+
+The ETag is the same for every representation of a user (path and query
+parameters differ per URL, and clients cache per URL). It names the version
+read before the endpoint runs, so the body is at least that recent. Coalesced
+endpoints (api.core.coalesce) get the ETag as their flight_version, so a
+request never shares a body computed before the version its ETag names.
+
+Sync and async endpoints are both supported. For async ones the version is
+read through run_store: inline with the in-memory store, in the store
+executor with SQLite, so no query runs on the event loop.
+"""
+import functools
+import inspect
+from typing import Any, Callable, Optional
+
+from fastapi import Request, Response
+
+from api.core.coalesce import flight_version
+from api.db.async_store import run_store
+from api.db.models import store
+
+
+def user_etag_value(user_id: str) -> Optional[str]:
+    """Weak ETag for the user's current version, or None if the user doesn't exist"""
+    version = store.user_version(user_id)
+    if version is None:
+        return None
+    return f'W/"{store.instance_id}-{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+def _tag(result: Any, etag_response: Response, etag: str) -> Any:
+    # Endpoints may return a ready Response (e.g. coalesced reads) or data for FastAPI to encode
+    response = result if isinstance(result, Response) else etag_response
+    response.headers["ETag"] = etag
+    return result
+
+
+def user_etag(user_param: str = "userId"):
+    """Answer If-None-Match with 304 for an endpoint whose payload depends only on one user"""
+
+    def decorator(endpoint: Callable[..., Any]):
+        signature = inspect.signature(endpoint)
+
+        if inspect.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def wrapper(etag_request: Request, etag_response: Response, **params):
+                etag = await run_store(user_etag_value, params[user_param])
+                if etag is None:
+                    # Unknown user: let the endpoint produce its usual 404
+                    return await endpoint(**params)
+
+                if etag_matches(etag_request.headers.get("if-none-match"), etag):
+                    return Response(status_code=304, headers={"ETag": etag})
+
+                token = flight_version.set(etag)
+                try:
+                    return _tag(await endpoint(**params), etag_response, etag)
+                finally:
+                    flight_version.reset(token)
+        else:
+            @functools.wraps(endpoint)
+            def wrapper(etag_request: Request, etag_response: Response, **params):
+                etag = user_etag_value(params[user_param])
+                if etag is None:
+                    # Unknown user: let the endpoint produce its usual 404
+                    return endpoint(**params)
+
+                if etag_matches(etag_request.headers.get("if-none-match"), etag):
+                    return Response(status_code=304, headers={"ETag": etag})
+
+                token = flight_version.set(etag)
+                try:
+                    return _tag(endpoint(**params), etag_response, etag)
+                finally:
+                    flight_version.reset(token)
+
+        # Expose the endpoint's own parameters plus the request/response FastAPI should inject
+        wrapper.__signature__ = signature.replace(parameters=[
+            inspect.Parameter("etag_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+            inspect.Parameter("etag_response", inspect.Parameter.KEYWORD_ONLY, annotation=Response),
+            *(p.replace(kind=inspect.Parameter.KEYWORD_ONLY) for p in signature.parameters.values())
+        ])
+        return wrapper
+
+    return decorator
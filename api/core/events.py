@@ -0,0 +1,99 @@
+"""
+In-process publish/subscribe for live per-user updates
+
+Meal logging (REST, webhook and Telegram) publishes events for a user; the
+SSE stream endpoint subscribes on behalf of connected dashboards. Publishing
+is safe from worker threads (sync endpoints) as well as the event loop, and
+costs a single dict lookup when nobody is subscribed to that user.
+
+Every subscriber owns a bounded buffer. A subscriber that falls behind loses
+its buffered events and the one that overflowed them, and receives a single
+"resync" event instead, so a slow client can never grow server memory and
+knows to refetch its state.
+"""
+import asyncio
+import os
+import threading
+from typing import Dict, Optional, Set
+
+# Maximum number of undelivered events buffered per subscriber
+SUBSCRIBER_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", "32"))
+
+RESYNC_EVENT = {"type": "resync"}
+
+
+class Subscription:
+    """A single subscriber's bounded event buffer, bound to its event loop"""
+
+    def __init__(self, user_id: str, maxsize: int = SUBSCRIBER_BUFFER_SIZE):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def _offer(self, event: dict):
+        """Enqueue an event; runs on the subscriber's loop"""
+        if self.queue.full():
+            # Overflow: discard the backlog and this event and ask the client to resync;
+            # the state it refetches includes them, and the marker needs only one slot
+            while not self.queue.empty():
+                if self.queue.get_nowait() is not RESYNC_EVENT:
+                    self.dropped += 1
+            self.dropped += 1
+            self.queue.put_nowait(RESYNC_EVENT)
+            return
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Wait for the next event; returns None if the timeout expires"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBroker:
+    """Routes events to the subscribers of a user"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, user_id: str) -> Subscription:
+        """Register a new subscriber for user_id; must be called on the event loop"""
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id: str, event: dict):
+        """Deliver an event to every subscriber of user_id (thread-safe, non-blocking)"""
+        if user_id not in self._subscribers:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._offer, event)
+            except RuntimeError:
+                # Subscriber's loop is closed; it will be cleaned up on disconnect
+                pass
+
+    def has_subscribers(self, user_id: str) -> bool:
+        return user_id in self._subscribers
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+# Process-wide broker
+broker = EventBroker()
@@ -0,0 +1,81 @@
+"""
+Liveness and readiness
+
+/healthz answers as long as the process serves requests at all; /readyz
+only once its startup work is done. An orchestrator restarts instances that
+fail the first and routes traffic only to instances that pass the second, so
+a worker restoring a large snapshot stays alive without taking requests it
+would answer from a half-loaded store.
+
+Startup work registers with `readiness` as named steps. The snapshot restore
+(STORE_SNAPSHOT) runs in the background after the lifespan hook, so probes
+are answered while it loads; the store builds its lookup and per-user meal
+indexes as it re-creates each user, so a finished restore means indexed
+data. A step that fails keeps the instance unready; the error is reported.
+Until the lifespan hook has registered every step (registration_done), the
+process reports "starting" whatever its steps say, so an empty or partial set
+of steps never reads as ready.
+
+Both endpoints are async and bypass admission control, so they answer even
+while the threadpool is saturated.
+"""
+import threading
+import time
+from typing import Dict, Optional
+
+STARTED_AT = time.time()
+
+
+class Readiness:
+    """Startup steps that must finish before the process takes traffic"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._steps: Dict[str, dict] = {}
+        self._registered = False
+
+    def registration_done(self):
+        """Every startup step has begun; until this is called the process is not ready"""
+        with self._lock:
+            self._registered = True
+
+    def begin(self, name: str):
+        with self._lock:
+            self._steps[name] = {"state": "running", "started": time.time()}
+
+    def finish(self, name: str, error: Optional[BaseException] = None, **details):
+        """Mark a step done, or failed with error; details (e.g. rows loaded) are reported with it"""
+        with self._lock:
+            step = self._steps.setdefault(name, {"started": time.time()})
+            step["state"] = "failed" if error is not None else "done"
+            step["duration_ms"] = round((time.time() - step["started"]) * 1000, 2)
+            if error is not None:
+                step["error"] = str(error)
+            step.update(details)
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return self._registered and all(step["state"] == "done" for step in self._steps.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            registered = self._registered
+            steps = {
+                name: {key: value for key, value in step.items() if key != "started"}
+                for name, step in self._steps.items()
+            }
+        if any(step["state"] == "failed" for step in steps.values()):
+            status = "failed"
+        elif registered and all(step["state"] == "done" for step in steps.values()):
+            status = "ready"
+        else:
+            status = "starting"
+        return {"status": status, "steps": steps}
+
+
+readiness = Readiness()
+
+
+def liveness() -> dict:
+    return {"status": "ok", "uptime_seconds": round(time.time() - STARTED_AT, 1)}
@@ -0,0 +1,184 @@
+"""
+API key registry
+
+Every API key maps to a role ("user" or "admin") and, optionally, the one
+userId it is bound to. A bound user key acts as that user without an
+X-User-Id header; an unbound user key (like the demo SECRET_API_KEY) acts as
+whichever user the header names.
+
+Keys are never kept in clear. The registry holds HMAC-SHA256 digests of
+them (keyed with API_KEY_PEPPER), and finding a presented key is one digest
+plus one dict (or primary key) lookup, however many keys exist. Looking up
+digests rather than comparing keys also means lookup timing reveals nothing
+about how much of a key a caller guessed.
+
+Keys come from:
+- the demo keys SECRET_API_KEY and ADMIN_API_KEY, unless API_DEMO_KEYS=false,
+- API_KEYS_FILE, a JSON-lines file of hashed keys; append entries with
+  ``python -m api.core.keys --role user --user-id user_1 --file keys.jsonl``
+  (run with the server's API_KEY_PEPPER),
+- the store, for keys issued through POST /admin/api-keys (shared by all
+  workers with the SQLite backend).
+
+Changing API_KEY_PEPPER invalidates every hashed key.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import secrets
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from api.db.models import store
+
+# Demo keys, usable as-is in the X-API-Key header
+SECRET_API_KEY = "SECRET_API_KEY"  # For regular users - Use this exact string in X-API-Key header
+ADMIN_API_KEY = "ADMIN_API_KEY"    # For admin access - Use this exact string in X-API-Key header
+
+# Set to "false" to disable the demo keys (e.g. once real keys have been issued)
+API_DEMO_KEYS = os.getenv("API_DEMO_KEYS", "true").lower() == "true"
+
+# JSON-lines file of hashed keys loaded at startup (optional)
+API_KEYS_FILE = os.getenv("API_KEYS_FILE")
+
+# Secret mixed into every key digest; keep it out of the keys file
+API_KEY_PEPPER = os.getenv("API_KEY_PEPPER", "").encode("utf-8")
+
+ROLES = ("user", "admin")
+
+# Prefix of issued keys, so they are recognizable in configs and secret scanners
+KEY_PREFIX = "mm_"
+
+
+class ApiKey(NamedTuple):
+    """A registered key (without the key itself)"""
+    key_id: str                     # Public identifier: the first 16 hex digits of the digest
+    role: str
+    user_id: Optional[str]          # Bound userId, or None
+    name: Optional[str]
+    source: str                     # "demo", "file" or "store"
+    created_at: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "keyId": self.key_id,
+            "role": self.role,
+            "userId": self.user_id,
+            "name": self.name,
+            "source": self.source,
+            "createdAt": self.created_at
+        }
+
+
+def hash_key(key: str) -> str:
+    """Hex digest under which a key is registered"""
+    return hmac.new(API_KEY_PEPPER, key.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def _from_record(key_hash: str, record: dict, source: str) -> ApiKey:
+    role = record.get("role", "user")
+    if role not in ROLES:
+        raise ValueError(f"Unknown role '{role}' for API key {key_hash[:16]}")
+    return ApiKey(key_id=key_hash[:16], role=role, user_id=record.get("userId"), name=record.get("name"),
+                  source=source, created_at=record.get("createdAt"))
+
+
+def new_key() -> Tuple[str, str]:
+    """A fresh random key and its digest"""
+    key = KEY_PREFIX + secrets.token_urlsafe(32)
+    return key, hash_key(key)
+
+
+class KeyRegistry:
+    """Digest -> ApiKey for the demo and file keys, backed by the store for issued keys"""
+
+    def __init__(self, store):
+        self.store = store
+        self._static: Dict[str, ApiKey] = {}
+
+    def add_static(self, key_hash: str, record: dict, source: str):
+        self._static[key_hash] = _from_record(key_hash, record, source)
+
+    def load_file(self, path: str) -> int:
+        """Register every key in a JSON-lines keys file; returns how many were loaded"""
+        count = 0
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                self.add_static(record["keyHash"], record, "file")
+                count += 1
+        return count
+
+    def lookup(self, key_hash: str) -> Optional[ApiKey]:
+        """The key registered under a digest, or None"""
+        key = self._static.get(key_hash)
+        if key is not None:
+            return key
+        record = self.store.get_api_key(key_hash)
+        return _from_record(key_hash, record, "store") if record is not None else None
+
+    def issue(self, role: str = "user", user_id: Optional[str] = None, name: Optional[str] = None) -> Tuple[str, ApiKey]:
+        """
+        Create a key in the store
+
+        Returns: (the key itself, which is not stored anywhere, its ApiKey)
+        """
+        if role not in ROLES:
+            raise ValueError(f"Role must be one of: {list(ROLES)}")
+        key, key_hash = new_key()
+        record = {"role": role, "userId": user_id, "name": name, "createdAt": datetime.now().isoformat()}
+        self.store.add_api_key(key_hash, record)
+        return key, _from_record(key_hash, record, "store")
+
+    def find(self, key_id: str) -> Optional[Tuple[str, ApiKey]]:
+        """(digest, ApiKey) for a public key ID, or None"""
+        for key_hash, key in self._static.items():
+            if key.key_id == key_id:
+                return key_hash, key
+        for key_hash, record in self.store.list_api_keys():
+            if key_hash[:16] == key_id:
+                return key_hash, _from_record(key_hash, record, "store")
+        return None
+
+    def revoke(self, key_hash: str) -> bool:
+        """Delete an issued key from the store (demo and file keys can't be revoked here)"""
+        return self.store.delete_api_key(key_hash)
+
+    def list_keys(self) -> List[ApiKey]:
+        return list(self._static.values()) + [
+            _from_record(key_hash, record, "store") for key_hash, record in self.store.list_api_keys()
+        ]
+
+
+api_keys = KeyRegistry(store)
+
+if API_DEMO_KEYS:
+    api_keys.add_static(hash_key(SECRET_API_KEY), {"role": "user", "name": "Demo user key"}, "demo")
+    api_keys.add_static(hash_key(ADMIN_API_KEY), {"role": "admin", "name": "Demo admin key"}, "demo")
+
+if API_KEYS_FILE:
+    api_keys.load_file(API_KEYS_FILE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create an API key and append its hash to a keys file (API_KEYS_FILE)")
+    parser.add_argument("--role", choices=ROLES, default="user")
+    parser.add_argument("--user-id", help="Bind the key to this userId")
+    parser.add_argument("--name", help="Label shown in GET /admin/api-keys")
+    parser.add_argument("--file", default=API_KEYS_FILE or "api_keys.jsonl", help="Keys file to append to")
+    args = parser.parse_args()
+
+    key, key_hash = new_key()
+    record = {"keyHash": key_hash, "role": args.role, "userId": args.user_id, "name": args.name,
+              "createdAt": datetime.now().isoformat()}
+    with open(args.file, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"Added key {key_hash[:16]} ({args.role}) to {args.file}. The key, shown only once:\n{key}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Structured, non-blocking logging
+
+Every logger under "meal_metrics" writes one JSON object per line. Records go
+through a bounded queue to a background thread that formats and writes them,
+so a slow stdout never stalls the event loop or the threadpool; when the
+queue is full, records are dropped and counted rather than blocking.
+
+RequestLogMiddleware assigns each HTTP request an ID (the incoming
+X-Request-ID header, or a new one), returns it in the response headers and
+attaches it to every record logged while handling the request. It writes one
+access record per request: errors and slow requests are always logged,
+successful ones are sampled at LOG_SAMPLE_RATE.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Maximum number of records waiting for the writer thread
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Fraction of successful (non-slow) requests written to the access log
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+# Requests slower than this are always logged (milliseconds)
+LOG_SLOW_REQUEST_MS = float(os.getenv("LOG_SLOW_REQUEST_MS", "500"))
+
+REQUEST_ID_HEADER = "X-Request-ID"
+_REQUEST_ID_KEY = REQUEST_ID_HEADER.lower().encode("latin-1")
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+# Standard LogRecord attributes; anything else passed via `extra` becomes a JSON field
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: timestamp, level, logger, message, request_id and extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request ID (runs in the caller's thread, where the context lives)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now (arguments may change later), but
+        # leave JSON formatting to the writer thread
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+logger = logging.getLogger("meal_metrics")
+access_logger = logging.getLogger("meal_metrics.access")
+
+_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging():
+    """Route the meal_metrics loggers through the queue to a background JSON writer (idempotent)"""
+    global _handler, _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _handler = NonBlockingQueueHandler(log_queue)
+    _handler.addFilter(RequestIdFilter())
+
+    writer = logging.StreamHandler(sys.stdout)
+    writer.setFormatter(JSONFormatter())
+    _listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)  # flush what's queued on shutdown
+
+    logger.addHandler(_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+
+def dropped_records() -> int:
+    return _handler.dropped if _handler is not None else 0
+
+
+class RequestLogMiddleware:
+    """ASGI middleware: request IDs plus a sampled structured access log"""
+
+    def __init__(self, app, sample_rate: float = LOG_SAMPLE_RATE, slow_ms: float = LOG_SLOW_REQUEST_MS):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == _REQUEST_ID_KEY:
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (_REQUEST_ID_KEY, request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            access_logger.exception("Unhandled error", extra={"method": scope["method"], "path": scope["path"]})
+            raise
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            self._log(scope, status, duration_ms)
+            request_id_var.reset(token)
+
+    def _log(self, scope, status: int, duration_ms: float):
+        slow = duration_ms >= self.slow_ms
+        if status >= 500:
+            level = logging.ERROR
+        elif status >= 400 or slow:
+            level = logging.WARNING
+        elif self.sample_rate >= 1 or random.random() < self.sample_rate:
+            level = logging.INFO
+        else:
+            return
+        if not access_logger.isEnabledFor(level):
+            return
+
+        client = scope.get("client")
+        access_logger.log(level, "%s %s %s", scope["method"], scope["path"], status, extra={
+            "method": scope["method"],
+            "path": scope["path"],
+            "query": scope.get("query_string", b"").decode("latin-1") or None,
+            "status": status,
+            "duration_ms": round(duration_ms, 2),
+            "slow": slow,
+            "client": client[0] if client else None,
+        })
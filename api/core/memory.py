@@ -0,0 +1,186 @@
+"""
+Memory accounting
+
+Estimates how much memory the store, its indexes and the per-process caches
+and buffers hold, for capacity planning and leak hunting (GET
+/api/v1/admin/memory). Walking every meal of a production store would take
+seconds and hold the GIL throughout, so sizes are estimates: sys.getsizeof of
+each container plus the deep size of its items, measured exactly when there
+are at most MEMORY_SAMPLE_SIZE items and otherwise extrapolated from a sample
+of that many. The objects an item references count by their share of it
+(size over reference count), so what many items have in common is neither
+missed nor multiplied by the extrapolation. Objects shared between
+structures (a meal entry sits both in the meal log and in its user's list)
+are counted where they are owned; other structures count only their
+references to them.
+
+For allocation sites, start the process with MEMORY_TRACEMALLOC_FRAMES set
+(tracemalloc slows every allocation, so it is off by default); the report
+then lists the top allocators and their growth since the previous report.
+"""
+import itertools
+import os
+import random
+import sys
+import tracemalloc
+from collections import deque
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+from typing import Any, Collection, Optional, Set
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Items measured per container; larger containers are extrapolated from a sample of this many
+MEMORY_SAMPLE_SIZE = int(os.getenv("MEMORY_SAMPLE_SIZE", "1000"))
+
+# Frames recorded per allocation by tracemalloc, started at import (0 leaves it off)
+MEMORY_TRACEMALLOC_FRAMES = int(os.getenv("MEMORY_TRACEMALLOC_FRAMES", "0"))
+
+if MEMORY_TRACEMALLOC_FRAMES > 0 and not tracemalloc.is_tracing():
+    tracemalloc.start(MEMORY_TRACEMALLOC_FRAMES)
+
+# Shared by everything that references them, so never counted
+_SHARED = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType)
+_CONTAINERS = (list, tuple, set, frozenset, deque)
+
+_previous_snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+def deep_size(obj: Any, shared: bool = False) -> int:
+    """
+    Bytes of obj and of every object it references, each counted once
+
+    With shared, an object that obj references counts only its share: its
+    size divided by its reference count. Summed over the items of a
+    container, objects the items have in common (dict keys, user IDs,
+    interned strings) then count once in total, which keeps a sample of a
+    few items representative of all of them. Immortal objects (small ints,
+    None, interned literals) have huge reference counts, so they count as
+    nothing.
+    """
+    root = obj
+    seen: Set[int] = set()
+    size = 0.0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SHARED):
+            continue
+        seen.add(id(obj))
+        if shared and obj is not root:
+            # Less the references held by `obj` and by getrefcount's argument
+            size += sys.getsizeof(obj) / max(1, sys.getrefcount(obj) - 2)
+        else:
+            size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, _CONTAINERS):
+            stack.extend(obj)
+        elif not isinstance(obj, (str, bytes, int, float)):
+            # Instances: their attribute dict and slots
+            attributes = getattr(obj, "__dict__", None)
+            if attributes is not None:
+                stack.append(attributes)
+            for cls in type(obj).__mro__:
+                for slot in getattr(cls, "__slots__", ()):
+                    if slot != "__dict__" and hasattr(obj, slot):
+                        stack.append(getattr(obj, slot))
+    return round(size)
+
+
+def estimate_items(items: Collection, shallow: bool = False, sample: int = MEMORY_SAMPLE_SIZE) -> int:
+    """
+    Estimated bytes of the items of a list, sequence, set or dict (keys and values), without the container
+
+    Each item counts in full, and the objects it references by their share
+    (see deep_size). shallow counts values (or set and list items) as
+    references only: their own size, not what they point to.
+    """
+    count = len(items)
+    if not count:
+        return 0
+    if count <= sample:
+        chosen = items
+    elif isinstance(items, (dict, set, frozenset)):
+        # No random access; take evenly spaced entries
+        chosen = list(itertools.islice(items, 0, None, count // sample))[:sample]
+    else:
+        chosen = [items[i] for i in random.sample(range(count), sample)]
+
+    size = 0
+    if isinstance(items, dict):
+        for key in chosen:
+            value = items[key]
+            size += deep_size(key, shared=True) + (sys.getsizeof(value) if shallow else deep_size(value, shared=True))
+    else:
+        for item in chosen:
+            size += sys.getsizeof(item) if shallow else deep_size(item, shared=True)
+    return size * count // len(chosen)
+
+
+def estimate_size(container: Collection, shallow: bool = False, sample: int = MEMORY_SAMPLE_SIZE) -> int:
+    """Estimated bytes of a container and its items (see estimate_items)"""
+    return sys.getsizeof(container) + estimate_items(container, shallow, sample)
+
+
+def usage(objects: int, size: int) -> dict:
+    """One line of a memory report"""
+    return {"objects": objects, "bytes": size}
+
+
+def process_memory() -> dict:
+    """Resident set size of this process now and at its peak, where the platform reports them"""
+    rss = peak = None
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        peak = peak if sys.platform == "darwin" else peak * 1024
+    return {"rss_bytes": rss, "peak_rss_bytes": peak}
+
+
+def _location(statistic) -> str:
+    frame = statistic.traceback[0]
+    return f"{frame.filename}:{frame.lineno}"
+
+
+def top_allocations(limit: int = 10) -> dict:
+    """
+    Top allocation sites by size, and the fastest growing since the previous call
+
+    Only available when tracemalloc is tracing (MEMORY_TRACEMALLOC_FRAMES).
+    """
+    global _previous_snapshot
+    if not tracemalloc.is_tracing():
+        return {"tracing": False}
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+    report = {
+        "tracing": True,
+        "traced_bytes": current,
+        "peak_traced_bytes": peak,
+        "top": [
+            {"location": _location(statistic), "bytes": statistic.size, "blocks": statistic.count}
+            for statistic in snapshot.statistics("lineno")[:limit]
+        ]
+    }
+    if _previous_snapshot is not None:
+        report["growth"] = [
+            {"location": _location(statistic), "bytes": statistic.size_diff, "blocks": statistic.count_diff}
+            for statistic in snapshot.compare_to(_previous_snapshot, "lineno")[:limit]
+            if statistic.size_diff > 0
+        ]
+    _previous_snapshot = snapshot
+    return report
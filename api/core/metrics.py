@@ -0,0 +1,275 @@
+"""
+Prometheus-style metrics with lock-free hot paths
+
+Counters, gauges and histograms keep one shard of values per thread. A thread
+only ever writes its own shard, so recording a sample is a thread-local lookup
+and a dict update, with no lock and no lost increments. The rare scrape of
+/metrics sums the shards. Shard registration (once per thread and metric) is
+the only place a lock is taken.
+
+Values that already live elsewhere (store sizes, cache entries, subscribers)
+are registered as callback gauges and read at scrape time, so they cost
+nothing on the request path.
+
+MetricsMiddleware records per-route request counts and latency histograms and
+the number of requests in flight; registry.render() produces the text
+exposition format.
+"""
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Request latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _merged(self) -> Dict[Labels, float]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        totals: Dict[Labels, float] = {}
+        for shard in shards:
+            for labels, value in shard.copy().items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        values = self._merged()
+        if not values and not self.labelnames:
+            values = {(): 0}
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, value: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + value
+
+
+class Gauge(_Metric):
+    """Up/down gauge; each thread's net contribution is summed at scrape time"""
+    kind = "gauge"
+
+    def inc(self, *labels: str, value: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + value
+
+    def dec(self, *labels: str, value: float = 1):
+        self.inc(*labels, value=-value)
+
+
+class CallbackGauge(_Metric):
+    """Gauge read from a callback at scrape time (a number, or {label values: number})"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Union[float, Dict[Labels, float]]],
+                 labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def _merged(self) -> Dict[Labels, float]:
+        value = self.callback()
+        return value if isinstance(value, dict) else {(): value}
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, *labels: str, value: float):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # Per-bucket counts (last slot is +Inf), then sum
+            state = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def _merged(self) -> Dict[Labels, list]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        totals: Dict[Labels, list] = {}
+        for shard in shards:
+            for labels, state in shard.copy().items():
+                total = totals.setdefault(labels, [0] * len(state))
+                for i, value in enumerate(list(state)):
+                    total[i] += value
+        return totals
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for labels, state in sorted(self._merged().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def callback_gauge(self, name: str, documentation: str, callback: Callable, labelnames: Sequence[str] = ()) -> CallbackGauge:
+        return self.register(CallbackGauge(name, documentation, callback, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.collect())
+            except Exception as e:
+                # A failing callback must not take the whole scrape down
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+START_TIME = time.time()
+registry.callback_gauge("process_start_time_seconds", "Start time of the process since unix epoch in seconds.",
+                        lambda: START_TIME)
+
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests handled, by route template and status.", ("method", "route", "status"))
+HTTP_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency in seconds, by route template.", ("method", "route"))
+HTTP_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled (including open event streams).", ("method",))
+
+MEALS_INGESTED = registry.counter(
+    "meals_ingested_total", "Meals logged, by ingest channel (rest, webhook, telegram).", ("channel",))
+TELEGRAM_OUTBOUND_PENDING = registry.gauge(
+    "telegram_outbound_pending", "Telegram sendMessage calls waiting on the Telegram API.")
+SLOW_REQUESTS = registry.counter(
+    "slow_requests_total", "Requests caught by the slow-request watchdog, by route template.", ("method", "route"))
+COMPRESSED_RESPONSES = registry.counter(
+    "http_responses_compressed_total", "Responses gzip-compressed on the fly.")
+COMPRESSION_BYTES_SAVED = registry.counter(
+    "http_compression_saved_bytes_total", "Response bytes saved by on-the-fly gzip compression.")
+LOAD_SHED = registry.counter(
+    "load_shed_total", "Requests shed with 503 by admission control, by route class and reason.", ("class", "reason"))
+RATE_LIMITED = registry.counter(
+    "rate_limited_total", "Requests and Telegram updates refused by rate limiting, by rule.", ("rule",))
+
+
+def route_template(scope: dict) -> str:
+    """Full path template of the matched route (e.g. /api/v1/meals/{userId}), bounded in cardinality"""
+    route = scope.get("route")
+    template = getattr(route, "path_format", None)
+    if template is None:
+        if scope.get("root_path"):
+            # Mounted apps (static files) are labelled by their mount point
+            return scope["root_path"]
+        if scope.get("endpoint") is not None and not scope.get("path_params"):
+            # Plain Starlette routes (docs, openapi.json) have fixed paths
+            return scope["path"]
+        return "unmatched"
+    # Routes from included routers may only know their own part of the path;
+    # recover the prefix from the request path
+    try:
+        concrete = template.format(**scope.get("path_params", {}))
+    except (KeyError, IndexError, ValueError):
+        return template
+    path = scope["path"]
+    return path[:-len(concrete)] + template if concrete and path.endswith(concrete) else template
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency and in-flight requests per route"""
+
+    def __init__(self, app, exclude_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.exclude_paths = frozenset(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = "500"
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        # The route template is only known once routing has run, so in-flight is per method
+        HTTP_IN_FLIGHT.inc(method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(method)
+            route = route_template(scope)
+            HTTP_REQUESTS.inc(method, route, status)
+            HTTP_LATENCY.observe(method, route, value=time.perf_counter() - start)
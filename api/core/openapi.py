@@ -0,0 +1,88 @@
+"""
+Prebuilt OpenAPI schema
+
+Generating the schema walks every route and model, which takes tens of
+milliseconds that the first /docs visitor of a freshly started (or woken)
+instance would otherwise wait for. The build step writes it to a file
+instead:
+
+    python -m api.core.openapi
+
+and the app serves that file when it is current. The file records a
+fingerprint of the api package sources and the FastAPI/Pydantic versions;
+when they no longer match (code changed without rebuilding), the file is
+ignored and the schema is generated on first request as before, so a stale
+schema is never served.
+"""
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+import fastapi
+import pydantic
+
+from api.core.log import logger
+
+API_DIR = Path(__file__).resolve().parent.parent
+
+# Set to "false" to always generate the schema at runtime
+OPENAPI_PREBUILT = os.getenv("OPENAPI_PREBUILT", "true").lower() == "true"
+
+# Where the build step writes the schema and the app reads it from
+OPENAPI_SCHEMA_PATH = os.getenv("OPENAPI_SCHEMA_PATH", str(API_DIR / "openapi.json"))
+
+# Top-level extension field holding the fingerprint in the written file
+FINGERPRINT_KEY = "x-source-fingerprint"
+
+
+def source_fingerprint() -> str:
+    """Hash of every module in the api package plus the versions that shape the schema"""
+    digest = hashlib.sha1(f"fastapi {fastapi.__version__} pydantic {pydantic.VERSION}".encode())
+    for path in sorted(API_DIR.rglob("*.py")):
+        digest.update(str(path.relative_to(API_DIR)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def load_prebuilt_schema(path: str = OPENAPI_SCHEMA_PATH) -> Optional[dict]:
+    """The prebuilt schema, or None if disabled, missing, unreadable or built from other sources"""
+    if not OPENAPI_PREBUILT:
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            schema = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable prebuilt OpenAPI schema %s: %s", path, e)
+        return None
+
+    if schema.pop(FINGERPRINT_KEY, None) != source_fingerprint():
+        logger.warning("Ignoring stale prebuilt OpenAPI schema %s; rebuild it with python -m api.core.openapi", path)
+        return None
+    return schema
+
+
+def write_schema(schema: dict, path: str = OPENAPI_SCHEMA_PATH):
+    """Write a schema for load_prebuilt_schema, stamped with the current fingerprint"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({**schema, FINGERPRINT_KEY: source_fingerprint()}, f, separators=(",", ":"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the prebuilt OpenAPI schema served by the app")
+    parser.add_argument("--out", default=OPENAPI_SCHEMA_PATH, help="Schema file to write")
+    args = parser.parse_args()
+
+    from api.main import build_openapi_schema
+
+    schema = build_openapi_schema()
+    write_schema(schema, args.out)
+    print(f"Wrote OpenAPI schema ({len(schema['paths'])} paths) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+On-demand request profiling for admins
+
+A request is profiled when it carries ``X-Profile: 1`` together with the admin
+API key, or when it is picked by PROFILE_SAMPLE_RATE (0 by default). Profiled
+requests run under cProfile and the top functions by cumulative time are kept
+in a bounded ring, which admins read through /admin/profiles.
+
+Each profiled request runs under exactly one profiler. For a sync endpoint,
+profiled() profiles the worker thread that runs it (see api.core.routing);
+for everything else, ProfilingMiddleware profiles the event-loop thread
+(middleware, async endpoints, response sending), where coroutines of other
+requests interleaving on the loop can show up in the report. Since Python
+3.12 cProfile is built on sys.monitoring, which allows one active profiler
+per interpreter, so profiled requests are serialized: a request picked while
+another is being profiled (or while some other profiling tool is active)
+runs unprofiled, with a log line.
+
+When a request is not being profiled, the middleware costs one header scan
+and a sync endpoint one context variable lookup.
+"""
+import contextvars
+import cProfile
+import functools
+import io
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+from starlette.routing import Match
+
+from api.core.auth import API_KEY_NAME, is_admin_key
+from api.core.log import logger, request_id_var
+
+# Set to "false" to remove the profiling middleware entirely
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+
+# Fraction of all requests profiled without being asked (0 disables sampling)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+# Number of profiles kept for /admin/profiles
+PROFILE_RING_SIZE = int(os.getenv("PROFILE_RING_SIZE", "20"))
+
+# Functions listed per profile, by cumulative time
+PROFILE_TOP_FUNCTIONS = int(os.getenv("PROFILE_TOP_FUNCTIONS", "40"))
+
+PROFILE_HEADER = "X-Profile"
+
+_PROFILE_KEY = PROFILE_HEADER.lower().encode("latin-1")
+_API_KEY_KEY = API_KEY_NAME.lower().encode("latin-1")
+
+
+class ProfileSession:
+    """Profiles collected for one request across the threads that served it"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles: List[cProfile.Profile] = []
+
+    def add(self, profile: cProfile.Profile):
+        with self._lock:
+            self._profiles.append(profile)
+
+    def report(self, limit: int = PROFILE_TOP_FUNCTIONS) -> str:
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return ""
+        out = io.StringIO()
+        stats = pstats.Stats(profiles[0], stream=out)
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+
+# Held for the whole of a profiled request; only one profiler can be active at a time
+_profile_lock = threading.Lock()
+
+_session_var: contextvars.ContextVar[Optional[ProfileSession]] = contextvars.ContextVar("profile_session", default=None)
+
+# Most recent profiles, newest last
+profiles: deque = deque(maxlen=PROFILE_RING_SIZE)
+
+
+def profiled(endpoint: Callable) -> Callable:
+    """Wrap a sync endpoint so it runs under cProfile in its worker thread when its request is profiled"""
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        session = _session_var.get()
+        if session is None:
+            return endpoint(*args, **kwargs)
+        profile = _start_profile()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.disable()
+            session.add(profile)
+
+    # Tells ProfilingMiddleware to leave the request to this wrapper
+    wrapper.profiled_in_thread = True
+    return wrapper
+
+
+def _start_profile() -> Optional[cProfile.Profile]:
+    """An enabled profiler, or None if another profiling tool is already active"""
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError as e:
+        logger.info("Request not profiled: %s", e)
+        return None
+    return profile
+
+
+def _profiled_in_thread(scope) -> bool:
+    """Whether the request is routed to a sync endpoint that profiled() profiles itself"""
+    router = getattr(scope.get("app"), "router", None)
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(getattr(route, "endpoint", None), "profiled_in_thread", False)
+    return False
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles admin-requested or sampled requests"""
+
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def _trigger(self, scope) -> Optional[str]:
+        requested = False
+        api_key = None
+        for name, value in scope["headers"]:
+            if name == _PROFILE_KEY:
+                requested = value.strip() == b"1"
+            elif name == _API_KEY_KEY:
+                api_key = value
+        # The key is only looked up for requests asking to be profiled
+        if requested and api_key is not None and await is_admin_key(api_key.decode("latin-1")):
+            return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trigger = await self._trigger(scope)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not _profile_lock.acquire(blocking=False):
+            logger.info("Request not profiled: another request is being profiled")
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self._profile(scope, receive, send, trigger)
+        finally:
+            _profile_lock.release()
+
+    async def _profile(self, scope, receive, send, trigger: str):
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        session = ProfileSession()
+        token = _session_var.set(session)
+        loop_profile = None if _profiled_in_thread(scope) else _start_profile()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            _session_var.reset(token)
+            if loop_profile is not None:
+                loop_profile.disable()
+                session.add(loop_profile)
+            profiles.append({
+                "id": request_id_var.get() or uuid.uuid4().hex,
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "trigger": trigger,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode("latin-1") or None,
+                "status": status,
+                "duration_ms": round(duration_ms, 2),
+                "report": session.report()
+            })
+
+
+def find_profile(profile_id: str) -> Optional[dict]:
+    for entry in list(profiles):
+        if entry["id"] == profile_id:
+            return entry
+    return None
@@ -0,0 +1,236 @@
+"""
+Token-bucket rate limiting
+
+RateLimitMiddleware limits how fast each client can call the ingest routes,
+so one misbehaving integration can't occupy the whole threadpool. Rules come
+from RATE_LIMITS, comma-separated ``path-prefix=rate:burst`` entries: up to
+`burst` requests at once, refilled at `rate` requests per second. The longest
+matching prefix applies. A request takes a token from the bucket of every
+identity it carries:
+
+- its client address, always,
+- its user, if the request is authenticated: the user a bound API key
+  belongs to, or for any other valid key (SECRET_API_KEY, admin keys) the
+  user X-User-Id (or the webhook's user-id header) names.
+
+A user header without a valid key is ignored: nothing authenticates it, so a
+client could name a different user on every request and always find a full
+bucket. Keys themselves get no bucket, so users of the shared key never split
+one limit. Keys are looked up with api.core.auth.lookup_key, which caches
+registered and unknown keys alike and queries the registry off the event
+loop.
+
+A request that finds any of its buckets empty gets 429 Too Many Requests with
+Retry-After and takes nothing from the others. WebSocket ingest is limited
+per frame instead of per connection: each frame takes a token from the
+connection's address and authenticated user under the rule of the socket's
+path (see acquire_frame), and an over-limit frame is answered with an error
+acknowledgement. Telegram updates are limited
+per chat in the bot's webhook instead (TELEGRAM_RATE_LIMIT), since the chat
+is only known from the body and Telegram retries updates that are rejected.
+
+Each bucket is a single float, the time at which it will be full again (the
+GCRA form of a token bucket). A full bucket is the same as no bucket, so
+buckets are dropped once their clients have been idle long enough to refill
+them, and each rule keeps at most RATE_LIMIT_MAX_BUCKETS, dropping the least
+recently used. Identities are kept as 8-byte digests, so a bucket costs
+under 200 bytes however long the header is.
+
+Buckets are per process and only touched from the event loop.
+"""
+import hashlib
+import math
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Hashable, Iterable, List, NamedTuple, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from api.core.auth import API_KEY_NAME, USER_ID_NAME, lookup_key
+from api.core.memory import estimate_items, usage
+from api.core.metrics import RATE_LIMITED
+
+# Set to "false" to remove the rate limiting middleware entirely
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+# Limited routes: comma-separated path-prefix=rate:burst (requests per second : requests at once)
+RATE_LIMITS = os.getenv("RATE_LIMITS", "/api/v1/meals/log=10:30,/api/v1/webhook/=10:30")
+
+# Most buckets kept per rule; beyond it the least recently used are dropped (which refills them)
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+
+_API_KEY_KEY = API_KEY_NAME.lower().encode("latin-1")
+_USER_KEYS = (USER_ID_NAME.lower().encode("latin-1"), b"user-id")
+
+# Float slack, so the last token of a burst isn't refused over rounding
+_EPSILON = 1e-9
+
+
+class TokenBuckets:
+    """The token buckets of one limit, keyed by client identity"""
+
+    def __init__(self, rate: float, burst: int, max_buckets: int = RATE_LIMIT_MAX_BUCKETS):
+        if rate <= 0 or burst < 1:
+            raise ValueError(f"Rate limit needs a positive rate and burst, got {rate}:{burst}")
+        self.rate = rate
+        self.burst = burst
+        self.max_buckets = max_buckets
+        self._interval = 1.0 / rate
+        self._capacity = burst * self._interval
+        # identity -> when its bucket is full again, least recently used first
+        self._full_at: "OrderedDict[Hashable, float]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._full_at)
+
+    def acquire(self, identities: Iterable[Hashable], now: Optional[float] = None) -> float:
+        """
+        Take a token from the bucket of every identity, or from none of them
+
+        Returns: 0 if the tokens were taken, otherwise the seconds until they will be available
+        """
+        if now is None:
+            now = time.monotonic()
+        full_at = self._full_at
+        self._expire(now)
+
+        wait = 0.0
+        updated = []
+        for identity in identities:
+            refilled = max(full_at.get(identity, now), now) + self._interval
+            wait = max(wait, refilled - now - self._capacity)
+            updated.append((identity, refilled))
+        if wait > _EPSILON:
+            return wait
+
+        for identity, refilled in updated:
+            full_at[identity] = refilled
+            full_at.move_to_end(identity)
+        while len(full_at) > self.max_buckets:
+            full_at.popitem(last=False)
+        return 0.0
+
+    def memory_usage(self) -> dict:
+        """Bucket count and estimated bytes"""
+        # Copied in one C-level call, so the event loop can keep updating buckets
+        full_at = dict(self._full_at)
+        return usage(len(full_at), sys.getsizeof(self._full_at) + estimate_items(full_at))
+
+    def _expire(self, now: float):
+        # Least recently used first; stop at the first bucket still refilling
+        full_at = self._full_at
+        while full_at:
+            identity = next(iter(full_at))
+            if full_at[identity] > now:
+                break
+            del full_at[identity]
+
+
+class RateLimitRule(NamedTuple):
+    prefix: str
+    buckets: TokenBuckets
+
+
+def parse_limit(limit: str) -> Tuple[float, int]:
+    """"rate:burst" -> (rate, burst); the burst defaults to one second's worth"""
+    rate, _, burst = limit.partition(":")
+    rate = float(rate)
+    return rate, int(burst) if burst else max(1, math.ceil(rate))
+
+
+def parse_rules(spec: str) -> List[RateLimitRule]:
+    """RATE_LIMITS -> rules, longest prefix first"""
+    rules = []
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        prefix, _, limit = entry.rpartition("=")
+        if not prefix.startswith("/") or not limit:
+            raise ValueError(f"Invalid RATE_LIMITS entry '{entry}', expected path-prefix=rate:burst")
+        rules.append(RateLimitRule(prefix, TokenBuckets(*parse_limit(limit))))
+    return sorted(rules, key=lambda rule: len(rule.prefix), reverse=True)
+
+
+rate_limit_rules = parse_rules(RATE_LIMITS)
+
+
+def _digest(kind: bytes, value: bytes) -> bytes:
+    return hashlib.blake2b(kind + value, digest_size=8).digest()
+
+
+async def client_identities(scope) -> List[bytes]:
+    """Digests of the client address and, when a valid API key authenticates it, of the user"""
+    api_key = user_id = None
+    for name, value in scope["headers"]:
+        if name == _API_KEY_KEY:
+            api_key = value
+        elif name in _USER_KEYS:
+            user_id = value
+    key = await lookup_key(api_key.decode("latin-1")) if api_key else None
+    if key is None:
+        return identities_of(scope)
+    # Bound keys act as their own user, whatever the header says
+    return identities_of(scope, key.user_id or (user_id.decode("latin-1") if user_id else None))
+
+
+def identities_of(scope, user_id: Optional[str] = None) -> List[bytes]:
+    """Digests of a connection's client address and of the authenticated user, if any"""
+    client = scope.get("client")
+    identities = [_digest(b"addr:", (client[0] if client else "").encode("latin-1"))]
+    if user_id:
+        identities.append(_digest(b"user:", user_id.encode("utf-8")))
+    return identities
+
+
+def rule_for(path: str, rules: Optional[List[RateLimitRule]] = None) -> Optional[RateLimitRule]:
+    """The rule with the longest prefix matching a path, or None"""
+    for rule in rate_limit_rules if rules is None else rules:
+        if path.startswith(rule.prefix):
+            return rule
+    return None
+
+
+def acquire_frame(scope, user_id: Optional[str]) -> float:
+    """
+    Take a token for one WebSocket frame from its connection's address and user
+
+    Returns: 0 if the frame may be processed, otherwise the seconds until it could be
+    """
+    rule = rule_for(scope["path"]) if RATE_LIMIT_ENABLED else None
+    if rule is None:
+        return 0.0
+    wait = rule.buckets.acquire(identities_of(scope, user_id))
+    if wait > 0:
+        RATE_LIMITED.inc(rule.prefix)
+    return wait
+
+
+def bucket_counts() -> dict:
+    """(rule prefix,) -> buckets held, for the rate_limit_buckets gauge"""
+    return {(rule.prefix,): len(rule.buckets) for rule in rate_limit_rules}
+
+
+class RateLimitMiddleware:
+    """ASGI middleware answering 429 to clients over the limit of a route's rule"""
+
+    def __init__(self, app, rules: Optional[List[RateLimitRule]] = None):
+        self.app = app
+        self.rules = rate_limit_rules if rules is None else rules
+
+    async def __call__(self, scope, receive, send):
+        rule = rule_for(scope["path"], self.rules) if scope["type"] == "http" else None
+        if rule is not None:
+            wait = rule.buckets.acquire(await client_identities(scope))
+            if wait > 0:
+                RATE_LIMITED.inc(rule.prefix)
+                response = JSONResponse(
+                    {"detail": f"Rate limit exceeded ({rule.buckets.rate:g} requests per second); retry later"},
+                    status_code=429,
+                    headers={"Retry-After": str(math.ceil(wait))}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,51 @@
+"""
+Fast JSON responses for hot read endpoints
+
+FastAPI's default path runs a handler's return value through jsonable_encoder
+(a recursive copy of the whole payload), validates it against response_model
+when one is declared, and then encodes it with the stdlib json module. For
+endpoints whose handlers already build plain dicts of the documented shape,
+returning FastJSONResponse skips the first two steps: the dict is serialized
+directly, with orjson when it is installed and the stdlib encoder otherwise.
+
+Dates and datetimes are written as ISO 8601 strings, exactly as
+jsonable_encoder would write them.
+"""
+import json
+from datetime import date, datetime
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """Fallback for values the encoder doesn't handle natively"""
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+    return jsonable_encoder(obj)
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize a payload of plain dicts/lists/scalars to compact JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content,
+        default=_default,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse that serializes handler output directly, without jsonable_encoder"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
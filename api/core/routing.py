@@ -0,0 +1,26 @@
+"""
+Route class shared by the API routers
+
+Sync endpoints run in the threadpool, where ASGI middleware can't follow them.
+Per-request instrumentation that has to run in the endpoint's own thread is
+applied here: the cProfile hook (api.core.profiling) and the slow-request
+watchdog's thread tracking (api.core.watchdog). Every endpoint, sync or
+async, also gets a tracing span (api.core.tracing). Each hook costs a context
+variable lookup when its feature isn't active for the request.
+"""
+import inspect
+from typing import Callable
+
+from fastapi.routing import APIRoute
+
+from api.core.profiling import profiled
+from api.core.tracing import traced
+from api.core.watchdog import watched
+
+
+class InstrumentedRoute(APIRoute):
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        endpoint = traced(f"endpoint {endpoint.__name__}")(endpoint)
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = profiled(watched(endpoint))
+        super().__init__(path, endpoint, **kwargs)
@@ -0,0 +1,193 @@
+"""
+Fingerprinted, precompressed frontend
+
+The build step copies frontend/ to FRONTEND_BUILD_DIR:
+
+    python -m api.core.static
+
+- Assets (CSS, JS, images) get a content hash in their name
+  (css/styles.css -> css/styles.3f9a1c2b7d.css), and the references in the
+  HTML pages and stylesheets are rewritten to match. A changed asset is a
+  new URL, so every asset can be cached forever. The pages keep their names,
+  since users bookmark and navigate to them.
+- Every compressible file also gets gzip (.gz) and, when the brotli package
+  is installed, brotli (.br) siblings, compressed once at maximum level.
+- manifest.json maps each original path to its built path.
+
+PrecompressedStaticFiles serves the build: the best precompressed sibling
+the client accepts (with Vary: Accept-Encoding), `Cache-Control: immutable`
+for fingerprinted assets and `no-cache` (revalidate with ETag) for the
+pages. It also serves the unbuilt frontend/ directory, just without
+fingerprints or precompressed files.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+from pathlib import Path
+from typing import Dict
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from api.core.compression import accepted_encodings, is_compressible
+
+try:
+    import brotli
+except ImportError:  # optional: without it only .gz files are built
+    brotli = None
+
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+FRONTEND_DIR = ROOT_DIR / "frontend"
+
+# Where the build step writes the frontend and the app serves it from, when present
+FRONTEND_BUILD_DIR = os.getenv("FRONTEND_BUILD_DIR", str(ROOT_DIR / "build" / "frontend"))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Precompressed siblings, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+# name.<10 hex digits>.ext, as written by fingerprint()
+FINGERPRINTED = re.compile(r"\.[0-9a-f]{10}\.[^./]+$")
+
+# Files smaller than this aren't worth precompressing
+MIN_COMPRESS_SIZE = 256
+
+_HTML_REFERENCE = re.compile(r'''(\b(?:href|src)=["'])([^"'#?]+)''')
+_CSS_REFERENCE = re.compile(r'''(url\(\s*["']?)([^"')#?]+)''')
+
+
+def media_type(path: str) -> str:
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def fingerprint(rel_path: str, content: bytes) -> str:
+    """Path with a content hash before the extension: css/styles.css -> css/styles.<hash>.css"""
+    stem, ext = posixpath.splitext(rel_path)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:10]}{ext}"
+
+
+def _rewrite(text: str, pattern: re.Pattern, rel_path: str, manifest: Dict[str, str]) -> str:
+    """Point relative references in `text` (a file at rel_path) at fingerprinted names"""
+    base = posixpath.dirname(rel_path)
+
+    def replace(match):
+        reference = match.group(2)
+        if "://" in reference or reference.startswith(("/", "data:")):
+            return match.group(0)
+        built = manifest.get(posixpath.normpath(posixpath.join(base, reference)))
+        if built is None:
+            return match.group(0)
+        return match.group(1) + posixpath.join(posixpath.dirname(reference), posixpath.basename(built))
+
+    return pattern.sub(replace, text)
+
+
+def _write_compressed(path: Path, content: bytes) -> int:
+    """Write .gz (and .br) siblings that are smaller than the file; returns how many were written"""
+    written = 0
+    variants = [(".gz", gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append((".br", brotli.compress(content, quality=11)))
+    for suffix, compressed in variants:
+        if len(compressed) < len(content):
+            path.with_name(path.name + suffix).write_bytes(compressed)
+            written += 1
+    return written
+
+
+def build(src: Path = FRONTEND_DIR, out: Path = Path(FRONTEND_BUILD_DIR)) -> Dict[str, str]:
+    """
+    Build the frontend into `out` (replacing a previous build)
+
+    Returns: the manifest, original path -> built path
+    """
+    if out.exists():
+        if not (out / "manifest.json").exists():
+            raise ValueError(f"{out} exists but is not a frontend build; refusing to replace it")
+        shutil.rmtree(out)
+
+    files = sorted(p.relative_to(src).as_posix() for p in src.rglob("*") if p.is_file())
+    pages = [f for f in files if f.endswith(".html")]
+    stylesheets = [f for f in files if f.endswith(".css")]
+    assets = [f for f in files if f not in pages and f not in stylesheets]
+
+    manifest = {}
+    outputs = {}
+    # Stylesheets can reference other assets and pages can reference both, so they are rewritten last
+    for rel_path in assets + stylesheets + pages:
+        content = (src / rel_path).read_bytes()
+        if rel_path in stylesheets:
+            content = _rewrite(content.decode("utf-8"), _CSS_REFERENCE, rel_path, manifest).encode("utf-8")
+        elif rel_path in pages:
+            content = _rewrite(content.decode("utf-8"), _HTML_REFERENCE, rel_path, manifest).encode("utf-8")
+        built = rel_path if rel_path in pages else fingerprint(rel_path, content)
+        manifest[rel_path] = built
+        outputs[built] = content
+
+    for built, content in outputs.items():
+        path = out / built
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        if len(content) >= MIN_COMPRESS_SIZE and is_compressible(media_type(built)):
+            _write_compressed(path, content)
+
+    (out / "manifest.json").write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles serving precompressed siblings and fingerprint-aware Cache-Control"""
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        content_type = media_type(full_path)
+        headers = {"Cache-Control": IMMUTABLE if FINGERPRINTED.search(full_path) else REVALIDATE}
+
+        path = full_path
+        if is_compressible(content_type):
+            headers["Vary"] = "Accept-Encoding"
+            accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+            for encoding, suffix in ENCODINGS:
+                if encoding not in accepted:
+                    continue
+                try:
+                    stat_result = os.stat(full_path + suffix)
+                except OSError:
+                    continue
+                path = full_path + suffix
+                headers["Content-Encoding"] = encoding
+                break
+
+        response = FileResponse(path, status_code=status_code, headers=headers,
+                                media_type=content_type, stat_result=stat_result)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the fingerprinted, precompressed frontend")
+    parser.add_argument("--src", default=str(FRONTEND_DIR), help="Frontend source directory")
+    parser.add_argument("--out", default=FRONTEND_BUILD_DIR, help="Build directory (replaced)")
+    args = parser.parse_args()
+
+    manifest = build(Path(args.src), Path(args.out))
+    out = Path(args.out)
+    size = sum(p.stat().st_size for p in out.rglob("*") if p.is_file() and p.suffix not in (".gz", ".br"))
+    gz = sum(p.stat().st_size for p in out.rglob("*.gz"))
+    print(f"Built {len(manifest)} files ({size / 1024:.1f} KiB; {gz / 1024:.1f} KiB gzipped"
+          f"{'' if brotli is not None else ', brotli not installed'}) into {out}")
+
+
+if __name__ == "__main__":
+    main()
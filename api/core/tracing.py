@@ -0,0 +1,341 @@
+"""
+In-process request tracing
+
+Spans follow the OpenTelemetry data model (trace and span IDs, parent span,
+kind, start and end time in Unix nanoseconds, attributes, status) without an
+SDK or a collector. TracingMiddleware opens a SERVER span for each sampled
+request: a TRACE_SAMPLE_RATE fraction of all requests, plus any request from
+a trusted caller whose W3C ``traceparent`` header is flagged as sampled (its
+trace ID and parent span are continued). Callers are trusted when they send
+the admin API key or connect from TRACE_TRUSTED_CLIENTS; anyone else's
+sampled flag is ignored and the request goes through the local sampler, so
+clients can't force tracing on every request. Code marks its stages with
+``with span("name"):`` or ``@traced("name")``. The current span lives in a
+context variable, so spans opened in threadpool workers nest under the
+request that started them.
+
+Finished traces go into an in-memory ring read through /admin/traces and,
+when TRACE_EXPORT_FILE is set, into a size-rotated JSON-lines file (one span
+per line) written by a background thread.
+
+For requests that aren't sampled, span() and traced() cost one context
+variable lookup and hand back a shared no-op span.
+"""
+import asyncio
+import atexit
+import contextvars
+import functools
+import ipaddress
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, List, Optional, Union
+
+from api.core.log import NonBlockingQueueHandler, request_id_var
+from api.core.metrics import route_template
+
+# Fraction of requests traced without a sampled traceparent header (0 disables sampling)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+
+# Number of finished traces kept for /admin/traces
+TRACE_RING_SIZE = int(os.getenv("TRACE_RING_SIZE", "100"))
+
+# Spans kept per trace; further spans are counted but dropped
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "500"))
+
+# JSON-lines export file (unset: in-memory ring only), rotated by size
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE")
+TRACE_EXPORT_MAX_BYTES = int(os.getenv("TRACE_EXPORT_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_EXPORT_BACKUPS = int(os.getenv("TRACE_EXPORT_BACKUPS", "3"))
+
+# Client addresses or networks (comma-separated, e.g. 10.0.0.0/8) whose sampled traceparent is honoured
+TRACE_TRUSTED_CLIENTS = os.getenv("TRACE_TRUSTED_CLIENTS", "")
+
+TRACEPARENT_HEADER = "traceparent"
+_TRACEPARENT_KEY = TRACEPARENT_HEADER.encode("latin-1")
+_Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+# Same header as api.core.auth.API_KEY_NAME, which can't be imported here (see _trusted)
+_API_KEY_KEY = b"x-api-key"
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+class Trace:
+    """Spans of one sampled request, collected from every thread that served it"""
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or _new_id(128)
+        self.spans: List["Span"] = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def add(self, span: "Span"):
+        with self._lock:
+            if len(self.spans) < TRACE_MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+
+class Span:
+    """A timed operation; use as a context manager (see span())"""
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "attributes",
+                 "start_ns", "end_ns", "status", "status_message", "_token")
+
+    def __init__(self, trace: Trace, name: str, kind: str = "INTERNAL",
+                 parent_id: Optional[str] = None, attributes: Optional[dict] = None):
+        self.trace = trace
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.start_ns = 0
+        self.end_ns = 0
+        self.status = "UNSET"
+        self.status_message = None
+        self._token = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_error(self, message: str):
+        self.status = "ERROR"
+        self.status_message = message
+
+    def __enter__(self) -> "Span":
+        self.start_ns = time.time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end_ns = time.time_ns()
+        _current_span.reset(self._token)
+        if exc is not None and self.status != "ERROR":
+            self.set_error(f"{exc_type.__name__}: {exc}")
+        self.trace.add(self)
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": {"code": self.status, "message": self.status_message}
+        }
+
+
+class _NoopSpan:
+    """Returned when the current request isn't traced"""
+
+    def set_attribute(self, key: str, value: Any):
+        pass
+
+    def set_error(self, message: str):
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("trace_span", default=None)
+
+# Most recent finished traces, newest last
+traces: deque = deque(maxlen=TRACE_RING_SIZE)
+
+trace_logger = logging.getLogger("meal_metrics.traces")
+_export_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def span(name: str, kind: str = "INTERNAL", **attributes):
+    """A child of the current span, or NOOP_SPAN when the request isn't traced"""
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.trace, name, kind, parent.span_id, attributes)
+
+
+def current_span():
+    """The active span (to add attributes), or NOOP_SPAN"""
+    return _current_span.get() or NOOP_SPAN
+
+
+def traced(name: Optional[str] = None, kind: str = "INTERNAL"):
+    """Run a sync or async function inside a span named after it (or `name`)"""
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with span(span_name, kind):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with span(span_name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def parse_traceparent(value: str) -> Optional[tuple]:
+    """(trace ID, parent span ID) of a sampled W3C traceparent header, else None"""
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or parts[0] == "ff":
+        return None
+    try:
+        trace_id, parent_id, flags = int(parts[1], 16), int(parts[2], 16), int(parts[3][:2], 16)
+    except ValueError:
+        return None
+    if not trace_id or not parent_id or not flags & 1:
+        return None
+    return parts[1].lower(), parts[2].lower()
+
+
+def parse_networks(spec: str) -> List[_Network]:
+    """TRACE_TRUSTED_CLIENTS -> networks; a bare address is a network of one"""
+    return [ipaddress.ip_network(entry.strip(), strict=False) for entry in spec.split(",") if entry.strip()]
+
+
+trusted_networks = parse_networks(TRACE_TRUSTED_CLIENTS)
+
+
+async def _trusted(scope, api_key: Optional[bytes], networks: List[_Network]) -> bool:
+    """Whether a caller may decide sampling: it sends the admin key or connects from a trusted network"""
+    client = scope.get("client")
+    if client and networks:
+        try:
+            address = ipaddress.ip_address(client[0])
+        except ValueError:
+            address = None
+        if address is not None and any(address in network for network in networks):
+            return True
+    if api_key is None:
+        return False
+    # auth imports the store, which imports this module for traced()
+    from api.core.auth import is_admin_key
+
+    return await is_admin_key(api_key.decode("latin-1"))
+
+
+def configure_trace_export():
+    """Write finished spans to TRACE_EXPORT_FILE through a background thread (idempotent, no-op if unset)"""
+    global _export_listener
+    if _export_listener is not None or not TRACE_EXPORT_FILE:
+        return
+
+    export_queue: queue.Queue = queue.Queue(maxsize=10000)
+    writer = logging.handlers.RotatingFileHandler(
+        TRACE_EXPORT_FILE, maxBytes=TRACE_EXPORT_MAX_BYTES, backupCount=TRACE_EXPORT_BACKUPS, encoding="utf-8")
+    writer.setFormatter(logging.Formatter("%(message)s"))
+    _export_listener = logging.handlers.QueueListener(export_queue, writer)
+    _export_listener.start()
+    atexit.register(_export_listener.stop)
+
+    trace_logger.addHandler(NonBlockingQueueHandler(export_queue))
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False
+
+
+def _export(trace: Trace, root: Span):
+    spans = sorted((s.to_dict() for s in trace.spans), key=lambda s: s["startTimeUnixNano"])
+    traces.append({
+        "traceId": trace.trace_id,
+        "name": root.name,
+        "requestId": root.attributes.get("request_id"),
+        "startTimeUnixNano": root.start_ns,
+        "durationMs": round((root.end_ns - root.start_ns) / 1e6, 3),
+        "status": root.status,
+        "spanCount": len(spans),
+        "droppedSpans": trace.dropped,
+        "spans": spans
+    })
+    if _export_listener is not None:
+        for entry in spans:
+            trace_logger.info(json.dumps(entry, default=str))
+
+
+class TracingMiddleware:
+    """ASGI middleware opening the SERVER span of sampled requests"""
+
+    def __init__(self, app, sample_rate: float = TRACE_SAMPLE_RATE,
+                 trusted: Optional[List[_Network]] = None):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.trusted = trusted_networks if trusted is None else trusted
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        parent = api_key = None
+        for name, value in scope["headers"]:
+            if name == _TRACEPARENT_KEY:
+                parent = parse_traceparent(value.decode("latin-1"))
+            elif name == _API_KEY_KEY:
+                api_key = value
+        # Only looked up for requests asking to be traced
+        if parent is not None and not await _trusted(scope, api_key, self.trusted):
+            parent = None
+        if parent is None and not (self.sample_rate > 0 and random.random() < self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(parent[0] if parent else None)
+        root = Span(trace, f"{scope['method']} {scope['path']}", "SERVER", parent[1] if parent else None, {
+            "http.request.method": scope["method"],
+            "url.path": scope["path"],
+            "request_id": request_id_var.get()
+        })
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        root.__enter__()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            root.set_error(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            route = route_template(scope)
+            root.name = f"{scope['method']} {route}"
+            root.set_attribute("http.route", route)
+            root.set_attribute("http.response.status_code", status)
+            if status >= 500 and root.status != "ERROR":
+                root.set_error(f"HTTP {status}")
+            root.__exit__(None, None, None)
+            _export(trace, root)
@@ -0,0 +1,117 @@
+"""
+Startup warm-up
+
+A fresh process pays one-time costs on its first requests: the first sync
+endpoint imports anyio's thread backend and starts a worker thread,
+validators and parsers run for the first time, and the first /docs visit
+generates (or loads) the OpenAPI schema. The lifespan hook below does this
+work once at startup, before the server accepts connections, so the first
+real request doesn't wait for it.
+
+The warm-up has no side effects: it validates sample payloads and runs the
+pure helpers, but never touches the store. Set WARMUP_ENABLED=false to skip
+it, e.g. when measuring cold starts (benchmarks/bench_cold_start.py).
+
+The lifespan hook first sizes the threadpool (THREADPOOL_SIZE, see
+api.core.admission). Once the server is up it restores STORE_SNAPSHOT in the
+background; /readyz reports the process ready when that and the warm-up are
+done (see api.core.health).
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+from starlette.concurrency import run_in_threadpool
+
+from api.core.admission import configure_threadpool
+from api.core.health import readiness
+from api.core.log import logger
+from api.db.food_data import CATALOG_VERSION, food_db, resolve_food
+from api.db.models import STORE_SNAPSHOT, restore_snapshot
+from api.schemas import MealLog, UserCreate, WebhookMessage
+from api.utils.message_parser import parse_meal_message
+from api.utils.utils import calculate_bmr, calculate_tdee, get_nutrition_recommendations
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+
+
+def _warm_models():
+    profile = UserCreate(name="Warm Up", age=30, weight=70, height=175, gender="male")
+    profile.model_dump()
+    MealLog(userId="user_1", meal="Lunch", items=["rice", "dal"]).model_dump()
+    WebhookMessage(message="lunch: rice, dal")
+    parse_meal_message("breakfast: 2 eggs, 200g oats; dinner: roti")
+
+
+def _warm_catalog():
+    for name in food_db:
+        resolve_food(name.replace("_", " ").title())
+    resolve_food("not a food")
+
+
+def _warm_calculations():
+    bmr = calculate_bmr("female", 60, 165, 35)
+    calculate_tdee(bmr, "moderate")
+    get_nutrition_recommendations(35, "female", "maintain")
+
+
+def warm_up(app) -> dict:
+    """
+    Run every warm-up step
+
+    Returns: step name -> duration in milliseconds
+    """
+    steps = {
+        "models": _warm_models,
+        "catalog": _warm_catalog,
+        "calculations": _warm_calculations,
+        "openapi": app.openapi,
+    }
+    timings = {}
+    for name, step in steps.items():
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            # A failed warm-up step only means that work happens on the first request instead
+            logger.warning("Warm-up step %s failed: %s", name, e)
+        timings[name] = round((time.perf_counter() - start) * 1000, 2)
+    return timings
+
+
+async def _restore_snapshot():
+    try:
+        users, meals = await run_in_threadpool(restore_snapshot)
+    except Exception as e:
+        logger.exception("Snapshot restore failed", extra={"snapshot": STORE_SNAPSHOT})
+        readiness.finish("snapshot_restore", e)
+        return
+    readiness.finish("snapshot_restore", users=users, meals=meals)
+    logger.info("Snapshot restored", extra={"snapshot": STORE_SNAPSHOT, "users": users, "meals": meals})
+
+
+@asynccontextmanager
+async def lifespan(app):
+    configure_threadpool()
+    if WARMUP_ENABLED:
+        readiness.begin("warmup")
+        start = time.perf_counter()
+        # Through the threadpool, so its backend and first worker thread are ready too
+        timings = await run_in_threadpool(warm_up, app)
+        readiness.finish("warmup")
+        logger.info("Warm-up finished", extra={
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+            "steps_ms": timings,
+            "catalog_version": CATALOG_VERSION
+        })
+    restore = None
+    if STORE_SNAPSHOT:
+        readiness.begin("snapshot_restore")
+        # In the background, so the server answers liveness probes while it loads
+        restore = asyncio.create_task(_restore_snapshot())
+    # Every step has begun (or been skipped): from here on the steps alone decide readiness
+    readiness.registration_done()
+    yield
+    if restore is not None and not restore.done():
+        logger.warning("Shutting down before the snapshot restore finished")
@@ -0,0 +1,252 @@
+"""
+Slow-request watchdog
+
+SlowRequestMiddleware registers every HTTP request while it is in flight. A
+background thread wakes every WATCHDOG_INTERVAL_MS and, for each request that
+has been running longer than WATCHDOG_THRESHOLD_MS, records once:
+
+- the route template, method and path,
+- path and query parameters (values of sensitive-looking names redacted),
+- the elapsed time when it was caught,
+- a stack sample taken at that moment: the worker thread's stack while a sync
+  endpoint is running (watched() tracks which thread that is), otherwise the
+  event loop's stack if the request is blocking it, or the suspended task's
+  await chain.
+
+Records go into a bounded ring read through /admin/slow-requests; the final
+duration and status are filled in when the request completes. Event streams
+are excluded, since they are meant to stay open.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qsl
+
+from api.core.log import logger, request_id_var
+from api.core.metrics import SLOW_REQUESTS, route_template
+
+# Set to "false" to remove the watchdog entirely
+WATCHDOG_ENABLED = os.getenv("WATCHDOG_ENABLED", "true").lower() == "true"
+
+# Requests running longer than this are recorded (milliseconds)
+WATCHDOG_THRESHOLD_MS = float(os.getenv("WATCHDOG_THRESHOLD_MS", "1000"))
+
+# How often in-flight requests are checked (milliseconds)
+WATCHDOG_INTERVAL_MS = float(os.getenv("WATCHDOG_INTERVAL_MS", "100"))
+
+# Number of slow requests kept for /admin/slow-requests
+WATCHDOG_RING_SIZE = int(os.getenv("WATCHDOG_RING_SIZE", "50"))
+
+# Innermost frames kept per stack sample
+WATCHDOG_STACK_DEPTH = int(os.getenv("WATCHDOG_STACK_DEPTH", "30"))
+
+# Long-lived requests that are not watched (comma-separated path prefixes)
+WATCHDOG_EXCLUDE_PREFIXES = tuple(
+    prefix for prefix in os.getenv("WATCHDOG_EXCLUDE_PREFIXES", "/api/v1/stream/").split(",") if prefix
+)
+
+# Parameter names containing any of these are redacted
+SENSITIVE_NAMES = ("key", "token", "secret", "password", "auth", "session")
+REDACTED = "[redacted]"
+
+
+class _InFlight:
+    """A request being watched; thread_id is set while its sync endpoint runs in the threadpool"""
+    __slots__ = ("scope", "request_id", "start", "task", "loop_thread", "thread_id", "status", "record")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.request_id = request_id_var.get()
+        self.start = time.perf_counter()
+        self.task = asyncio.current_task()
+        self.loop_thread = threading.get_ident()
+        self.thread_id: Optional[int] = None
+        self.status = 500
+        self.record: Optional[dict] = None
+
+
+_current: contextvars.ContextVar[Optional[_InFlight]] = contextvars.ContextVar("watchdog_request", default=None)
+
+# Requests in flight, written only from the event loop; the watchdog reads copies
+_in_flight: Dict[int, _InFlight] = {}
+
+# Most recent slow requests, newest last
+slow_requests: deque = deque(maxlen=WATCHDOG_RING_SIZE)
+
+_watchdog_thread: Optional[threading.Thread] = None
+_watchdog_lock = threading.Lock()
+
+
+def watched(endpoint: Callable) -> Callable:
+    """Wrap a sync endpoint so the watchdog knows which worker thread to sample"""
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        state = _current.get()
+        if state is None:
+            return endpoint(*args, **kwargs)
+        state.thread_id = threading.get_ident()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            state.thread_id = None
+
+    return wrapper
+
+
+def redact_params(params) -> Dict[str, str]:
+    """Parameters as a dict, with values of sensitive-looking names replaced"""
+    redacted = {}
+    for name, value in params:
+        lowered = name.lower()
+        redacted[name] = REDACTED if any(word in lowered for word in SENSITIVE_NAMES) else value
+    return redacted
+
+
+def _format_frames(frames) -> List[str]:
+    summary = traceback.StackSummary.extract(((frame, frame.f_lineno) for frame in frames), limit=None)
+    return [line.rstrip("\n") for line in summary.format()][-WATCHDOG_STACK_DEPTH:]
+
+
+def _thread_frames(thread_id: int) -> list:
+    frame = sys._current_frames().get(thread_id)
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def _await_frames(task: asyncio.Task) -> list:
+    """Frames of a suspended task, following its await chain down to the innermost coroutine"""
+    frames = []
+    awaitable = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(frame)
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return frames
+
+
+def _sample_stack(state: _InFlight):
+    """Where the request is right now: (location, formatted stack with the innermost frame last)"""
+    thread_id = state.thread_id
+    if thread_id is not None:
+        return "worker_thread", _format_frames(_thread_frames(thread_id))
+    task = state.task
+    if task is not None:
+        try:
+            running = asyncio.current_task(task.get_loop()) is task
+        except RuntimeError:
+            running = False
+        if running:
+            # The request holds the event loop (e.g. sync work in an async endpoint)
+            return "event_loop", _format_frames(_thread_frames(state.loop_thread))
+        try:
+            return "awaiting", _format_frames(_await_frames(task))
+        except Exception:
+            pass
+    return "unknown", []
+
+
+def _capture(state: _InFlight, elapsed: float) -> dict:
+    scope = state.scope
+    where, stack = _sample_stack(state)
+    route = route_template(scope)
+    return {
+        "id": state.request_id,
+        "detected": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "method": scope["method"],
+        "route": route,
+        "path": scope["path"],
+        "path_params": redact_params((scope.get("path_params") or {}).items()),
+        "query_params": redact_params(parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)),
+        "elapsed_ms": round(elapsed * 1000, 2),
+        "where": where,
+        "stack": stack,
+        "duration_ms": None,
+        "status": None
+    }
+
+
+def check_in_flight(threshold_ms: float = WATCHDOG_THRESHOLD_MS):
+    """Record every in-flight request that crossed the threshold and hasn't been recorded yet"""
+    now = time.perf_counter()
+    for state in _in_flight.copy().values():
+        elapsed = now - state.start
+        if state.record is not None or elapsed * 1000 < threshold_ms:
+            continue
+        record = _capture(state, elapsed)
+        state.record = record
+        slow_requests.append(record)
+        SLOW_REQUESTS.inc(record["method"], record["route"])
+        logger.warning("Slow request %s %s", record["method"], record["path"], extra={
+            "slow_request_id": record["id"],
+            "route": record["route"],
+            "elapsed_ms": record["elapsed_ms"],
+            "where": record["where"],
+            "frame": record["stack"][-1] if record["stack"] else None
+        })
+
+
+def _watch():
+    interval = WATCHDOG_INTERVAL_MS / 1000
+    while True:
+        time.sleep(interval)
+        try:
+            check_in_flight()
+        except Exception:
+            logger.exception("Slow-request watchdog error")
+
+
+def _ensure_watchdog():
+    global _watchdog_thread
+    if _watchdog_thread is not None:
+        return
+    with _watchdog_lock:
+        if _watchdog_thread is None:
+            _watchdog_thread = threading.Thread(target=_watch, name="slow-request-watchdog", daemon=True)
+            _watchdog_thread.start()
+
+
+class SlowRequestMiddleware:
+    """ASGI middleware registering in-flight requests with the watchdog"""
+
+    def __init__(self, app, exclude_prefixes=WATCHDOG_EXCLUDE_PREFIXES):
+        self.app = app
+        self.exclude_prefixes = tuple(exclude_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude_prefixes):
+            await self.app(scope, receive, send)
+            return
+        _ensure_watchdog()
+
+        state = _InFlight(scope)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state.status = message["status"]
+            await send(message)
+
+        token = _current.set(state)
+        _in_flight[id(state)] = state
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            del _in_flight[id(state)]
+            _current.reset(token)
+            if state.record is not None:
+                state.record["duration_ms"] = round((time.perf_counter() - state.start) * 1000, 2)
+                state.record["status"] = state.status
@@ -0,0 +1,63 @@
+"""
+Awaitable access to the store for async endpoints
+
+The hot endpoints (registration, meal logging, meal history, nutrition
+status) are async, so a request costs no thread handoff when its work is a
+few dict operations. They reach the store through `astore`, whose methods
+mirror the store's:
+
+    user = await astore.get_user(user_id)
+
+With the in-memory store a call runs inline on the event loop: its methods
+only take short per-user locks. With a blocking backend (SQLite) it runs in
+store_executor, a dedicated pool of STORE_EXECUTOR_WORKERS threads, so disk
+I/O never stalls the event loop, and how many threads wait on the database
+is bounded separately from the general threadpool. Several store calls that
+belong together can share one hop with run_store(func, ...).
+
+Calls carry the caller's context (request ID, trace span) into the executor.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from api.db.models import store
+
+# Threads running blocking store calls (SQLite) for async endpoints
+STORE_EXECUTOR_WORKERS = int(os.getenv("STORE_EXECUTOR_WORKERS", "8"))
+
+store_executor = ThreadPoolExecutor(max_workers=STORE_EXECUTOR_WORKERS, thread_name_prefix="store")
+
+
+async def run_store(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run store-bound work: inline for the in-memory store, in store_executor for a blocking backend"""
+    if not store.blocking:
+        return func(*args, **kwargs)
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(store_executor, call)
+
+
+class AsyncStore:
+    """The store's methods as coroutines (attributes that aren't methods pass through)"""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._store, name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        async def method(*args, **kwargs):
+            return await run_store(attribute, *args, **kwargs)
+
+        # Built once per name
+        setattr(self, name, method)
+        return method
+
+
+astore = AsyncStore(store)
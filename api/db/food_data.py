@@ -1,3 +1,7 @@
+import hashlib
+import json
+from typing import Optional
+
 # Food Database with nutritional information (per 100g)
 food_db = {
     # Grains & Cereals
@@ -56,3 +60,46 @@ food_db = {
     "biryani": {"calories": 200, "protein": 8, "carbs": 35, "fiber": 2},
     "upma": {"calories": 158, "protein": 4.5, "carbs": 28, "fiber": 2}
 }
+
+# Case-insensitive lookup index (lowercase name -> food_db key), built once at import
+food_index = {name.lower(): name for name in food_db}
+
+# Keywords that put a food into a category of the /nutrition/foods listing
+CATEGORY_KEYWORDS = {
+    "grains": ['rice', 'roti', 'chapati', 'naan', 'paratha'],
+    "proteins": ['dal', 'chicken', 'fish', 'paneer', 'egg'],
+    "vegetables": ['cucumber', 'tomato', 'onion', 'potato', 'carrot', 'spinach'],
+    "fruits": ['apple', 'banana', 'orange']
+}
+
+# Category -> food_db keys, built once at import
+food_categories = {
+    category: [f for f in food_db if any(keyword in f.lower() for keyword in keywords)]
+    for category, keywords in CATEGORY_KEYWORDS.items()
+}
+
+# Fingerprint of the catalog contents; part of cache keys for derived nutrition data
+CATALOG_VERSION = hashlib.sha1(json.dumps(food_db, sort_keys=True).encode()).hexdigest()[:12]
+
+def resolve_food(name: str) -> Optional[str]:
+    """
+    Resolve a user-supplied food name to its food_db key
+
+    Matching is case-insensitive, treats spaces/hyphens as underscores
+    ("sweet potato" -> "sweet_potato") and tolerates simple singular/plural
+    mismatches ("egg" -> "eggs", "apples" -> "apple").
+
+    Returns None if the food is not in the database.
+    """
+    key = name.strip().lower().replace(" ", "_").replace("-", "_")
+    food = food_index.get(key)
+    if food is not None:
+        return food
+
+    for candidate in (key[:-1] if key.endswith("s") else None,
+                      key[:-2] if key.endswith("es") else None,
+                      key + "s",
+                      key + "es"):
+        if candidate and candidate in food_index:
+            return food_index[candidate]
+    return None
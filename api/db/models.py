@@ -1,46 +1,44 @@
 # Database Models and Storage for BMR Tracker
-from datetime import datetime, date
-from typing import Dict, List, Optional
+import os
+from typing import Optional
+from api.db.store import InMemoryStore
+from api.db.sqlite_store import SQLiteStore
+from api.db.snapshot import load_snapshot
+from api.core.tracing import traced
 
-# User Storage
-users_db: Dict[str, dict] = {}  # userId -> user_data
-user_lookup: Dict[str, str] = {}  # username -> userId
+# Storage backend: "memory" (single process) or "sqlite" (shared by uvicorn --workers N)
+STORE_BACKEND = os.getenv("STORE_BACKEND", "memory").lower()
+STORE_PATH = os.getenv("STORE_PATH", "meal_metrics.db")
 
-# Meal Storage
-meals_db: List[dict] = []  # List of all meal entries
+# Snapshot file loaded into the store at startup if it is empty (see api/db/snapshot.py and api/core/health.py)
+STORE_SNAPSHOT = os.getenv("STORE_SNAPSHOT")
+
+# User and Meal Storage (thread-safe; see api/db/store.py and api/db/sqlite_store.py)
+if STORE_BACKEND == "sqlite":
+    store = SQLiteStore(STORE_PATH)
+elif STORE_BACKEND == "memory":
+    store = InMemoryStore()
+else:
+    raise ValueError(f"Unknown STORE_BACKEND '{STORE_BACKEND}'. Use 'memory' or 'sqlite'")
+
+def restore_snapshot() -> tuple:
+    """Load STORE_SNAPSHOT into the store if it is set and the store is empty; returns (users, meals) loaded"""
+    if not STORE_SNAPSHOT or store.count_users():
+        return 0, 0
+    return load_snapshot(store, STORE_SNAPSHOT)
 
 # Activity Tracking
+@traced("store.update_user_activity")
 def update_user_activity(user_id: str, activity_type: str = "activity"):
-    """Update user activity timestamp and nutrient intake"""
-    if user_id in users_db:
-        users_db[user_id][f"last_{activity_type}"] = datetime.now().isoformat()
-
-        # Update nutrient intake if activity is meal
-        if activity_type == "meal":
-            nutrient_intake = {"calories": 0, "protein": 0, "carbs": 0, "fiber": 0}
-            for meal in meals_db:
-                if meal["userId"] == user_id and meal["loggedAt"] == date.today():
-                    for nutrient in nutrient_intake:
-                        nutrient_intake[nutrient] += meal["nutrition"][nutrient]
+    """
+    Update user activity timestamp
 
-            # Update user's nutrient intake
-            users_db[user_id]["nutrient_intake"] = nutrient_intake
+    Meal activity and nutrient intake are maintained by store.add_meals.
+    """
+    store.touch_activity(user_id, activity_type)
 
 # User Lookup Function
+@traced("store.find_user")
 def get_user_by_identifier(identifier: str) -> Optional[tuple]:
     """Get user by userId, username, or email"""
-    # Check if it's a direct userId
-    if identifier in users_db:
-        return (identifier, users_db[identifier])
-    
-    # Check username lookup
-    if identifier in user_lookup:
-        user_id = user_lookup[identifier]
-        return (user_id, users_db[user_id])
-    
-    # Check email in user data
-    for user_id, user_data in users_db.items():
-        if user_data.get('email', '').lower() == identifier.lower():
-            return (user_id, user_data)
-    
-    return None
+    return store.find_user(identifier)
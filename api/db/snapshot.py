@@ -0,0 +1,82 @@
+"""
+Store snapshot files
+
+A snapshot is a JSON-lines file (gzip-compressed when the name ends in .gz):
+a header line, then one line per user holding the profile and all of the
+user's meals:
+
+    {"format": "meal-metrics-snapshot", "version": 1, "created": "...", ...}
+    {"userId": "user_1", "user": {...profile...}, "meals": [{...meal...}, ...]}
+
+benchmarks/workload.py generates snapshots with a realistic production
+shape; setting STORE_SNAPSHOT loads one into an empty store at startup.
+Users are re-created through the store, so they may be assigned different
+userIds than in the file; their meals follow them.
+"""
+import gzip
+import json
+from datetime import date, datetime, timezone
+from typing import IO, Iterable, Tuple
+
+SNAPSHOT_FORMAT = "meal-metrics-snapshot"
+SNAPSHOT_VERSION = 1
+
+
+def open_snapshot(path: str, mode: str = "r") -> IO[str]:
+    """Open a snapshot file for text reading or writing, gzip-compressed if the name ends in .gz"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def write_snapshot(path: str, users: Iterable[Tuple[str, dict, list]], /, **meta) -> Tuple[int, int]:
+    """
+    Write (userId, profile, meals) triples to a snapshot file
+
+    Extra keyword arguments are stored in the header (e.g. generator settings).
+    Returns: (users written, meals written)
+    """
+    user_count = meal_count = 0
+    with open_snapshot(path, "w") as f:
+        header = {
+            "format": SNAPSHOT_FORMAT,
+            "version": SNAPSHOT_VERSION,
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            **meta
+        }
+        f.write(json.dumps(header) + "\n")
+        for user_id, record, meals in users:
+            f.write(json.dumps({"userId": user_id, "user": record, "meals": meals}, default=str) + "\n")
+            user_count += 1
+            meal_count += len(meals)
+    return user_count, meal_count
+
+
+def load_snapshot(store, path: str) -> Tuple[int, int]:
+    """
+    Load a snapshot file into a store
+
+    Returns: (users loaded, meals loaded)
+    """
+    user_count = meal_count = 0
+    with open_snapshot(path) as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"{path} is not a meal-metrics snapshot")
+        if header.get("version", 0) > SNAPSHOT_VERSION:
+            raise ValueError(f"{path} has snapshot version {header['version']}; this build reads up to {SNAPSHOT_VERSION}")
+
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            user_id = store.create_user(entry["user"])
+            meals = entry["meals"]
+            for meal in meals:
+                meal["userId"] = user_id
+                meal["loggedAt"] = date.fromisoformat(meal["loggedAt"])
+            if meals:
+                store.add_meals(user_id, meals)
+            user_count += 1
+            meal_count += len(meals)
+    return user_count, meal_count
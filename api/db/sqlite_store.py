@@ -0,0 +1,435 @@
+"""
+SQLite-backed store shared by several uvicorn worker processes
+
+Drop-in replacement for InMemoryStore (same methods and return shapes) used
+when STORE_BACKEND=sqlite. All workers open the same database file in WAL
+mode, so readers never block the writer and every worker sees the same users,
+meals and daily aggregates.
+
+- User IDs are allocated from the users table's INTEGER PRIMARY KEY inside a
+  write transaction, so they are unique across processes.
+- Meal appends and aggregate updates run in one BEGIN IMMEDIATE transaction.
+- Every change to a user's record or meals bumps their version column,
+  which read endpoints expose as an ETag.
+- User records are cached per process. Each connection checks
+  PRAGMA data_version before serving from the cache; the value changes
+  whenever another connection (in any worker) commits, which clears the cache.
+  Every clear or drop starts a new cache generation, and a record read in an
+  earlier generation is not cached: it may predate the commit that caused
+  the clear.
+"""
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime
+from types import MappingProxyType
+from typing import Dict, List, Optional, Tuple
+
+from api.core.memory import estimate_size, usage
+from api.db.store import NUTRIENTS, StoreSnapshot, empty_nutrients
+
+# Maximum number of user records cached per process
+CACHE_SIZE = int(os.getenv("STORE_CACHE_SIZE", "10000"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT UNIQUE,
+    name TEXT NOT NULL,
+    email TEXT,
+    record TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS users_name ON users(name);
+CREATE INDEX IF NOT EXISTS users_email ON users(email);
+CREATE TABLE IF NOT EXISTS meals (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    logged_at TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS meals_user ON meals(user_id, id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS api_keys (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    key_hash TEXT UNIQUE NOT NULL,
+    record TEXT NOT NULL
+);
+"""
+
+
+def _encode(value: dict) -> str:
+    return json.dumps(value, default=str, separators=(",", ":"))
+
+
+def _decode_meal(entry: str) -> dict:
+    meal = json.loads(entry)
+    # Routers compare loggedAt against date objects
+    meal["loggedAt"] = date.fromisoformat(meal["loggedAt"])
+    return meal
+
+
+class SQLiteStore:
+    """Process-shared storage for users, meals and per-user daily aggregates"""
+
+    # Writes made by other workers are only visible through the database
+    shared = True
+
+    # Calls wait on disk and other writers; async endpoints run them in the store executor
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._cache: Dict[str, dict] = {}
+        self._cache_lock = threading.Lock()
+        # Bumped whenever cached records may have gone stale (see _cache_put)
+        self._cache_generation = 0
+        self._epochs = itertools.count(1)
+        self._conn().executescript(_SCHEMA)
+        self.instance_id = self._instance_id()
+
+    # -- connections and transactions ------------------------------------------
+
+    def _conn(self) -> sqlite3.Connection:
+        """Per-thread connection in autocommit mode (transactions are explicit)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.data_version = None
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @contextmanager
+    def _read(self):
+        """Read transaction: every query inside sees the same database version"""
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            conn.execute("COMMIT")
+
+    def _instance_id(self) -> str:
+        """Identifies this database file in ETags; created by whichever worker starts first"""
+        with self._write() as conn:
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('instance_id', ?)", (uuid.uuid4().hex[:8],))
+            return conn.execute("SELECT value FROM meta WHERE key = 'instance_id'").fetchone()[0]
+
+    # -- cross-worker cache ----------------------------------------------------
+
+    def _sync_cache(self):
+        """Drop cached records if any other connection committed since we last looked"""
+        version = self._conn().execute("PRAGMA data_version").fetchone()[0]
+        if version != self._local.data_version:
+            self._local.data_version = version
+            with self._cache_lock:
+                self._cache.clear()
+                self._cache_generation += 1
+
+    def _cache_put(self, user_id: str, record: dict, generation: int):
+        """Cache a record read in `generation`, unless the cache was cleared or dropped from since"""
+        with self._cache_lock:
+            if generation != self._cache_generation:
+                return
+            if len(self._cache) >= CACHE_SIZE:
+                self._cache.clear()
+            self._cache[user_id] = record
+
+    def _cache_drop(self, user_id: str):
+        with self._cache_lock:
+            self._cache.pop(user_id, None)
+            self._cache_generation += 1
+
+    # -- users -----------------------------------------------------------------
+
+    def create_user(self, record: dict) -> str:
+        """Store a new user record and return its allocated userId"""
+        with self._write() as conn:
+            seq = conn.execute(
+                "INSERT INTO users (name, email, record) VALUES (?, ?, ?)",
+                (record["name"], (record.get("email") or "").lower() or None, _encode(record))
+            ).lastrowid
+            user_id = f"user_{seq}"
+            conn.execute("UPDATE users SET user_id = ? WHERE seq = ?", (user_id, seq))
+        return user_id
+
+    def update_user(self, user_id: str, fields: dict) -> Optional[dict]:
+        """Update profile fields; returns the new record or None if the user doesn't exist"""
+        with self._write() as conn:
+            row = conn.execute("SELECT record FROM users WHERE user_id = ?", (user_id,)).fetchone()
+            if row is None:
+                return None
+            user = json.loads(row[0])
+            user.update(fields)
+            conn.execute(
+                "UPDATE users SET name = ?, email = ?, record = ?, version = version + 1 WHERE user_id = ?",
+                (user["name"], (user.get("email") or "").lower() or None, _encode(user), user_id)
+            )
+        self._cache_drop(user_id)
+        return user
+
+    def user_exists(self, user_id: str) -> bool:
+        return self.get_user(user_id) is not None
+
+    def get_user(self, user_id: str) -> Optional[dict]:
+        """Copy of a user's record, or None"""
+        self._sync_cache()
+        cached = self._cache.get(user_id)
+        if cached is not None:
+            return dict(cached)
+
+        # Read before the SELECT: a clear or drop after it means the row may already be stale
+        generation = self._cache_generation
+        row = self._conn().execute("SELECT record FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            return None
+        user = json.loads(row[0])
+        self._cache_put(user_id, user, generation)
+        return dict(user)
+
+    def user_version(self, user_id: str) -> Optional[int]:
+        """Current version of a user's profile and meals, or None if the user doesn't exist"""
+        row = self._conn().execute("SELECT version FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def lookup_user_id(self, username: str) -> Optional[str]:
+        # Latest registration wins, matching the in-memory name index
+        row = self._conn().execute(
+            "SELECT user_id FROM users WHERE name = ? ORDER BY seq DESC LIMIT 1", (username,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def find_user(self, identifier: str) -> Optional[Tuple[str, dict]]:
+        """Get user by userId, username, or email"""
+        user = self.get_user(identifier)
+        if user is not None:
+            return (identifier, user)
+
+        user_id = self.lookup_user_id(identifier)
+        if user_id is None:
+            row = self._conn().execute(
+                "SELECT user_id FROM users WHERE email = ? ORDER BY seq DESC LIMIT 1", (identifier.lower(),)
+            ).fetchone()
+            user_id = row[0] if row else None
+        if user_id is None:
+            return None
+        user = self.get_user(user_id)
+        return (user_id, user) if user is not None else None
+
+    def list_users(self) -> List[Tuple[str, dict]]:
+        """Snapshot of (userId, record) pairs in registration order"""
+        rows = self._conn().execute("SELECT user_id, record FROM users ORDER BY seq").fetchall()
+        return [(user_id, json.loads(record)) for user_id, record in rows]
+
+    def count_users(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    # -- meals -----------------------------------------------------------------
+
+    def add_meals(self, user_id: str, entries: List[dict]) -> Optional[dict]:
+        """
+        Append meal entries for a user and update their activity and daily intake
+
+        Returns today's intake snapshot ({"date", "nutrient_intake"}), or None
+        if the user does not exist (nothing is stored in that case).
+        """
+        today = date.today()
+        with self._write() as conn:
+            row = conn.execute("SELECT record FROM users WHERE user_id = ?", (user_id,)).fetchone()
+            if row is None:
+                return None
+            user = json.loads(row[0])
+
+            conn.executemany(
+                "INSERT INTO meals (user_id, logged_at, entry) VALUES (?, ?, ?)",
+                [(user_id, str(meal["loggedAt"]), _encode(meal)) for meal in entries]
+            )
+
+            user["last_meal"] = datetime.now().isoformat()
+            if user.get("nutrient_intake_date") != today.isoformat():
+                intake = empty_nutrients()
+                for (entry,) in conn.execute(
+                    "SELECT entry FROM meals WHERE user_id = ? AND logged_at = ?", (user_id, today.isoformat())
+                ):
+                    nutrition = json.loads(entry)["nutrition"]
+                    for nutrient in NUTRIENTS:
+                        intake[nutrient] += nutrition[nutrient]
+                user["nutrient_intake"] = intake
+                user["nutrient_intake_date"] = today.isoformat()
+            else:
+                intake = user["nutrient_intake"]
+                for meal in entries:
+                    if meal["loggedAt"] == today:
+                        for nutrient in NUTRIENTS:
+                            intake[nutrient] += meal["nutrition"][nutrient]
+
+            conn.execute(
+                "UPDATE users SET record = ?, version = version + 1 WHERE user_id = ?", (_encode(user), user_id)
+            )
+        self._cache_drop(user_id)
+        return {"date": today.isoformat(), "nutrient_intake": dict(user["nutrient_intake"])}
+
+    def touch_activity(self, user_id: str, activity_type: str = "activity"):
+        """Record an activity timestamp for a user"""
+        self.update_user(user_id, {f"last_{activity_type}": datetime.now().isoformat()})
+
+    def get_user_meals(self, user_id: str, on_date: Optional[date] = None) -> List[dict]:
+        """Snapshot of a user's meals in log order, optionally for a single date"""
+        if on_date:
+            rows = self._conn().execute(
+                "SELECT entry FROM meals WHERE user_id = ? AND logged_at = ? ORDER BY id", (user_id, str(on_date))
+            )
+        else:
+            rows = self._conn().execute("SELECT entry FROM meals WHERE user_id = ? ORDER BY id", (user_id,))
+        return [_decode_meal(entry) for (entry,) in rows]
+
+    def get_user_and_meals(self, user_id: str) -> Optional[Tuple[dict, List[dict]]]:
+        """Copy of a user's record and their meals in log order, from one read transaction, or None"""
+        with self._read() as conn:
+            row = conn.execute("SELECT record FROM users WHERE user_id = ?", (user_id,)).fetchone()
+            if row is None:
+                return None
+            rows = conn.execute("SELECT entry FROM meals WHERE user_id = ? ORDER BY id", (user_id,)).fetchall()
+        return json.loads(row[0]), [_decode_meal(entry) for (entry,) in rows]
+
+    def daily_intake(self, user_id: str) -> dict:
+        """Today's running totals for a user ({"date", "nutrient_intake"})"""
+        today = date.today().isoformat()
+        user = self.get_user(user_id) or {}
+        if user.get("nutrient_intake_date") == today:
+            return {"date": today, "nutrient_intake": dict(user["nutrient_intake"])}
+        return {"date": today, "nutrient_intake": empty_nutrients()}
+
+    def count_meals(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM meals").fetchone()[0]
+
+    def meals_since(self, cursor: int, limit: int = 1000) -> Tuple[int, List[dict]]:
+        """Meals committed by any worker after the given meal id: (new cursor, entries)"""
+        rows = self._conn().execute(
+            "SELECT id, entry FROM meals WHERE id > ? ORDER BY id LIMIT ?", (cursor, limit)
+        ).fetchall()
+        if not rows:
+            return cursor, []
+        return rows[-1][0], [_decode_meal(entry) for _, entry in rows]
+
+    def last_meal_id(self) -> int:
+        return self._conn().execute("SELECT COALESCE(MAX(id), 0) FROM meals").fetchone()[0]
+
+    # -- API keys --------------------------------------------------------------
+
+    def add_api_key(self, key_hash: str, record: dict):
+        with self._write() as conn:
+            conn.execute("INSERT INTO api_keys (key_hash, record) VALUES (?, ?)", (key_hash, _encode(record)))
+
+    def get_api_key(self, key_hash: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT record FROM api_keys WHERE key_hash = ?", (key_hash,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete_api_key(self, key_hash: str) -> bool:
+        with self._write() as conn:
+            return conn.execute("DELETE FROM api_keys WHERE key_hash = ?", (key_hash,)).rowcount > 0
+
+    def list_api_keys(self) -> List[Tuple[str, dict]]:
+        """(key hash, record) pairs in issue order"""
+        rows = self._conn().execute("SELECT key_hash, record FROM api_keys ORDER BY seq").fetchall()
+        return [(key_hash, json.loads(record)) for key_hash, record in rows]
+
+    # -- snapshots -------------------------------------------------------------
+
+    def snapshot(self) -> StoreSnapshot:
+        """
+        Immutable copy of all users and meals from a single read transaction
+
+        In WAL mode the read transaction pins one database version without
+        blocking writers in this or any other worker. Every meal is decoded,
+        so admin statistics use meal_stats and user_meal_counts instead.
+        """
+        with self._read() as conn:
+            users = {
+                user_id: json.loads(record)
+                for user_id, record in conn.execute("SELECT user_id, record FROM users ORDER BY seq")
+            }
+            meals = tuple(_decode_meal(entry) for (entry,) in conn.execute("SELECT entry FROM meals ORDER BY id"))
+        return StoreSnapshot(epoch=next(self._epochs), users=MappingProxyType(users), meals=meals)
+
+    def meal_stats(self, on_date: date) -> dict:
+        """
+        Totals over every meal, and the meals logged on one date, aggregated in SQL
+
+        Same shape as InMemoryStore.meal_stats. The queries share one read
+        transaction, so they agree with each other, and no meal is decoded
+        in Python.
+        """
+        sums = ", ".join(f"COALESCE(SUM(json_extract(entry, '$.nutrition.{nutrient}')), 0)" for nutrient in NUTRIENTS)
+        with self._read() as conn:
+            users = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+            meals, *totals = conn.execute(f"SELECT COUNT(*), {sums} FROM meals").fetchone()
+            active = conn.execute(
+                "SELECT COUNT(DISTINCT user_id) FROM meals WHERE logged_at = ?", (on_date.isoformat(),)
+            ).fetchone()[0]
+            meal_types = dict(conn.execute(
+                "SELECT LOWER(COALESCE(json_extract(entry, '$.meal'), '')), COUNT(*) FROM meals "
+                "WHERE logged_at = ? GROUP BY 1", (on_date.isoformat(),)
+            ))
+        return {
+            "epoch": next(self._epochs),
+            "users": users,
+            "meals": meals,
+            "nutrient_totals": dict(zip(NUTRIENTS, totals)),
+            "active_users": active,
+            "meals_on_date": sum(meal_types.values()),
+            "meal_types": meal_types
+        }
+
+    def user_meal_counts(self) -> Tuple[int, List[Tuple[str, dict, int]]]:
+        """(epoch, [(userId, record, meals logged)]) in registration order, counted in SQL"""
+        rows = self._conn().execute(
+            "SELECT user_id, record, (SELECT COUNT(*) FROM meals WHERE meals.user_id = users.user_id) "
+            "FROM users ORDER BY seq"
+        ).fetchall()
+        return next(self._epochs), [(user_id, json.loads(record), count) for user_id, record, count in rows]
+
+    # -- memory ----------------------------------------------------------------
+
+    def memory_usage(self) -> Dict[str, dict]:
+        """
+        Object counts and estimated bytes of the record cache, and the size of the database
+
+        Users, meals and their indexes live in the database file (and its WAL),
+        shared by all workers; only the pages SQLite caches per connection are
+        held in memory.
+        """
+        with self._cache_lock:
+            cache = self._cache.copy()
+        with self._read() as conn:
+            users, meals, page_count, page_size = conn.execute(
+                "SELECT (SELECT COUNT(*) FROM users), (SELECT COUNT(*) FROM meals), "
+                "(SELECT page_count FROM pragma_page_count), (SELECT page_size FROM pragma_page_size)"
+            ).fetchone()
+        wal_path = self.path + "-wal"
+        wal_size = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+        return {
+            "record_cache": usage(len(cache), estimate_size(cache)),
+            "database_file": {**usage(users + meals, page_count * page_size + wal_size), "on_disk": True},
+        }
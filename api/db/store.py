@@ -0,0 +1,381 @@
+"""
+Concurrency-safe in-memory store for users and meals
+
+Sync endpoints run in the anyio threadpool and async endpoints call it from
+the event loop, so every mutation of the shared containers goes through this
+class:
+
+- User IDs come from an atomic counter (itertools.count is a single C-level
+  call under the GIL), so concurrent registrations never hand out the same ID.
+- Meal appends and per-user aggregate updates take a striped lock chosen by
+  user ID: writers for different users rarely contend, writers for the same
+  user are serialized.
+- User records are copy-on-write: writers build a new record and publish it
+  by replacing the dict entry, never by mutating a record in place. Meal
+  lists are append-only.
+
+Registration and profile changes take the registry lock, which also guards the
+name/email lookup indexes.
+
+Publishing a change (swapping in a record, appending meals) happens under a
+short publish lock and advances the store's epoch. Long-running readers such
+as admin listings and analytics call snapshot(), which pins an immutable view
+of one epoch: a copy of the user table (records themselves are shared, since
+they are never mutated) and the current length of the append-only meal log.
+Readers then iterate at their own pace while writers keep appending to the
+head version, and a snapshot is reused until the next write.
+
+Each user also has a version that increases with every change to their
+record or meals; read endpoints expose it as an ETag.
+"""
+import itertools
+import os
+import sys
+import threading
+import uuid
+from datetime import date, datetime
+from types import MappingProxyType
+from typing import Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+from api.core.memory import estimate_items, estimate_size, usage
+
+NUTRIENTS = ("calories", "protein", "carbs", "fiber")
+
+# Number of per-user lock stripes (a power of two spreads hash() well)
+LOCK_STRIPES = int(os.getenv("STORE_LOCK_STRIPES", "64"))
+
+
+def empty_nutrients() -> dict:
+    return {nutrient: 0 for nutrient in NUTRIENTS}
+
+
+class MealLogView(Sequence):
+    """Read-only view of the first `length` entries of an append-only meal log"""
+
+    __slots__ = ("_meals", "_length")
+
+    def __init__(self, meals: List[dict], length: int):
+        self._meals = meals
+        self._length = length
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._meals[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("meal index out of range")
+        return self._meals[index]
+
+    def __iter__(self) -> Iterator[dict]:
+        return itertools.islice(self._meals, self._length)
+
+
+class StoreSnapshot(NamedTuple):
+    """
+    Immutable view of the store at one epoch
+
+    users maps userId -> record and meals holds every meal entry in log order.
+    Records and entries are shared with the live store; treat them as read-only.
+    """
+    epoch: int
+    users: Mapping[str, dict]
+    meals: Sequence[dict]
+
+
+class InMemoryStore:
+    """Thread-safe storage for users, meals and per-user daily aggregates"""
+
+    # State lives in this process only (see SQLiteStore for the shared backend)
+    shared = False
+
+    # Calls are quick enough to make from the event loop (see api/db/async_store.py)
+    blocking = False
+
+    def __init__(self, stripes: int = LOCK_STRIPES):
+        self._users: Dict[str, dict] = {}            # userId -> user_data
+        self._user_lookup: Dict[str, str] = {}       # username -> userId
+        self._email_lookup: Dict[str, str] = {}      # lowercase email -> userId
+        self._meals: List[dict] = []                 # all meal entries, in log order
+        self._meals_by_user: Dict[str, List[dict]] = {}
+        self._versions: Dict[str, int] = {}          # userId -> version
+        self._api_keys: Dict[str, dict] = {}         # API key hash -> key record
+
+        # Versions restart with the process; the instance id keeps old ETags from matching
+        self.instance_id = uuid.uuid4().hex[:8]
+        self._id_counter = itertools.count(1)
+        self._registry_lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+
+        # Always the innermost lock; held only to publish or to pin a snapshot
+        self._publish_lock = threading.Lock()
+        self._epoch = 0
+        self._snapshot: Optional[StoreSnapshot] = None
+
+    # -- locking -------------------------------------------------------------
+
+    def _lock_for(self, user_id: str) -> threading.Lock:
+        return self._stripes[hash(user_id) % len(self._stripes)]
+
+    def _publish(self, user_id: str, record: dict, entries: List[dict] = ()):
+        """Make a new user record (and any new meals) visible as one epoch"""
+        with self._publish_lock:
+            self._users[user_id] = record
+            if entries:
+                self._meals_by_user.setdefault(user_id, []).extend(entries)
+                self._meals.extend(entries)
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._epoch += 1
+
+    # -- users ---------------------------------------------------------------
+
+    def create_user(self, record: dict) -> str:
+        """Store a new user record and return its allocated userId"""
+        with self._registry_lock:
+            while True:
+                user_id = f"user_{next(self._id_counter)}"
+                if user_id not in self._users:
+                    break
+            self._publish(user_id, dict(record))
+            self._index_user(user_id, record)
+        return user_id
+
+    def _index_user(self, user_id: str, record: dict, previous: Optional[dict] = None):
+        if previous is not None:
+            # Unindex the replaced name and email, unless a later registration has taken them over
+            if previous["name"] != record["name"] and self._user_lookup.get(previous["name"]) == user_id:
+                del self._user_lookup[previous["name"]]
+            old_email = (previous.get("email") or "").lower()
+            new_email = (record.get("email") or "").lower()
+            if old_email and old_email != new_email and self._email_lookup.get(old_email) == user_id:
+                del self._email_lookup[old_email]
+        # Update lookup table by name for easier searching
+        self._user_lookup[record["name"]] = user_id
+        if record.get("email"):
+            self._email_lookup[record["email"].lower()] = user_id
+
+    def update_user(self, user_id: str, fields: dict) -> Optional[dict]:
+        """Update profile fields; returns the new record or None if the user doesn't exist"""
+        with self._registry_lock, self._lock_for(user_id):
+            previous = self._users.get(user_id)
+            if previous is None:
+                return None
+            user = {**previous, **fields}
+            self._publish(user_id, user)
+            self._index_user(user_id, user, previous)
+            return dict(user)
+
+    def user_exists(self, user_id: str) -> bool:
+        return user_id in self._users
+
+    def get_user(self, user_id: str) -> Optional[dict]:
+        """Copy of a user's record, or None"""
+        # Records are replaced, never mutated, so no lock is needed to read one
+        user = self._users.get(user_id)
+        return dict(user) if user is not None else None
+
+    def user_version(self, user_id: str) -> Optional[int]:
+        """Current version of a user's profile and meals, or None if the user doesn't exist"""
+        return self._versions.get(user_id)
+
+    def lookup_user_id(self, username: str) -> Optional[str]:
+        return self._user_lookup.get(username)
+
+    def find_user(self, identifier: str) -> Optional[Tuple[str, dict]]:
+        """Get user by userId, username, or email"""
+        user_id = identifier if identifier in self._users else (
+            self._user_lookup.get(identifier) or self._email_lookup.get(identifier.lower())
+        )
+        if user_id is None:
+            return None
+        user = self.get_user(user_id)
+        return (user_id, user) if user is not None else None
+
+    def list_users(self) -> List[Tuple[str, dict]]:
+        """Snapshot of (userId, record) pairs in registration order"""
+        return [(user_id, dict(user)) for user_id, user in self.snapshot().users.items()]
+
+    def count_users(self) -> int:
+        return len(self._users)
+
+    # -- meals ---------------------------------------------------------------
+
+    def add_meals(self, user_id: str, entries: List[dict]) -> Optional[dict]:
+        """
+        Append meal entries for a user and update their activity and daily intake
+
+        Returns today's intake snapshot ({"date", "nutrient_intake"}), or None
+        if the user does not exist (nothing is stored in that case).
+        """
+        today = date.today()
+        with self._lock_for(user_id):
+            user = self._users.get(user_id)
+            if user is None:
+                return None
+
+            user = dict(user)
+            user["last_meal"] = datetime.now().isoformat()
+            if user.get("nutrient_intake_date") != today.isoformat():
+                user["nutrient_intake"] = self._sum_nutrients(
+                    m for m in itertools.chain(self._meals_by_user.get(user_id, ()), entries)
+                    if m["loggedAt"] == today
+                )
+                user["nutrient_intake_date"] = today.isoformat()
+            else:
+                intake = dict(user["nutrient_intake"])
+                for meal in entries:
+                    if meal["loggedAt"] == today:
+                        for nutrient in NUTRIENTS:
+                            intake[nutrient] += meal["nutrition"][nutrient]
+                user["nutrient_intake"] = intake
+
+            self._publish(user_id, user, entries)
+            return {"date": today.isoformat(), "nutrient_intake": dict(user["nutrient_intake"])}
+
+    @staticmethod
+    def _sum_nutrients(meals: Iterable[dict]) -> dict:
+        totals = empty_nutrients()
+        for meal in meals:
+            for nutrient in NUTRIENTS:
+                totals[nutrient] += meal["nutrition"][nutrient]
+        return totals
+
+    def touch_activity(self, user_id: str, activity_type: str = "activity"):
+        """Record an activity timestamp for a user"""
+        with self._lock_for(user_id):
+            user = self._users.get(user_id)
+            if user is not None:
+                self._publish(user_id, {**user, f"last_{activity_type}": datetime.now().isoformat()})
+
+    def get_user_meals(self, user_id: str, on_date: Optional[date] = None) -> List[dict]:
+        """Snapshot of a user's meals in log order, optionally for a single date"""
+        # Per-user lists are append-only; copying one is a single atomic operation
+        meals = list(self._meals_by_user.get(user_id, ()))
+        if on_date:
+            meals = [m for m in meals if str(m["loggedAt"]) == str(on_date)]
+        return meals
+
+    def get_user_and_meals(self, user_id: str) -> Optional[Tuple[dict, List[dict]]]:
+        """Copy of a user's record and their meals in log order, from the same epoch, or None"""
+        # Pinned like snapshot(): the record and the length of the append-only meal list
+        with self._publish_lock:
+            user = self._users.get(user_id)
+            meals = self._meals_by_user.get(user_id, [])
+            length = len(meals)
+        if user is None:
+            return None
+        return dict(user), meals[:length]
+
+    def daily_intake(self, user_id: str) -> dict:
+        """Today's running totals for a user ({"date", "nutrient_intake"})"""
+        today = date.today().isoformat()
+        user = self._users.get(user_id) or {}
+        if user.get("nutrient_intake_date") == today:
+            return {"date": today, "nutrient_intake": dict(user["nutrient_intake"])}
+        return {"date": today, "nutrient_intake": empty_nutrients()}
+
+    def count_meals(self) -> int:
+        return len(self._meals)
+
+    # -- API keys --------------------------------------------------------------
+
+    def add_api_key(self, key_hash: str, record: dict):
+        self._api_keys[key_hash] = dict(record)
+
+    def get_api_key(self, key_hash: str) -> Optional[dict]:
+        record = self._api_keys.get(key_hash)
+        return dict(record) if record is not None else None
+
+    def delete_api_key(self, key_hash: str) -> bool:
+        return self._api_keys.pop(key_hash, None) is not None
+
+    def list_api_keys(self) -> List[Tuple[str, dict]]:
+        """(key hash, record) pairs in issue order"""
+        return [(key_hash, dict(record)) for key_hash, record in list(self._api_keys.items())]
+
+    # -- snapshots -----------------------------------------------------------
+
+    def snapshot(self) -> StoreSnapshot:
+        """
+        Pin an immutable view of the current epoch
+
+        Writers are held off only while the user table is copied (skipped
+        entirely if nothing changed since the last snapshot); the meal log is
+        pinned by length, so holding a snapshot never blocks ingestion.
+        """
+        with self._publish_lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.epoch != self._epoch:
+                snapshot = StoreSnapshot(
+                    epoch=self._epoch,
+                    users=MappingProxyType(self._users.copy()),
+                    meals=MealLogView(self._meals, len(self._meals))
+                )
+                self._snapshot = snapshot
+        return snapshot
+
+    def meal_stats(self, on_date: date) -> dict:
+        """
+        Totals over every meal, and the meals logged on one date, from one snapshot
+
+        Returns {"epoch", "users", "meals", "nutrient_totals", "active_users",
+        "meals_on_date", "meal_types"}, where meal_types counts the meals
+        logged on the date by lowercase meal type.
+        """
+        snapshot = self.snapshot()
+        totals = empty_nutrients()
+        meal_types: Dict[str, int] = {}
+        active = set()
+        for meal in snapshot.meals:
+            for nutrient in NUTRIENTS:
+                totals[nutrient] += meal["nutrition"].get(nutrient, 0)
+            if meal["loggedAt"] == on_date:
+                active.add(meal["userId"])
+                meal_type = meal.get("meal", "").lower()
+                meal_types[meal_type] = meal_types.get(meal_type, 0) + 1
+        return {
+            "epoch": snapshot.epoch,
+            "users": len(snapshot.users),
+            "meals": len(snapshot.meals),
+            "nutrient_totals": totals,
+            "active_users": len(active),
+            "meals_on_date": sum(meal_types.values()),
+            "meal_types": meal_types
+        }
+
+    def user_meal_counts(self) -> Tuple[int, List[Tuple[str, dict, int]]]:
+        """(epoch, [(userId, record, meals logged)]) in registration order, from one snapshot"""
+        snapshot = self.snapshot()
+        counts: Dict[str, int] = {}
+        for meal in snapshot.meals:
+            counts[meal["userId"]] = counts.get(meal["userId"], 0) + 1
+        return snapshot.epoch, [(user_id, user, counts.get(user_id, 0)) for user_id, user in snapshot.users.items()]
+
+    # -- memory ----------------------------------------------------------------
+
+    def memory_usage(self) -> Dict[str, dict]:
+        """
+        Object counts and estimated bytes of each structure (see api/core/memory.py)
+
+        Records and meal entries are counted in users and meals; the indexes
+        and the snapshot pinned for readers only count their references to them.
+        """
+        # Measured from copies (single C-level calls), so writers can keep going
+        pinned = self._snapshot
+        snapshot = self.snapshot()
+        meals_by_user = self._meals_by_user.copy()
+        lookups = (self._user_lookup.copy(), self._email_lookup.copy())
+        versions = self._versions.copy()
+        api_keys = self._api_keys.copy()
+        return {
+            "users": usage(len(snapshot.users), estimate_size(dict(snapshot.users))),
+            "meals": usage(len(snapshot.meals), sys.getsizeof(self._meals) + estimate_items(snapshot.meals)),
+            "meal_index": usage(len(meals_by_user), estimate_size(meals_by_user, shallow=True)),
+            "lookup_indexes": usage(sum(map(len, lookups)), sum(estimate_size(index) for index in lookups)),
+            "versions": usage(len(versions), estimate_size(versions)),
+            "api_keys": usage(len(api_keys), estimate_size(api_keys)),
+            "snapshot": usage(len(pinned.users), estimate_size(dict(pinned.users), shallow=True)) if pinned else usage(0, 0),
+        }
@@ -1,14 +1,33 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.httpsredirect import HTTPSRedirectMiddleware
-from fastapi.staticfiles import StaticFiles
 from api.routers.api import api_router
 from api.routers import telegram_bot
 from api.schemas import APIInfoResponse, UserCreate
 from api.core.auth import API_KEY_NAME, USER_ID_NAME
+from api.core.metrics import registry, MetricsMiddleware, CONTENT_TYPE
+from api.core.log import configure_logging, dropped_records, RequestLogMiddleware, REQUEST_ID_HEADER
+from api.core.profiling import ProfilingMiddleware, PROFILING_ENABLED
+from api.core.watchdog import SlowRequestMiddleware, WATCHDOG_ENABLED
+from api.core.tracing import TracingMiddleware, configure_trace_export
+from api.core.openapi import load_prebuilt_schema
+from api.core.warmup import lifespan
+from api.core.compression import CompressionMiddleware
+from api.core.admission import AdmissionMiddleware, ADMISSION_ENABLED, admission
+from api.core.ratelimit import RateLimitMiddleware, RATE_LIMIT_ENABLED, bucket_counts
+from api.core.static import PrecompressedStaticFiles, FRONTEND_BUILD_DIR
+from api.core.cache import status_cache
+from api.core.coalesce import flight_groups
+from api.core.events import broker
+from api.core.health import liveness, readiness
+from api.db.models import store
 from fastapi.openapi.utils import get_openapi
 import os
 
+configure_logging()
+configure_trace_export()
+
 app = FastAPI(
     title="BMR Tracker API",
     description="""
@@ -30,13 +49,17 @@ app = FastAPI(
     the X-User-Id header when testing endpoints that require regular user access.
     """,
     version="1.0.0",
+    lifespan=lifespan,
     docs_url="/docs",
     redoc_url="/redoc",
     openapi_tags=[
         {"name": "users", "description": "User management operations"},
         {"name": "meals", "description": "Meal logging operations"},
         {"name": "nutrition", "description": "Nutrition tracking and analysis"},
-        {"name": "webhook", "description": "Webhook integration for external apps"}
+        {"name": "webhook", "description": "Webhook integration for external apps"},
+        {"name": "stream", "description": "Live server-sent event streams"},
+        {"name": "dashboard", "description": "Aggregated dashboard data"},
+        {"name": "admin", "description": "Admin statistics and user management"}
     ]
 )
 
@@ -49,13 +72,27 @@ app.openapi_security = []
 # - Admin API Key: ADMIN_API_KEY
 # - User ID: Required for regular users (e.g., user_1)
 
-# Add middleware to log all incoming requests
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    print(f"Incoming request: {request.method} {request.url}")
-    response = await call_next(request)
-    print(f"Response status: {response.status_code}")
-    return response
+# Admin-requested or sampled cProfile runs (innermost, so profiles are keyed by request ID)
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# Records requests running past WATCHDOG_THRESHOLD_MS, with a stack sample
+if WATCHDOG_ENABLED:
+    app.add_middleware(SlowRequestMiddleware)
+
+# Concurrency limit with bounded, prioritized queues; sheds with 503 (inside rate limiting, so abusive clients never queue)
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
+
+# Per-client token buckets on the ingest routes (RATE_LIMITS); 429s are still traced, logged and counted
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+
+# Root span of sampled traces (TRACE_SAMPLE_RATE, or a sampled traceparent header from a trusted caller)
+app.add_middleware(TracingMiddleware)
+
+# Structured access log with request IDs (queued and written off the request path)
+app.add_middleware(RequestLogMiddleware)
 
 # Add CORS middleware for frontend integration
 app.add_middleware(
@@ -64,18 +101,59 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", REQUEST_ID_HEADER],
 )
 
+# Gzip large JSON responses (meal histories, food list) for clients that accept it
+app.add_middleware(CompressionMiddleware)
+
+# Per-route request counts and latency for /metrics (outermost, so it times everything)
+app.add_middleware(MetricsMiddleware)
+
 # Include API router
 app.include_router(api_router, prefix="/api/v1")
 
 # Include Telegram bot router (separate from existing webhook)
 app.include_router(telegram_bot.router, prefix="/api/v1")
 
-# Mount static files for frontend
+# Sizes that already live in the store, caches and broker are read at scrape time
+registry.callback_gauge("store_users", "Registered users.", store.count_users)
+registry.callback_gauge("store_meals", "Logged meals.", store.count_meals)
+registry.callback_gauge("status_cache_entries", "Cached nutrition status responses.",
+                        lambda: status_cache.stats()["entries"])
+registry.callback_gauge("coalesced_requests_in_flight", "Coalesced read computations running, by route.",
+                        lambda: {(name,): group.stats()["in_flight"] for name, group in flight_groups.items()},
+                        ("route",))
+registry.callback_gauge("admission_limit", "Adaptive concurrency limit of admission control.",
+                        lambda: admission.stats()["limit"])
+registry.callback_gauge("admission_waiting", "Requests waiting for admission, by route class.",
+                        lambda: {(name,): c["waiting"] for name, c in admission.stats()["classes"].items()}, ("class",))
+registry.callback_gauge("rate_limit_buckets", "Client token buckets held, by rate limit rule.", bucket_counts, ("rule",))
+registry.callback_gauge("sse_subscribers", "Open live-update event streams.", broker.subscriber_count)
+registry.callback_gauge("log_records_dropped", "Log records dropped because the log queue was full.", dropped_records)
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus text exposition of request, ingest and store metrics"""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the process is up and its event loop responsive"""
+    return liveness()
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness: 200 once startup work (warm-up, snapshot restore) is done, 503 until then or if it failed"""
+    report = readiness.stats()
+    return JSONResponse(report, status_code=200 if report["status"] == "ready" else 503)
+
+# Mount static files for frontend: the fingerprinted, precompressed build (python -m api.core.static) if there is one
 frontend_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend")
-if os.path.exists(frontend_path):
-    app.mount("/frontend", StaticFiles(directory=frontend_path), name="frontend")
+if os.path.exists(FRONTEND_BUILD_DIR):
+    app.mount("/frontend", PrecompressedStaticFiles(directory=FRONTEND_BUILD_DIR), name="frontend")
+elif os.path.exists(frontend_path):
+    app.mount("/frontend", PrecompressedStaticFiles(directory=frontend_path), name="frontend")
 
 @app.get("/", response_model=APIInfoResponse)
 def root():
@@ -93,14 +171,23 @@ def root():
             "GET /api/v1/meals/{userId} - Get user's meals by userId",
             "GET /api/v1/nutrition/status/{userId} - Get nutrient status by userId",
             "GET /api/v1/nutrition/foods - List available foods",
-            "POST /api/v1/webhook/ - Webhook for meal logging with userId"
+            "GET /api/v1/dashboard/{userId} - Profile, BMR/TDEE, today's meals and 7-day trend",
+            "POST /api/v1/webhook/ - Webhook for meal logging with userId",
+            "GET /api/v1/stream/{userId} - Live meal/nutrition updates (server-sent events)",
+            "GET /api/v1/admin/stats - System statistics (admin key)",
+            "GET /api/v1/admin/users - User management data (admin key)",
+            "GET /api/v1/admin/profiles - Recent request profiles (admin key)",
+            "GET /api/v1/admin/slow-requests - Requests caught by the slow-request watchdog (admin key)",
+            "GET /api/v1/admin/traces - Recent request traces (admin key)",
+            "GET /api/v1/admin/memory - Estimated memory of the store, caches and indexes (admin key)",
+            "GET /metrics - Prometheus metrics",
+            "GET /healthz - Liveness probe",
+            "GET /readyz - Readiness probe (waits for warm-up and snapshot restore)"
         ]
     )
 
 # Override the OpenAPI schema generation to include all models explicitly
-def custom_openapi():
-    if app.openapi_schema:
-        return app.openapi_schema
+def build_openapi_schema():
     openapi_schema = get_openapi(
         title=app.title,
         version=app.version,
@@ -133,7 +220,13 @@ def custom_openapi():
             }
         }
     })
-    app.openapi_schema = openapi_schema
+    return openapi_schema
+
+# Serve the schema written at build time (python -m api.core.openapi) if it is current, else generate it once
+def custom_openapi():
+    if app.openapi_schema:
+        return app.openapi_schema
+    app.openapi_schema = load_prebuilt_schema() or build_openapi_schema()
     return app.openapi_schema
 
 app.openapi = custom_openapi
@@ -8,10 +8,16 @@ from .users import router as users_router
 from .meals import router as meals_router
 from .nutrition import router as nutrition_router
 from .webhook import router as webhook_router
+from .stream import router as stream_router
+from .dashboard import router as dashboard_router
+from .admin import router as admin_router
 
 __all__ = [
     "users_router",
     "meals_router",
     "nutrition_router",
-    "webhook_router"
+    "webhook_router",
+    "stream_router",
+    "dashboard_router",
+    "admin_router"
 ]
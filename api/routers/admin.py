@@ -0,0 +1,510 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+from datetime import date
+from api.core.auth import AuthUser, require_admin, key_cache, principal_cache, revoke_api_key, unknown_key_cache
+from api.core.keys import api_keys
+from api.schemas import ApiKeyCreate
+from api.db.models import store
+from api.core.cache import status_cache
+from api.core.coalesce import coalescing_stats
+from api.core.admission import admission
+from api.core.ratelimit import rate_limit_rules
+from api.core.memory import estimate_size, process_memory, top_allocations, usage
+from api.core import profiling, tracing, watchdog
+from api.core.routing import InstrumentedRoute
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+@router.get(
+    "/stats",
+    summary="System statistics",
+    description="User, meal and nutrition totals computed from a pinned snapshot of the store.",
+    responses={
+        200: {"description": "Statistics computed successfully."},
+        401: {"description": "Missing or invalid API key."},
+        403: {"description": "Admin privileges required."},
+        500: {"description": "Error computing statistics."}
+    }
+)
+def get_stats(auth_user: AuthUser = Depends(require_admin)):
+    """
+    System statistics and user analytics (admin only).
+
+    Computed from an immutable snapshot (in SQL with the SQLite store), so the scan never blocks meal logging.
+
+    Returns:
+    - **epoch**: The store version the statistics were computed from.
+    - **total_users**: Number of registered users.
+    - **active_users_today**: Users who logged at least one meal today.
+    - **total_meals**: Number of meals logged.
+    - **meals_today**: Meals logged today, with a breakdown by type.
+    - **nutrient_totals**: All-time nutrient totals across every user.
+    """
+    try:
+        stats = store.meal_stats(date.today())
+        meal_breakdown = {meal_type: stats["meal_types"].get(meal_type, 0) for meal_type in ("breakfast", "lunch", "dinner", "snack")}
+
+        return {
+            "epoch": stats["epoch"],
+            "total_users": stats["users"],
+            "active_users_today": stats["active_users"],
+            "total_meals": stats["meals"],
+            "meals_today": {
+                "total": stats["meals_on_date"],
+                "breakdown": meal_breakdown
+            },
+            "nutrient_totals": {nutrient: round(value, 2) for nutrient, value in stats["nutrient_totals"].items()}
+        }
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error computing statistics: {str(e)}"
+        )
+
+@router.get(
+    "/users",
+    summary="User management data",
+    description="Every user with their meal count and last activity, from a pinned snapshot of the store.",
+    responses={
+        200: {"description": "Users retrieved successfully."},
+        401: {"description": "Missing or invalid API key."},
+        403: {"description": "Admin privileges required."},
+        500: {"description": "Error listing users."}
+    }
+)
+def get_users_overview(auth_user: AuthUser = Depends(require_admin)):
+    """
+    User management dashboard data (admin only).
+
+    Returns:
+    - **epoch**: The store version the listing was computed from.
+    - **total_users**: Number of registered users.
+    - **users**: userId, name, email, registration date, meal count and last meal time for each user.
+    """
+    try:
+        epoch, users = store.user_meal_counts()
+
+        user_list = [
+            {
+                "userId": user_id,
+                "name": user["name"],
+                "email": user.get("email"),
+                "registeredAt": user.get("registeredAt"),
+                "meals_logged": meals_logged,
+                "last_meal": user.get("last_meal")
+            }
+            for user_id, user, meals_logged in users
+        ]
+
+        return {
+            "epoch": epoch,
+            "total_users": len(user_list),
+            "users": user_list
+        }
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error listing users: {str(e)}"
+        )
+
+@router.get(
+    "/cache",
+    summary="Status cache statistics",
+    description="Size, hit/miss counters, evictions and invalidations of the nutrition status cache.",
+    responses={
+        200: {"description": "Cache statistics retrieved successfully."},
+        401: {"description": "Missing or invalid API key."},
+        403: {"description": "Admin privileges required."}
+    }
+)
+def get_cache_stats(auth_user: AuthUser = Depends(require_admin)):
+    """
+    Nutrition status cache statistics for this worker (admin only).
+
+    Returns:
+    - **status_cache**: Entry count, limits, hits, misses, hit ratio, evictions, expirations and invalidations.
+    """
+    return {"status_cache": status_cache.stats()}
+
+@router.post(
+    "/cache/flush",
+    summary="Flush the status cache",
+    description="Drop every cached nutrition status response, or only those of one user.",
+    responses={
+        200: {"description": "Cache flushed."},
+        401: {"description": "Missing or invalid API key."},
+        403: {"description": "Admin privileges required."}
+    }
+)
+def flush_cache(
+    userId: Optional[str] = Query(None, description="Only flush entries for this user"),
+    auth_user: AuthUser = Depends(require_admin)
+):
+    """
+    Flush the nutrition status cache of this worker (admin only).
+
+    Query Parameters:
+    - **userId**: Only flush entries for this user (optional).
+
+    Returns:
+    - **flushed**: Number of entries removed.
+    """
+    flushed = status_cache.invalidate_user(userId) if userId else status_cache.clear()
+    return {"message": "Status cache flushed", "flushed": flushed}
+
+@router.get(
+    "/coalescing",
+    summary="Request coalescing statistics",
+    description="Per-route counts of computations run and identical concurrent requests collapsed into them.",
+    responses={
+        200: {"description": "Coalescing statistics retrieved successfully."},
+        401: {"description": "Missing or invalid API key."},
+        403: {"description": "Admin privileges required."}
+    }
+)
+def get_coalescing_stats(auth_user: AuthUser = Depends(require_admin)):
+    """
+    Single-flight coalescing statistics for this worker (admin only).
+
+    Returns:
+    - **routes**: For each opted-in route, requests in flight, computations executed and requests coalesced.
+    """
+    return {"routes": coalescing_stats()}
+
+@router.get(
+    "/admission",
+    summary="Admission control statistics",
+    description="Adaptive concurrency limit, requests in flight and waiting, and requests shed per route class.",
+    responses={
+        200: {"description": "Admission statistics retrieved successfully."},
+        401: {"description": "Missing or invalid API key."},
+        403: {"description": "Admin privileges required."}
+    }
+)
+def get_admission_stats(auth_user: AuthUser = Depends(require_admin)):
+    """
+    Admission control statistics for this worker (admin only).
+
+    Returns:
+    - **limit**: Current adaptive concurrency limit, between **min_limit** and **max_limit** (the threadpool size).
+    - **in_flight**: Admitted requests still running.
+    - **latency_ms**: Recent and long-term average latency of ingest and read requests, which steer the limit.
+    - **classes**: For each route class in priority order, its cap, queue-time target and queue size, requests
+      in flight and waiting, and counts of requests admitted, queued and shed (queue full or queue timeout).
+    """
+    return admission.stats()
+
+@router.get(
+    "/memory",
+    summary="Memory accounting",
+    description="Object counts and estimated bytes of the store, its indexes, caches and buffers, "
+                "with the top allocation sites when tracemalloc is tracing.",
+    responses={
+        200: {"description": "Memory report computed successfully."},
+        401: {"description": "Missing or invalid API key."},
+        403: {"description": "Admin privileges required."}
+    }
+)
+def get_memory_usage(
+    top: int = Query(10, ge=0, le=100, description="Allocation sites to list when tracemalloc is tracing"),
+    auth_user: AuthUser = Depends(require_admin)
+):
+    """
+    Memory accounting for this worker (admin only).
+
+    Sizes are estimates, extrapolated from a sample of each large structure.
+
+    Query Parameters:
+    - **top**: Number of allocation sites to list when tracemalloc is tracing (default 10).
+
+    Returns:
+    - **process**: Resident set size of the worker now and at its peak, in bytes.
+    - **store**: The backend and, for each of its structures (users, meals, indexes, record cache), the
+      object count and estimated bytes. Entries marked **on_disk** live in the database file, not in memory.
+    - **caches**: Nutrition status responses, resolved API key principals, keys looked up by middleware
+      (registered and unknown) and rate limit buckets per rule.
+    - **buffers**: Recent profiles, traces and slow requests kept for the admin endpoints.
+    - **estimated_bytes**: Sum of the in-memory estimates above.
+    - **tracemalloc**: Whether tracemalloc is tracing (MEMORY_TRACEMALLOC_FRAMES) and, if so, traced bytes,
+      the top allocation sites and those that grew most since the previous report.
+    """
+    try:
+        caches = {
+            "status_cache": status_cache.memory_usage(),
+            "principal_cache": principal_cache.memory_usage(),
+            "key_cache": key_cache.memory_usage(),
+            "unknown_key_cache": unknown_key_cache.memory_usage(),
+            **{f"rate_limit {rule.prefix}": rule.buckets.memory_usage() for rule in rate_limit_rules}
+        }
+        buffers = {}
+        for name, ring in (("profiles", profiling.profiles), ("traces", tracing.traces),
+                           ("slow_requests", watchdog.slow_requests)):
+            entries = list(ring)
+            buffers[name] = usage(len(entries), estimate_size(entries))
+
+        structures = store.memory_usage()
+        in_memory = [entry for entry in structures.values() if not entry.get("on_disk")]
+        in_memory += [*caches.values(), *buffers.values()]
+        return {
+            "process": process_memory(),
+            "store": {"backend": type(store).__name__, "structures": structures},
+            "caches": caches,
+            "buffers": buffers,
+            "estimated_bytes": sum(entry["bytes"] for entry in in_memory),
+            "tracemalloc": top_allocations(top)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error computing memory usage: {str(e)}"
+        )
+
+@router.get(
+    "/profiles",
+    summary="Recent request profiles",
+    description="Requests profiled on demand (X-Profile: 1 with the admin key) or by sampling, newest first.",
+    responses={
+        200: {"description": "Profiles listed successfully."},
+        401: {"description": "Missing or invalid API key."},
+        403: {"description": "Admin privileges required."}
+    }
+)
+def list_profiles(auth_user: AuthUser = Depends(require_admin)):
+    """
+    Recent request profiles kept by this worker (admin only).
+
+    Returns:
+    - **profiles**: ID, time, trigger (header or sampled), method, path, status and duration of each
+      profiled request. Fetch the cProfile report with GET /admin/profiles/{profileId}.
+    - **capacity**: Number of profiles kept; older ones are discarded.
+    - **sample_rate**: Fraction of requests profiled without being asked.
+    """
+    summaries = [
+        {key: value for key, value in entry.items() if key != "report"}
+        for entry in reversed(list(profiling.profiles))
+    ]
+    return {
+        "profiles": summaries,
+        "capacity": profiling.profiles.maxlen,
+        "sample_rate": profiling.PROFILE_SAMPLE_RATE
+    }
+
+@router.get(
+    "/profiles/{profileId}",
+    summary="Request profile",
+    description="The cProfile report of one profiled request, top functions by cumulative time.",
+    responses={
+        200: {"description": "Profile retrieved successfully."},
+        401: {"description": "Missing or invalid API key."},
+        403: {"description": "Admin privileges required."},
+        404: {"description": "Profile not found (never recorded, or already discarded)."}
+    }
+)
+def get_profile(profileId: str, auth_user: AuthUser = Depends(require_admin)):
+    """
+    One request profile (admin only).
+
+    Path Parameters:
+    - **profileId**: The profile ID, which is the request's X-Request-ID.
+
+    Returns:
+    - The request summary plus **report**, the cProfile statistics as text.
+    """
+    entry = profiling.find_profile(profileId)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profileId} not found")
+    return entry
+
+@router.get(
+    "/slow-requests",
+    summary="Slow requests",
+    description="Requests that ran past the watchdog threshold, with redacted parameters and a stack sample, newest first.",
+    responses={
+        200: {"description": "Slow requests listed successfully."},
+        401: {"description": "Missing or invalid API key."},
+        403: {"description": "Admin privileges required."}
+    }
+)
+def list_slow_requests(auth_user: AuthUser = Depends(require_admin)):
+    """
+    Slow requests caught by this worker's watchdog (admin only).
+
+    Returns:
+    - **threshold_ms**: Requests running longer than this are recorded.
+    - **capacity**: Number of records kept; older ones are discarded.
+    - **requests**: For each slow request, its request ID, method, route, path, path and query parameters
+      (sensitive values redacted), elapsed time when caught, where it was (worker_thread, event_loop or awaiting),
+      the stack at that moment, and its final duration and status (null while still running).
+    """
+    return {
+        "threshold_ms": watchdog.WATCHDOG_THRESHOLD_MS,
+        "capacity": watchdog.slow_requests.maxlen,
+        "requests": list(reversed(list(watchdog.slow_requests)))
+    }
+
+@router.get(
+    "/traces",
+    summary="Recent traces",
+    description="Sampled request traces kept by this worker, newest first, without their spans.",
+    responses={
+        200: {"description": "Traces listed successfully."},
+        401: {"description": "Missing or invalid API key."},
+        403: {"description": "Admin privileges required."}
+    }
+)
+def list_traces(auth_user: AuthUser = Depends(require_admin)):
+    """
+    Recent request traces (admin only).
+
+    Returns:
+    - **traces**: Trace ID, root span name (method and route), request ID, start time, duration, status
+      and span count of each trace. Fetch the spans with GET /admin/traces/{traceId}.
+    - **capacity**: Number of traces kept; older ones are discarded.
+    - **sample_rate**: Fraction of requests traced without a sampled traceparent header.
+    """
+    summaries = [
+        {key: value for key, value in entry.items() if key != "spans"}
+        for entry in reversed(list(tracing.traces))
+    ]
+    return {
+        "traces": summaries,
+        "capacity": tracing.traces.maxlen,
+        "sample_rate": tracing.TRACE_SAMPLE_RATE
+    }
+
+@router.get(
+    "/traces/{traceId}",
+    summary="Trace",
+    description="One sampled trace with all of its spans in start order.",
+    responses={
+        200: {"description": "Trace retrieved successfully."},
+        401: {"description": "Missing or invalid API key."},
+        403: {"description": "Admin privileges required."},
+        404: {"description": "Trace not found (never sampled, or already discarded)."}
+    }
+)
+def get_trace(traceId: str, auth_user: AuthUser = Depends(require_admin)):
+    """
+    One request trace (admin only).
+
+    Path Parameters:
+    - **traceId**: The 32-character hex trace ID.
+
+    Returns:
+    - The trace summary plus **spans**, each with its span ID, parent span ID, name, kind,
+      start and end time (Unix nanoseconds), duration, attributes and status.
+    """
+    for entry in list(tracing.traces):
+        if entry["traceId"] == traceId:
+            return entry
+    raise HTTPException(status_code=404, detail=f"Trace {traceId} not found")
+
+@router.get(
+    "/api-keys",
+    summary="API keys",
+    description="Every registered API key (demo, keys file and issued), without the keys themselves.",
+    responses={
+        200: {"description": "API keys listed successfully."},
+        401: {"description": "Missing or invalid API key."},
+        403: {"description": "Admin privileges required."},
+        500: {"description": "Error listing API keys."}
+    }
+)
+def list_api_keys(auth_user: AuthUser = Depends(require_admin)):
+    """
+    List registered API keys (admin only).
+
+    Returns:
+    - **keys**: Key ID, role, bound userId, name, source (demo, file or store) and creation time of each key.
+    - **principal_cache**: Statistics of this worker's cache of resolved keys.
+    """
+    try:
+        keys = [key.to_dict() for key in api_keys.list_keys()]
+        return {"total": len(keys), "keys": keys, "principal_cache": principal_cache.stats()}
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error listing API keys: {str(e)}"
+        )
+
+@router.post(
+    "/api-keys",
+    summary="Issue an API key",
+    description="Create a key with a role and, optionally, a bound user. The key is returned only in this response.",
+    status_code=201,
+    responses={
+        201: {"description": "API key issued."},
+        401: {"description": "Missing or invalid API key."},
+        403: {"description": "Admin privileges required."},
+        404: {"description": "Bound user not found."},
+        500: {"description": "Error issuing API key."}
+    }
+)
+def issue_api_key(key_data: ApiKeyCreate, auth_user: AuthUser = Depends(require_admin)):
+    """
+    Issue a new API key (admin only).
+
+    Request Body:
+    - **role**: "user" (default) or "admin".
+    - **userId**: Bind the key to this user; requests with it need no X-User-Id header (optional).
+    - **name**: Label to recognize the key by (optional).
+
+    Returns:
+    - **apiKey**: The key. Only its hash is stored, so it cannot be shown again.
+    - **key**: Key ID, role, bound userId, name, source and creation time.
+    """
+    try:
+        if key_data.userId and not store.get_user(key_data.userId):
+            raise HTTPException(status_code=404, detail=f"User {key_data.userId} not found")
+        key, record = api_keys.issue(key_data.role, key_data.userId, key_data.name)
+        return {"message": "API key issued; store it now, it will not be shown again", "apiKey": key, "key": record.to_dict()}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error issuing API key: {str(e)}"
+        )
+
+@router.delete(
+    "/api-keys/{keyId}",
+    summary="Revoke an API key",
+    description="Delete an issued key. Demo keys and keys from the keys file can only be removed by configuration.",
+    responses={
+        200: {"description": "API key revoked."},
+        400: {"description": "The key is a demo or keys-file key."},
+        401: {"description": "Missing or invalid API key."},
+        403: {"description": "Admin privileges required."},
+        404: {"description": "API key not found."},
+        500: {"description": "Error revoking API key."}
+    }
+)
+def delete_api_key(keyId: str, auth_user: AuthUser = Depends(require_admin)):
+    """
+    Revoke an issued API key (admin only).
+
+    Path Parameters:
+    - **keyId**: The key ID shown by GET /admin/api-keys.
+
+    Other workers may accept the key until their cached entry expires (API_KEY_CACHE_TTL).
+    """
+    try:
+        found = api_keys.find(keyId)
+        if found is None:
+            raise HTTPException(status_code=404, detail=f"API key {keyId} not found")
+        key_hash, key = found
+        if key.source != "store":
+            raise HTTPException(status_code=400, detail=f"API key {keyId} comes from {key.source} configuration and cannot be revoked here")
+        revoke_api_key(key_hash)
+        return {"message": "API key revoked", "keyId": keyId}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error revoking API key: {str(e)}"
+        )
@@ -2,7 +2,7 @@
 API Router aggregator for BMR Tracker
 """
 from fastapi import APIRouter
-from api.routers import users, meals, nutrition, webhook
+from api.routers import users, meals, nutrition, webhook, stream, dashboard, admin
 
 api_router = APIRouter()
 
@@ -11,3 +11,6 @@ api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(meals.router, prefix="/meals", tags=["meals"])
 api_router.include_router(nutrition.router, prefix="/nutrition", tags=["nutrition"])
 api_router.include_router(webhook.router, prefix="/webhook", tags=["webhook"])
+api_router.include_router(stream.router, prefix="/stream", tags=["stream"])
+api_router.include_router(dashboard.router, prefix="/dashboard", tags=["dashboard"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
@@ -0,0 +1,132 @@
+from fastapi import APIRouter, HTTPException, Query
+from datetime import date, timedelta
+from api.db.models import store
+from api.utils.utils import calculate_bmr, calculate_tdee
+from api.core.responses import FastJSONResponse
+from api.core.routing import InstrumentedRoute
+
+router = APIRouter(route_class=InstrumentedRoute)
+
+TREND_DAYS = 7
+
+@router.get(
+    "/{userId}",
+    response_class=FastJSONResponse,
+    summary="Get a user's dashboard",
+    description="Profile, BMR/TDEE, today's meals and totals, and a 7-day trend in a single response.",
+    responses={
+        200: {"description": "Dashboard retrieved successfully."},
+        404: {"description": "User not found."},
+        500: {"description": "Error building dashboard."}
+    }
+)
+def get_dashboard(
+    userId: str,
+    days: int = Query(TREND_DAYS, ge=1, le=31, description="Number of days in the trend (including today)")
+):
+    """
+    Retrieve everything the dashboard page needs in one request.
+
+    Path Parameters:
+    - **userId**: The unique identifier of the user.
+
+    Query Parameters:
+    - **days**: Number of days in the trend, including today (default: 7).
+
+    Returns:
+    - **userId**: The user's unique identifier.
+    - **profile**: The user's profile details.
+    - **bmr**: The user's Basal Metabolic Rate (BMR).
+    - **tdee**: Total Daily Energy Expenditure for the user's activity level.
+    - **today**: Today's meals, nutrient totals, meal breakdown and calories remaining versus BMR.
+    - **trend**: Daily nutrient totals and meal counts for the last `days` days, oldest first.
+    """
+    try:
+        # Profile and meals come from one consistent read, so every section reflects the same version
+        found = store.get_user_and_meals(userId)
+        if found is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"User with ID '{userId}' not found"
+            )
+        profile, meals = found
+
+        bmr = calculate_bmr(profile['gender'], profile['weight'], profile['height'], profile['age'])
+        tdee = calculate_tdee(bmr, profile.get('activity_level') or "sedentary")
+
+        today = date.today()
+        first_day = today - timedelta(days=days - 1)
+        trend = {
+            first_day + timedelta(days=offset): {"calories": 0, "protein": 0, "carbs": 0, "fiber": 0, "meals": 0}
+            for offset in range(days)
+        }
+        today_meals = []
+        meal_breakdown = {"breakfast": 0, "lunch": 0, "dinner": 0, "snack": 0}
+
+        # Single pass over the user's meals builds today's view and the trend together
+        for meal in meals:
+            day = trend.get(meal["loggedAt"])
+            if day is None:
+                continue
+
+            day["meals"] += 1
+            for key in ("calories", "protein", "carbs", "fiber"):
+                day[key] += meal["nutrition"].get(key, 0)
+
+            if meal["loggedAt"] == today:
+                today_meals.append(meal)
+                meal_type = meal.get("meal", "").lower()
+                if meal_type in meal_breakdown:
+                    meal_breakdown[meal_type] += 1
+
+        today_totals = trend[today]
+        nutrient_intake = {key: round(today_totals[key], 2) for key in ("calories", "protein", "carbs", "fiber")}
+
+        # Plain dicts of the documented shape: serialize directly
+        return FastJSONResponse({
+            "userId": userId,
+            "profile": {
+                "name": profile['name'],
+                "email": profile.get('email'),
+                "height": profile['height'],
+                "weight": profile['weight'],
+                "age": profile['age'],
+                "gender": profile['gender'],
+                "activity_level": profile.get('activity_level'),
+                "goal": profile.get('goal'),
+                "registeredAt": profile.get('registeredAt')
+            },
+            "bmr": round(bmr, 2),
+            "tdee": round(tdee, 2),
+            "today": {
+                "date": str(today),
+                "meals": today_meals,
+                "nutrient_intake": nutrient_intake,
+                "meals_logged": {
+                    "total": len(today_meals),
+                    "breakdown": meal_breakdown
+                },
+                "remaining_calories": round(max(0, bmr - nutrient_intake["calories"]), 2)
+            },
+            "trend": [
+                {
+                    "date": str(day),
+                    "calories": round(totals["calories"], 2),
+                    "protein": round(totals["protein"], 2),
+                    "carbs": round(totals["carbs"], 2),
+                    "fiber": round(totals["fiber"], 2),
+                    "meals": totals["meals"]
+                }
+                for day, totals in trend.items()
+            ]
+        })
+
+    except HTTPException:
+        # Re-raise HTTP exceptions
+        raise
+    except Exception as e:
+        # Handle any unexpected errors
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error building dashboard: {str(e)}"
+        )
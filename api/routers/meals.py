@@ -1,21 +1,49 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Header
-from typing import Optional
+from typing import List, Optional
 from datetime import date
 from api.schemas import MealLog
-from api.db.models import users_db, meals_db, update_user_activity
-from api.db.food_data import food_db
+from api.db.models import store
+from api.db.async_store import astore, run_store
+from api.db.food_data import food_db, food_index, resolve_food
+from api.utils.message_parser import ParsedMeal
 from api.core.auth import get_current_user, check_user_access, AuthUser
+from api.core.events import broker
+from api.core.cache import status_cache
+from api.core.coalesce import coalesce
+from api.core.etag import user_etag
+from api.core.responses import FastJSONResponse
+from api.core.metrics import MEALS_INGESTED
+from api.core.routing import InstrumentedRoute
+from api.core.tracing import span, traced
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 
-async def log_meal_internal(user_id: str, meal_type: str, food_items: list):
+@traced("meals.publish")
+def publish_meals_logged(user_id: str, entries: List[dict], daily: dict, channel: str):
+    """Push newly logged meals and the user's updated daily totals to live subscribers"""
+    MEALS_INGESTED.inc(channel, value=len(entries))
+    # Cached status for the affected days (and all time) is now out of date
+    status_cache.invalidate_user(user_id, {str(entry["loggedAt"]) for entry in entries})
+    if store.shared:
+        # Other workers' subscribers are fed from the shared store's change feed
+        return
+    broker.publish(user_id, {
+        "type": "meal_logged",
+        "meals": entries,
+        "daily": daily
+    })
+
+@traced("meals.log_meal_internal")
+async def log_meal_internal(user_id: str, meal_type: str, food_items: list, channel: str = "telegram"):
     """
     Internal function to log meals - used by both API endpoint and Telegram bot
     Returns: dict with success status, nutrition data, and error message if any
     """
     try:
         # Check if user exists - NO AUTO-CREATION
-        if user_id not in users_db:
+        with span("store.user_exists"):
+            exists = await astore.user_exists(user_id)
+        if not exists:
             return {
                 "success": False,
                 "error": f"User '{user_id}' not found",
@@ -23,14 +51,13 @@ async def log_meal_internal(user_id: str, meal_type: str, food_items: list):
             }
         
         # Validate food items exist in database (case-insensitive)
-        normalized_food_db = {k.lower(): k for k in food_db.keys()}
         normalized_items = []
         unknown_items = []
         
         for item in food_items:
             item_lower = item.strip().lower()
-            if item_lower in normalized_food_db:
-                normalized_items.append(normalized_food_db[item_lower])
+            if item_lower in food_index:
+                normalized_items.append(food_index[item_lower])
             else:
                 unknown_items.append(item)
         
@@ -56,10 +83,16 @@ async def log_meal_internal(user_id: str, meal_type: str, food_items: list):
             'loggedAt': date.today(),
             'nutrition': meal_nutrition
         }
-        meals_db.append(meal_entry)
-        
-        # Update user activity
-        update_user_activity(user_id, "meal")
+        # Store meal and update user activity/intake atomically
+        with span("store.add_meals", meals=1):
+            daily = await astore.add_meals(user_id, [meal_entry])
+        if daily is None:
+            return {
+                "success": False,
+                "error": f"User '{user_id}' not found",
+                "error_type": "user_not_found"
+            }
+        publish_meals_logged(user_id, [meal_entry], daily, channel)
         
         return {
             "success": True,
@@ -74,6 +107,146 @@ async def log_meal_internal(user_id: str, meal_type: str, food_items: list):
             "error_type": "system_error"
         }
 
+@traced("meals.log_meals_batch_internal")
+def log_meals_batch_internal(user_id: str, meals: List[ParsedMeal]):
+    """
+    Internal function to log several parsed meals at once - used by the webhook
+
+    The batch is all-or-nothing: every item of every meal is resolved before
+    anything is stored, and user activity is refreshed once for the whole batch.
+    Returns: dict with success status, stored meal entries, batch nutrition totals
+    and error message if any
+    """
+    if not store.user_exists(user_id):
+        return {
+            "success": False,
+            "error": f"User '{user_id}' not found",
+            "error_type": "user_not_found"
+        }
+
+    # Resolve every item up front so a single typo doesn't leave a partial batch
+    unknown_items = []
+    resolved_meals = []
+    for parsed_meal in meals:
+        resolved_items = []
+        for item in parsed_meal.items:
+            food = resolve_food(item.name)
+            if food is None:
+                unknown_items.append(item.name)
+            else:
+                resolved_items.append((food, item))
+        resolved_meals.append((parsed_meal.meal, resolved_items))
+
+    if unknown_items:
+        return {
+            "success": False,
+            "error": f"Unknown food items: {unknown_items}",
+            "error_type": "unknown_foods"
+        }
+
+    # Scale per-100g nutrition by each item's portion size
+    today = date.today()
+    entries = []
+    batch_nutrition = {"calories": 0, "protein": 0, "carbs": 0, "fiber": 0}
+    for meal_type, resolved_items in resolved_meals:
+        meal_nutrition = {"calories": 0, "protein": 0, "carbs": 0, "fiber": 0}
+        for food, item in resolved_items:
+            factor = item.grams / 100
+            for nutrient in meal_nutrition:
+                meal_nutrition[nutrient] += food_db[food][nutrient] * factor
+        meal_nutrition = {k: round(v, 2) for k, v in meal_nutrition.items()}
+        for nutrient in batch_nutrition:
+            batch_nutrition[nutrient] += meal_nutrition[nutrient]
+
+        entries.append({
+            'userId': user_id,
+            'meal': meal_type,
+            'items': [food for food, _ in resolved_items],
+            'portions': [
+                {"item": food, "quantity": item.quantity, "unit": item.unit, "grams": item.grams}
+                for food, item in resolved_items
+            ],
+            'loggedAt': today,
+            'nutrition': meal_nutrition
+        })
+
+    # Store the batch and update user activity/intake once, atomically
+    daily = store.add_meals(user_id, entries)
+    if daily is None:
+        return {
+            "success": False,
+            "error": f"User '{user_id}' not found",
+            "error_type": "user_not_found"
+        }
+    publish_meals_logged(user_id, entries, daily, "webhook")
+
+    return {
+        "success": True,
+        "nutrition": {k: round(v, 2) for k, v in batch_nutrition.items()},
+        "meals": entries
+    }
+
+def store_meal(log: MealLog) -> dict:
+    """Validate, store and publish one meal (404 for unknown users, 400 for unknown foods)"""
+    user = store.get_user(log.userId)
+    if user is None:
+        raise HTTPException(
+            status_code=404, 
+            detail=f"User with ID '{log.userId}' not found. Please register first."
+        )
+
+    # Set default date if not provided
+    if not log.loggedAt:
+        log.loggedAt = date.today()
+
+    # Validate food items exist in database (case-insensitive)
+    normalized_items = []
+    unknown_items = []
+
+    for item in log.items:
+        item_lower = item.strip().lower()
+        if item_lower in food_index:
+            normalized_items.append(food_index[item_lower])
+        else:
+            unknown_items.append(item)
+
+    if unknown_items:
+        available_foods = list(food_db.keys())
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown food items: {unknown_items}. Available foods: {available_foods[:10]}... (use GET /nutrition/foods for full list)"
+        )
+
+    # Calculate nutrition for this meal using normalized food names
+    meal_nutrition = {"calories": 0, "protein": 0, "carbs": 0, "fiber": 0}
+    for item in normalized_items:
+        if item in food_db:
+            for nutrient in meal_nutrition:
+                meal_nutrition[nutrient] += food_db[item][nutrient]
+
+    # Store meal log with normalized food names
+    meal_entry = log.model_dump()
+    meal_entry['items'] = normalized_items  # Store normalized food names
+    meal_entry['nutrition'] = meal_nutrition
+
+    # Store meal and update user activity/intake atomically
+    daily = store.add_meals(log.userId, [meal_entry])
+    if daily is None:
+        raise HTTPException(
+            status_code=404, 
+            detail=f"User with ID '{log.userId}' not found. Please register first."
+        )
+    publish_meals_logged(log.userId, [meal_entry], daily, "rest")
+
+    # Get username for response
+    username = user['name']
+
+    return {
+        "message": "Meal logged successfully",
+        "meal_details": meal_entry,
+        "username": username
+    }
+
 @router.post("/log",
           response_model=dict,
           summary="Log a user's meal",
@@ -84,7 +257,7 @@ async def log_meal_internal(user_id: str, meal_type: str, food_items: list):
               404: {"description": "User not found."},
               500: {"description": "Error logging meal."}
           })
-def log_meal(
+async def log_meal(
     log: MealLog
 ):
     """
@@ -102,60 +275,8 @@ def log_meal(
     - **username**: The name of the user.
     """
     try:
-        if log.userId not in users_db:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"User with ID '{log.userId}' not found. Please register first."
-            )
-        
-        # Set default date if not provided
-        if not log.loggedAt:
-            log.loggedAt = date.today()
-        
-        # Validate food items exist in database (case-insensitive)
-        normalized_food_db = {k.lower(): k for k in food_db.keys()}
-        normalized_items = []
-        unknown_items = []
-        
-        for item in log.items:
-            item_lower = item.strip().lower()
-            if item_lower in normalized_food_db:
-                normalized_items.append(normalized_food_db[item_lower])
-            else:
-                unknown_items.append(item)
-        
-        if unknown_items:
-            available_foods = list(food_db.keys())
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unknown food items: {unknown_items}. Available foods: {available_foods[:10]}... (use GET /nutrition/foods for full list)"
-            )
-        
-        # Calculate nutrition for this meal using normalized food names
-        meal_nutrition = {"calories": 0, "protein": 0, "carbs": 0, "fiber": 0}
-        for item in normalized_items:
-            if item in food_db:
-                for nutrient in meal_nutrition:
-                    meal_nutrition[nutrient] += food_db[item][nutrient]
-        
-        # Store meal log with normalized food names
-        meal_entry = log.model_dump()
-        meal_entry['items'] = normalized_items  # Store normalized food names
-        meal_entry['nutrition'] = meal_nutrition
-        meals_db.append(meal_entry)
-        
-        # Update user activity
-        update_user_activity(log.userId, "meal")
-        
-        # Get username for response
-        user = users_db.get(log.userId)
-        username = user['name'] if user else "Unknown"
-        
-        return {
-            "message": "Meal logged successfully",
-            "meal_details": meal_entry,
-            "username": username
-        }
+        # All store access happens in one hop (inline for the in-memory store)
+        return await run_store(store_meal, log)
         
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -167,8 +288,25 @@ def log_meal(
             detail=f"Error logging meal: {str(e)}"
         )
 
+def build_meals(userId: str, on_date: Optional[date]) -> dict:
+    """A user's meals, optionally of one day (404 for unknown users)"""
+    if not store.user_exists(userId):
+        raise HTTPException(
+            status_code=404, 
+            detail=f"User with ID '{userId}' not found"
+        )
+
+    # Meals for this user (from the per-user index)
+    user_meals = store.get_user_meals(userId, on_date)
+
+    return {
+        "userId": userId,
+        "meals": user_meals
+    }
+
 @router.get("/{userId}",
           response_model=dict,
+          response_class=FastJSONResponse,
           summary="Get user's meals",
           description="Retrieve meals logged by a user, with optional date filtering.",
           responses={
@@ -176,7 +314,9 @@ def log_meal(
               404: {"description": "User not found."},
               500: {"description": "Error retrieving meals."}
           })
-def get_meals(
+@user_etag()
+@coalesce("user_meals")
+async def get_meals(
     userId: str, 
     on_date: Optional[date] = Query(None, description="Filter meals by date (YYYY-MM-DD)")
 ):
@@ -194,21 +334,8 @@ def get_meals(
     - **meals**: A list of meals logged by the user.
     """
     try:
-        if userId not in users_db:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"User with ID '{userId}' not found"
-            )
-        
-        # Filter meals by userId
-        user_meals = [m for m in meals_db if m["userId"] == userId]
-        if on_date:
-            user_meals = [m for m in user_meals if str(m["loggedAt"]) == str(on_date)]
-        
-        return {
-            "userId": userId,
-            "meals": user_meals
-        }
+        # All store access happens in one hop (inline for the in-memory store)
+        return await run_store(build_meals, userId, on_date)
         
     except HTTPException:
         # Re-raise HTTP exceptions
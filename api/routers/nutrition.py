@@ -2,15 +2,89 @@ from fastapi import APIRouter, HTTPException, Query, Depends
 from typing import Optional
 from datetime import date
 from api.schemas import NutritionStatusResponse
-from api.db.models import users_db, meals_db
-from api.db.food_data import food_db
+from api.db.models import store
+from api.db.async_store import run_store
+from api.db.food_data import food_db, food_categories, CATALOG_VERSION
+from api.core.cache import status_cache
+from api.core.coalesce import coalesce
+from api.core.etag import user_etag
+from api.core.responses import FastJSONResponse
 from api.utils.utils import calculate_bmr
 from api.core.auth import get_current_user, check_user_access, AuthUser
+from api.core.routing import InstrumentedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 
-@router.get("/status/{userId}")
-def get_status(
+def aggregate_meals(user_meals):
+    """Total nutrition and per-type meal counts of a list of meal entries"""
+    totals = {"calories": 0, "protein": 0, "carbs": 0, "fiber": 0}
+    meal_breakdown = {"breakfast": 0, "lunch": 0, "dinner": 0, "snack": 0}
+
+    for meal in user_meals:
+        meal_type = meal.get("meal", "").lower()
+        if meal_type in meal_breakdown:
+            meal_breakdown[meal_type] += 1
+
+        # Use pre-calculated nutrition from the meal log
+        for key in totals:
+            totals[key] += meal["nutrition"].get(key, 0)
+    return totals, meal_breakdown
+
+def build_status(userId: str, on_date: Optional[date]) -> dict:
+    """Nutrition status of a user, from the cache or the store (404 for unknown users)"""
+    # Every entry is validated against the user's version, which catches writes made by
+    # other workers (meals can be logged for past days too). Read before the profile and
+    # meals, so a write in between leaves an entry that the next request discards.
+    stamp = store.user_version(userId)
+    user = store.get_user(userId)
+    if user is None:
+        raise HTTPException(
+            status_code=404, 
+            detail=f"User with ID '{userId}' not found"
+        )
+
+    cache_key = (userId, str(on_date) if on_date else None, CATALOG_VERSION)
+    cached = status_cache.get(cache_key, stamp)
+    if cached is not None:
+        return cached
+
+    # Meals for this user (from the per-user index)
+    user_meals = store.get_user_meals(userId, on_date)
+
+    # Calculate total nutrition consumed
+    totals, meal_breakdown = aggregate_meals(user_meals)
+
+    # Calculate BMR for reference (handle 'others' gender)
+    if user['gender'].lower() in ['male', 'female']:
+        bmr = calculate_bmr(user['gender'], user['weight'], user['height'], user['age'])
+    else:
+        # For 'others' gender, use average of male/female BMR
+        bmr_male = calculate_bmr('male', user['weight'], user['height'], user['age'])
+        bmr_female = calculate_bmr('female', user['weight'], user['height'], user['age'])
+        bmr = (bmr_male + bmr_female) / 2
+
+    result = {
+        "userId": userId,
+        "username": user['name'],
+        "date": str(on_date) if on_date else "All time",
+        "bmr": round(bmr, 2),
+        "nutrient_intake": totals,
+        "meals_logged": {
+            "total": len(user_meals),
+            "breakdown": meal_breakdown
+        },
+        "recommendations": {
+            "calories_vs_bmr": f"{totals['calories']} consumed vs {round(bmr, 2)} BMR",
+            "protein_percentage": f"{round((totals['protein'] * 4 / max(totals['calories'], 1)) * 100, 2)}% protein intake"
+        }
+    }
+    status_cache.put(cache_key, result, stamp)
+    return result
+
+@router.get("/status/{userId}", response_class=FastJSONResponse)
+@user_etag()
+@coalesce("nutrition_status")
+async def get_status(
     userId: str, 
     on_date: Optional[date] = Query(None, description="Get status for specific date (YYYY-MM-DD)")
 ):
@@ -33,56 +107,8 @@ def get_status(
     - **recommendations**: Nutritional recommendations based on the user's intake.
     """
     try:
-        if userId not in users_db:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"User with ID '{userId}' not found"
-            )
-        
-        user = users_db[userId]
-
-        # Filter meals by userId
-        user_meals = [m for m in meals_db if m["userId"] == userId]
-        if on_date:
-            user_meals = [m for m in user_meals if str(m["loggedAt"]) == str(on_date)]
-
-        # Calculate total nutrition consumed
-        totals = {"calories": 0, "protein": 0, "carbs": 0, "fiber": 0}
-        meal_breakdown = {"breakfast": 0, "lunch": 0, "dinner": 0, "snack": 0}
-
-        for meal in user_meals:
-            meal_type = meal.get("meal", "").lower()
-            if meal_type in meal_breakdown:
-                meal_breakdown[meal_type] += 1
-
-            # Use pre-calculated nutrition from the meal log
-            for key in totals:
-                totals[key] += meal["nutrition"].get(key, 0)
-
-        # Calculate BMR for reference (handle 'others' gender)
-        if user['gender'].lower() in ['male', 'female']:
-            bmr = calculate_bmr(user['gender'], user['weight'], user['height'], user['age'])
-        else:
-            # For 'others' gender, use average of male/female BMR
-            bmr_male = calculate_bmr('male', user['weight'], user['height'], user['age'])
-            bmr_female = calculate_bmr('female', user['weight'], user['height'], user['age'])
-            bmr = (bmr_male + bmr_female) / 2
-
-        return {
-            "userId": userId,
-            "username": user['name'],
-            "date": str(on_date) if on_date else "All time",
-            "bmr": round(bmr, 2),
-            "nutrient_intake": totals,
-            "meals_logged": {
-                "total": len(user_meals),
-                "breakdown": meal_breakdown
-            },
-            "recommendations": {
-                "calories_vs_bmr": f"{totals['calories']} consumed vs {round(bmr, 2)} BMR",
-                "protein_percentage": f"{round((totals['protein'] * 4 / max(totals['calories'], 1)) * 100, 2)}% protein intake"
-            }
-        }
+        # All store access happens in one hop (inline for the in-memory store)
+        return await run_store(build_status, userId, on_date)
         
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -105,19 +131,10 @@ def list_foods():
     - **categories**: Food categories including grains, proteins, vegetables, and fruits.
     """
     try:
-        foods_with_nutrition = {}
-        for food, nutrition in food_db.items():
-            foods_with_nutrition[food] = nutrition
-        
         return {
             "total_foods": len(food_db),
-            "foods": foods_with_nutrition,
-            "categories": {
-                "grains": [f for f in food_db if any(grain in f.lower() for grain in ['rice', 'roti', 'chapati', 'naan', 'paratha'])],
-                "proteins": [f for f in food_db if any(protein in f.lower() for protein in ['dal', 'chicken', 'fish', 'paneer', 'egg'])],
-                "vegetables": [f for f in food_db if any(veg in f.lower() for veg in ['cucumber', 'tomato', 'onion', 'potato', 'carrot', 'spinach'])],
-                "fruits": [f for f in food_db if any(fruit in f.lower() for fruit in ['apple', 'banana', 'orange'])]
-            }
+            "foods": food_db,
+            "categories": food_categories
         }
     except Exception as e:
         # Handle any unexpected errors
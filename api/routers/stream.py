@@ -0,0 +1,100 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import json
+import os
+from api.db.async_store import astore
+from api.db.models import store
+from api.core.events import broker
+from api.core.log import logger
+
+router = APIRouter()
+
+# Seconds between keep-alive comments so proxies don't close idle streams
+HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+
+# Seconds between polls of the shared store when running several workers
+FEED_POLL_INTERVAL = float(os.getenv("SSE_FEED_POLL_INTERVAL", "0.5"))
+
+_change_feed_task = None
+
+def format_sse(event: dict) -> str:
+    """Encode an event dict as a server-sent event frame"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+async def _change_feed():
+    """
+    Republish meals logged by any worker to this worker's subscribers
+
+    With a shared store a meal may be logged by another process, so instead of
+    publishing from the request path each worker tails the meals table.
+    """
+    cursor = await run_in_threadpool(store.last_meal_id)
+    while True:
+        await asyncio.sleep(FEED_POLL_INTERVAL)
+        try:
+            if not broker.subscriber_count():
+                cursor = await run_in_threadpool(store.last_meal_id)
+                continue
+
+            cursor, meals = await run_in_threadpool(store.meals_since, cursor)
+            by_user = {}
+            for meal in meals:
+                if broker.has_subscribers(meal["userId"]):
+                    by_user.setdefault(meal["userId"], []).append(meal)
+            for user_id, entries in by_user.items():
+                daily = await run_in_threadpool(store.daily_intake, user_id)
+                broker.publish(user_id, {"type": "meal_logged", "meals": entries, "daily": daily})
+        except Exception:
+            logger.exception("SSE change feed error")
+
+def _ensure_change_feed():
+    global _change_feed_task
+    if store.shared and (_change_feed_task is None or _change_feed_task.done()):
+        _change_feed_task = asyncio.create_task(_change_feed())
+
+@router.get(
+    "/{userId}",
+    summary="Stream live updates for a user",
+    description="Server-sent events stream of meals logged for a user from any channel (REST, webhook, Telegram).",
+    responses={
+        200: {"description": "Event stream opened.", "content": {"text/event-stream": {}}},
+        404: {"description": "User not found."}
+    }
+)
+async def stream_user_updates(userId: str, request: Request):
+    """
+    Stream live updates for a user as server-sent events.
+
+    Path Parameters:
+    - **userId**: The unique identifier of the user.
+
+    Events:
+    - **snapshot**: Sent on connect with today's nutrient totals (`daily`).
+    - **meal_logged**: Newly logged `meals` and the updated `daily` totals.
+    - **resync**: The client fell behind and events were dropped; refetch state.
+    """
+    if not await astore.user_exists(userId):
+        raise HTTPException(
+            status_code=404,
+            detail=f"User with ID '{userId}' not found"
+        )
+
+    _ensure_change_feed()
+
+    async def event_stream():
+        subscription = broker.subscribe(userId)
+        try:
+            yield format_sse({"type": "snapshot", "daily": await astore.daily_intake(userId)})
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=HEARTBEAT_INTERVAL)
+                yield format_sse(event) if event is not None else ": keep-alive\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,35 +1,53 @@
 from fastapi import APIRouter, Request
-import httpx
 import os
 from api.routers.meals import log_meal_internal  # Use existing meal logging
+from api.core.metrics import RATE_LIMITED, TELEGRAM_OUTBOUND_PENDING
+from api.core.ratelimit import TokenBuckets, parse_limit
+from api.core.log import logger
+from api.core.routing import InstrumentedRoute
+from api.core.tracing import span, traced
 
 # NEW router - completely separate from existing webhook
-router = APIRouter(prefix="/telegram-bot", tags=["Telegram Bot"])
+router = APIRouter(prefix="/telegram-bot", tags=["Telegram Bot"], route_class=InstrumentedRoute)
 
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 
+# Messages per chat: rate:burst (messages per second : messages at once); empty disables the limit
+TELEGRAM_RATE_LIMIT = os.getenv("TELEGRAM_RATE_LIMIT", "1:5")
+
+chat_buckets = TokenBuckets(*parse_limit(TELEGRAM_RATE_LIMIT)) if TELEGRAM_RATE_LIMIT else None
+
 @router.post("/webhook")
 async def telegram_bot_webhook(request: Request):
     """Handle ONLY Telegram bot messages - separate from existing webhook"""
     
     try:
-        data = await request.json()
+        with span("telegram.parse_update"):
+            data = await request.json()
         
         # Only process if it's a message
         if "message" not in data:
             return {"ok": True}
         
         message = data["message"]
+
+        # Over-limit messages are acknowledged and dropped; Telegram would redeliver a rejected update
+        chat_id = message.get("chat", {}).get("id")
+        if chat_buckets is not None and chat_buckets.acquire((chat_id,)) > 0:
+            RATE_LIMITED.inc("telegram")
+            logger.debug("Telegram message dropped by rate limit", extra={"chat_id": chat_id})
+            return {"ok": True}
         
         # Process the message using the updated handler
         await handle_message(message)
         
         return {"ok": True}
         
-    except Exception as e:
-        print(f"Telegram webhook error: {e}")
+    except Exception:
+        logger.exception("Telegram webhook error")
         return {"ok": True}
 
+@traced("telegram.handle_log_command")
 async def handle_telegram_log_command(chat_id: int, text: str, user_info: dict):
     """Process /log command from Telegram"""
     
@@ -39,13 +57,15 @@ async def handle_telegram_log_command(chat_id: int, text: str, user_info: dict):
             await send_format_help_message(chat_id)
             return
         
-        # Extract command parts
-        parts = text.split(":", 1)
-        command_part = parts[0].replace("/log", "").strip()
-        items_part = parts[1].strip()
-        
-        # Check if user_id and meal_type are provided
-        command_words = command_part.split()
+        with span("telegram.parse_command"):
+            # Extract command parts
+            parts = text.split(":", 1)
+            command_part = parts[0].replace("/log", "").strip()
+            items_part = parts[1].strip()
+            food_items = [item.strip() for item in items_part.split(",")]
+
+            # Check if user_id and meal_type are provided
+            command_words = command_part.split()
         
         if len(command_words) != 2:
             await send_format_help_message(chat_id)
@@ -63,8 +83,6 @@ async def handle_telegram_log_command(chat_id: int, text: str, user_info: dict):
                 "Use /help for correct format")
             return
         
-        food_items = [item.strip() for item in items_part.split(",")]
-        
         # Validate food items are not empty
         if not food_items or all(not item.strip() for item in food_items):
             await send_telegram_message(chat_id,
@@ -182,6 +200,7 @@ async def send_format_help_message(chat_id: int):
 
     await send_telegram_message(chat_id, message, parse_mode="Markdown")
 
+@traced("telegram.handle_message")
 async def handle_message(message: dict):
     """Process incoming Telegram message"""
     
@@ -227,7 +246,7 @@ async def send_telegram_message(chat_id: int, text: str, parse_mode: str = None)
     """Send message back to Telegram user"""
     
     if not BOT_TOKEN:
-        print("TELEGRAM_BOT_TOKEN not set")
+        logger.warning("TELEGRAM_BOT_TOKEN not set; dropping outbound message", extra={"chat_id": chat_id})
         return
     
     url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
@@ -240,9 +259,19 @@ async def send_telegram_message(chat_id: int, text: str, parse_mode: str = None)
     if parse_mode:
         payload["parse_mode"] = parse_mode
     
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(url, json=payload)
-            return response.json()
-        except Exception as e:
-            print(f"Error sending Telegram message: {e}")
+    # Imported here rather than at startup: httpx is only needed once a reply is sent
+    import httpx
+
+    TELEGRAM_OUTBOUND_PENDING.inc()
+    try:
+        with span("telegram.send_message", kind="CLIENT", **{"server.address": "api.telegram.org"}) as send_span:
+            async with httpx.AsyncClient() as client:
+                try:
+                    response = await client.post(url, json=payload)
+                    send_span.set_attribute("http.response.status_code", response.status_code)
+                    return response.json()
+                except Exception as e:
+                    send_span.set_error(f"{type(e).__name__}: {e}")
+                    logger.warning("Error sending Telegram message: %s", e, extra={"chat_id": chat_id})
+    finally:
+        TELEGRAM_OUTBOUND_PENDING.dec()
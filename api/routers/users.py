@@ -2,10 +2,13 @@ from fastapi import APIRouter, HTTPException, status
 from typing import Optional
 from datetime import datetime
 from api.schemas.user import User, UserCreate
-from api.db.models import users_db, user_lookup
+from api.db.models import store
+from api.db.async_store import astore
 from api.utils.utils import calculate_bmr
+from api.core.etag import user_etag
+from api.core.routing import InstrumentedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 
 @router.post(
     "/register",
@@ -17,7 +20,7 @@ router = APIRouter()
         500: {"description": "Server error."}
     }
 )
-def register_user(user_data: UserCreate):
+async def register_user(user_data: UserCreate):
     """
     Register a new user with profile data.
 
@@ -38,9 +41,6 @@ def register_user(user_data: UserCreate):
     - **user**: The full profile of the registered user.
     """
     try:
-        # Generate userId
-        user_id = f"user_{len(users_db) + 1}"
-        
         # Store user data with all fields from schema
         user_record = {
             "name": user_data.name,
@@ -54,10 +54,8 @@ def register_user(user_data: UserCreate):
             "registeredAt": datetime.now().isoformat()
         }
         
-        users_db[user_id] = user_record
-        
-        # Update lookup table by name for easier searching
-        user_lookup[user_data.name] = user_id
+        # Allocate userId and index the user by name atomically
+        user_id = await astore.create_user(user_record)
         
         return {
             "message": "User registered successfully",
@@ -87,6 +85,7 @@ def register_user(user_data: UserCreate):
         500: {"description": "Error calculating BMR."}
     }
 )
+@user_etag()
 def get_bmr(
     userId: str
 ):
@@ -103,7 +102,7 @@ def get_bmr(
     - **user_profile**: The user's profile details including height, weight, age, gender, activity level, and goal.
     """
     try:
-        user = users_db.get(userId)
+        user = store.get_user(userId)
         if not user:
             raise HTTPException(
                 status_code=404, 
@@ -164,15 +163,14 @@ def lookup_user(
     - **user_profile**: The user's profile details including email, height, weight, age, gender, activity level, and goal.
     """
     try:
-        if username not in user_lookup:
+        user_id = store.lookup_user_id(username)
+        user = store.get_user(user_id) if user_id else None
+        if user is None:
             raise HTTPException(
                 status_code=404, 
                 detail=f"User '{username}' not found"
             )
 
-        user_id = user_lookup[username]
-        user = users_db.get(user_id)
-
         return {
             "username": username,
             "userId": user_id,
@@ -212,7 +210,7 @@ def list_users():
     """
     try:
         user_list = []
-        for user_id, user_data in users_db.items():
+        for user_id, user_data in store.list_users():
             user_list.append({
                 "userId": user_id,
                 "name": user_data['name'],
@@ -242,7 +240,7 @@ def list_users_public():
     """
     try:
         user_list = []
-        for user_id, user_data in users_db.items():
+        for user_id, user_data in store.list_users():
             user_list.append({
                 "userId": user_id,
                 "name": user_data['name']
@@ -260,6 +258,7 @@ def list_users_public():
         )
 
 @router.get("/{userId}")
+@user_etag()
 def get_user_details(
     userId: str
 ):
@@ -274,13 +273,13 @@ def get_user_details(
     - **user_profile**: The user's profile details including name, email, height, weight, age, gender, activity level, and goal.
     """
     try:
-        if userId not in users_db:
+        user_data = store.get_user(userId)
+        if user_data is None:
             raise HTTPException(
                 status_code=404, 
                 detail=f"User with ID '{userId}' not found"
             )
 
-        user_data = users_db[userId]
         return {
             "userId": userId,
             **user_data
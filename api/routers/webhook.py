@@ -1,109 +1,107 @@
-from fastapi import APIRouter, Depends, HTTPException, Header
-from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Header, WebSocket, WebSocketDisconnect, status
 from typing import Optional
-import re
-from api.schemas import WebhookMessage, MealLog
+import asyncio
+import json
+import math
+import os
+from api.schemas import WebhookMessage
 from api.schemas.responses import WebhookResponse
 from api.db.food_data import food_db
-from api.db.models import users_db, meals_db, get_user_by_identifier, update_user_activity
-from api.core.auth import get_current_user, AuthUser
+from api.db.models import get_user_by_identifier
+from api.db.async_store import run_store
+from api.routers.meals import log_meals_batch_internal
+from api.utils.message_parser import parse_meal_message, MessageParseError
+from api.core.auth import get_current_user, AuthUser, API_KEY_NAME, USER_ID_NAME
+from api.core.log import logger
+from api.core.ratelimit import acquire_frame
+from api.core.routing import InstrumentedRoute
+from api.core.tracing import span
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
+
+# Maximum number of received-but-unprocessed frames per WebSocket connection.
+# Once reached the server stops reading, so TCP flow control pushes back on the client.
+WS_MAX_PENDING = int(os.getenv("WEBHOOK_WS_MAX_PENDING", "256"))
+
+def ingest_chat_message(user_identifier: str, message: str):
+    """
+    Internal function to parse and log a chat message - used by the HTTP and WebSocket webhooks
+    Returns: dict with success status, logged meal entries and batch nutrition,
+    or error message and error type if any
+    """
+    # Parse message into one or more meals with quantities
+    try:
+        with span("webhook.parse_message"):
+            parsed_meals = parse_meal_message(message)
+    except MessageParseError as e:
+        return {
+            "success": False,
+            "error": f"Invalid message format: {e}",
+            "error_type": "invalid_format"
+        }
+
+    # Find user by identifier
+    user_record = get_user_by_identifier(user_identifier)
+    if not user_record:
+        return {
+            "success": False,
+            "error": f"User not found with identifier: {user_identifier}. Please register first.",
+            "error_type": "user_not_found"
+        }
+
+    user_id, user_data = user_record
+
+    # Ingest all meals from the message as a single batch
+    result = log_meals_batch_internal(user_id, parsed_meals)
+    if not result["success"] and result["error_type"] == "unknown_foods":
+        available_foods = list(food_db.keys())
+        result["error"] += f". Available foods: {available_foods[:10]}... (use GET /nutrition/foods for full list)"
+    return result
 
 @router.post("/", response_model=WebhookResponse)
 def webhook_meal_logging(
     msg: WebhookMessage,
     user_id: str = Header(..., description="User ID sending the message")
 ):
-    print(f"Received headers: user_id={user_id}")  # Debug log
-    print(f"Received body: {msg}")  # Debug log
     """
-    Log a meal via webhook (e.g., from WhatsApp/Google Chat).
+    Log one or more meals via webhook (e.g., from WhatsApp/Google Chat).
 
     Request Body:
-    - **userId**: The unique identifier of the user.
-    - **meal**: The type of meal (e.g., breakfast, lunch, dinner, snack).
-    - **items**: A list of food items included in the meal.
-    - **loggedAt**: The date the meal was consumed (optional, defaults to today).
+    - **message**: Chat message such as "log lunch: rice, dal" or
+      "breakfast: 2 eggs, oats 50g; lunch: rice 200g, dal". Meals are separated
+      by ';' or newlines; items may carry a count ("2 eggs") or a unit ("oats 50g").
 
     Returns:
     - **status**: The status of the webhook (success or error).
     - **message**: A message describing the result.
     - **webhook_data**: The data received from the webhook.
-    - **result**: The details of the logged meal (if successful).
+    - **result**: The logged meal, or the list of meals and their combined nutrition when several were logged.
     """
+    logger.debug("Webhook message received", extra={"user": user_id, "message_length": len(msg.message)})
     try:
-        # Parse message to extract meal type and items
-        match = re.match(r"log (\w+): (.+)", msg.message)
-        if match:
-            meal = match.group(1)
-            items = [item.strip() for item in match.group(2).split(",")]
-        else:
+        result = ingest_chat_message(user_id, msg.message)
+        if not result["success"]:
             return WebhookResponse(
                 status="error",
-                message="Invalid message format. Expected format: 'log <meal>: <item1>, <item2>, ...'",
-                webhook_data=msg.model_dump(),
+                message=result["error"],
+                webhook_data=msg.model_dump() if result["error_type"] == "invalid_format" else None,
                 result=None
             )
 
-        # Find user by identifier
-        user_record = get_user_by_identifier(user_id)
-        if not user_record:
+        entries = result["meals"]
+        if len(entries) == 1:
             return WebhookResponse(
-                status="error",
-                message=f"User not found with identifier: {user_id}. Please register first.",
-                webhook_data=None,
-                result=None
-            )
-
-        user_id, user_data = user_record
-
-        # Validate food items exist in database (case-insensitive)
-        normalized_food_db = {k.lower(): k for k in food_db.keys()}
-        normalized_items = []
-        unknown_items = []
-
-        for item in items:
-            item_lower = item.strip().lower()
-            if item_lower in normalized_food_db:
-                normalized_items.append(normalized_food_db[item_lower])
-            else:
-                unknown_items.append(item)
-
-        if unknown_items:
-            available_foods = list(food_db.keys())
-            return WebhookResponse(
-                status="error",
-                message=f"Unknown food items: {unknown_items}. Available foods: {available_foods[:10]}... (use GET /nutrition/foods for full list)",
-                webhook_data=None,
-                result=None
+                status="success",
+                message="Meal logged successfully",
+                webhook_data=msg.model_dump(),
+                result=entries[0]
             )
 
-        # Calculate nutrition for this meal using normalized food names
-        meal_nutrition = {"calories": 0, "protein": 0, "carbs": 0, "fiber": 0}
-        for item in normalized_items:
-            if item in food_db:
-                for nutrient in meal_nutrition:
-                    meal_nutrition[nutrient] += food_db[item][nutrient]
-
-        # Store meal log with normalized food names
-        meal_entry = MealLog(
-            userId=user_id,
-            meal=meal,
-            items=normalized_items,
-            loggedAt=date.today()
-        ).model_dump()
-        meal_entry['nutrition'] = meal_nutrition
-        meals_db.append(meal_entry)
-
-        # Update user activity
-        update_user_activity(user_id, "meal")
-
         return WebhookResponse(
             status="success",
-            message="Meal logged successfully",
+            message=f"{len(entries)} meals logged successfully",
             webhook_data=msg.model_dump(),
-            result=meal_entry
+            result={"meals": entries, "nutrition": result["nutrition"]}
         )
 
     except Exception as e:
@@ -113,3 +111,119 @@ def webhook_meal_logging(
             webhook_data=msg.model_dump(),
             result=None
         )
+
+@router.websocket("/ws")
+async def webhook_meal_logging_ws(websocket: WebSocket):
+    """
+    Persistent chat connection for high-frequency meal logging.
+
+    Authenticate once during the handshake with the usual headers
+    (X-API-Key and X-User-Id) or, for clients that cannot set headers,
+    the `api_key` and `user_id` query parameters.
+
+    Each frame is a JSON object in the same message format as the HTTP webhook:
+    - **id**: Correlation ID echoed back in the acknowledgement (optional).
+    - **message**: Chat message, e.g. "breakfast: 2 eggs, oats 50g; lunch: rice".
+    - **userId**: Target user (admin keys only; regular keys log for their own user).
+
+    Frames may be pipelined without waiting for acknowledgements. Each one is
+    acknowledged in order with:
+    - **id**: The correlation ID of the frame.
+    - **status**: success or error.
+    - **message**: A message describing the result.
+    - **meals**: Number of meals logged (on success).
+    - **nutrition**: Combined nutrition of the logged meals (on success).
+    - **retry_after**: Seconds to wait, when the frame was rejected by the rate limit.
+
+    Frames are rate limited like HTTP webhook requests, per client address
+    and authenticated user; a frame over the limit is not processed.
+    """
+    # Key lookups and frame processing touch the store: off the event loop with a blocking backend
+    try:
+        auth_user = await run_store(
+            get_current_user,
+            api_key=websocket.headers.get(API_KEY_NAME) or websocket.query_params.get("api_key"),
+            user_id=websocket.headers.get(USER_ID_NAME) or websocket.query_params.get("user_id")
+        )
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+        return
+
+    await websocket.accept()
+
+    # Bounded queue between the reader and the processor provides backpressure
+    pending: asyncio.Queue = asyncio.Queue(maxsize=WS_MAX_PENDING)
+
+    async def reader():
+        try:
+            while True:
+                await pending.put(await websocket.receive_text())
+        except Exception:
+            # Disconnect or unreadable frame - let the processor drain and finish
+            await pending.put(None)
+
+    reader_task = asyncio.create_task(reader())
+    try:
+        while True:
+            frame = await pending.get()
+            if frame is None:
+                break
+            wait = acquire_frame(websocket.scope, auth_user.user_id)
+            if wait > 0:
+                ack = {
+                    "id": _frame_id(frame),
+                    "status": "error",
+                    "message": "Rate limit exceeded; retry later",
+                    "retry_after": math.ceil(wait)
+                }
+            else:
+                ack = await run_store(_process_ws_frame, auth_user, frame)
+            await websocket.send_text(json.dumps(ack, default=str))
+    except (WebSocketDisconnect, RuntimeError):
+        # Client went away while we were acknowledging
+        pass
+    finally:
+        reader_task.cancel()
+
+def _frame_id(frame: str):
+    """Correlation ID of a frame, or None if it has none or isn't a JSON object"""
+    try:
+        data = json.loads(frame)
+    except ValueError:
+        return None
+    return data.get("id") if isinstance(data, dict) else None
+
+def _process_ws_frame(auth_user: AuthUser, frame: str) -> dict:
+    """Process a single WebSocket frame and build its acknowledgement"""
+    try:
+        data = json.loads(frame)
+        if not isinstance(data, dict):
+            raise ValueError("frame must be a JSON object")
+    except ValueError as e:
+        return {"id": None, "status": "error", "message": f"Invalid frame: {e}"}
+
+    correlation_id = data.get("id")
+    message = data.get("message")
+    if not isinstance(message, str) or not message.strip():
+        return {"id": correlation_id, "status": "error", "message": "Field 'message' is required"}
+
+    # Regular keys are bound to their own user; admins may target any user
+    user_identifier = auth_user.user_id
+    if auth_user.role == "admin" and data.get("userId"):
+        user_identifier = str(data["userId"])
+
+    try:
+        result = ingest_chat_message(user_identifier, message)
+    except Exception as e:
+        return {"id": correlation_id, "status": "error", "message": f"Error processing message: {str(e)}"}
+
+    if not result["success"]:
+        return {"id": correlation_id, "status": "error", "message": result["error"]}
+
+    return {
+        "id": correlation_id,
+        "status": "success",
+        "message": "Meal logged successfully" if len(result["meals"]) == 1 else f"{len(result['meals'])} meals logged successfully",
+        "meals": len(result["meals"]),
+        "nutrition": result["nutrition"]
+    }
@@ -7,6 +7,7 @@ This module contains all Pydantic models used for request/response validation.
 from .user import User, UserCreate
 from .meal import MealLog
 from .webhook import WebhookMessage
+from .api_key import ApiKeyCreate
 from .responses import (
     UserRegistrationResponse,
     BMRResponse,
@@ -25,6 +26,7 @@ __all__ = [
     "UserCreate",
     "MealLog", 
     "WebhookMessage",
+    "ApiKeyCreate",
     
     # Response schemas
     "UserRegistrationResponse",
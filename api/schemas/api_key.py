@@ -0,0 +1,15 @@
+from pydantic import BaseModel, Field, field_validator
+from typing import Optional
+
+class ApiKeyCreate(BaseModel):
+    """Schema for issuing a new API key"""
+    role: str = Field(default="user", description="Role granted by the key (user/admin)")
+    userId: Optional[str] = Field(None, description="Bind the key to this user; it then needs no X-User-Id header")
+    name: Optional[str] = Field(None, max_length=100, description="Label to recognize the key by")
+
+    @field_validator('role')
+    @classmethod
+    def validate_role(cls, v):
+        if v.lower() not in ['user', 'admin']:
+            raise ValueError('Role must be either "user" or "admin"')
+        return v.lower()
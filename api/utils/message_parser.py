@@ -0,0 +1,164 @@
+"""
+Chat message parser for meal logging
+
+Turns free-form chat messages into structured meals, e.g.
+
+    "log lunch: rice, dal"
+    "breakfast: 2 eggs, oats 50g; lunch: rice 200g, dal"
+
+Grammar (case-insensitive):
+
+    message  := segment ((";" | newline) segment)*
+    segment  := ["log"] meal ":" item (("," | "+" | "&" | "and") item)*
+    item     := [qty [unit] ["of"]] food [["x"] qty [unit]]
+
+A quantity without a unit counts servings of the default 100 g portion the
+food database is expressed in, so "2 eggs" is 200 g and "dal" is 100 g.
+
+All patterns are compiled once at import time so parsing a message is a few
+regex matches per meal/item with no per-call compilation.
+"""
+import re
+from typing import List, NamedTuple, Optional
+
+# Grams in the default serving (food_db values are per 100g)
+DEFAULT_SERVING_GRAMS = 100.0
+
+# Upper bound for a single item, guards against typos like "rice 2000kg"
+MAX_ITEM_GRAMS = 5000.0
+
+MEAL_ALIASES = {
+    "breakfast": "breakfast",
+    "lunch": "lunch",
+    "dinner": "dinner",
+    "snack": "snack",
+    "snacks": "snack",
+}
+
+# Unit -> grams per unit (liquids assume ~1 g/ml)
+UNIT_GRAMS = {
+    "g": 1.0, "gm": 1.0, "gms": 1.0, "gr": 1.0, "gram": 1.0, "grams": 1.0,
+    "kg": 1000.0, "kgs": 1000.0, "kilogram": 1000.0, "kilograms": 1000.0,
+    "ml": 1.0, "l": 1000.0, "litre": 1000.0, "litres": 1000.0, "liter": 1000.0, "liters": 1000.0,
+    "cup": 240.0, "cups": 240.0, "bowl": 250.0, "bowls": 250.0, "glass": 250.0, "glasses": 250.0,
+    "tbsp": 15.0, "tsp": 5.0,
+    "x": DEFAULT_SERVING_GRAMS, "serving": DEFAULT_SERVING_GRAMS, "servings": DEFAULT_SERVING_GRAMS,
+    "piece": DEFAULT_SERVING_GRAMS, "pieces": DEFAULT_SERVING_GRAMS,
+    "pc": DEFAULT_SERVING_GRAMS, "pcs": DEFAULT_SERVING_GRAMS,
+}
+
+NUMBER_WORDS = {
+    "a": 1.0, "an": 1.0, "one": 1.0, "two": 2.0, "three": 3.0, "four": 4.0,
+    "five": 5.0, "half": 0.5,
+}
+
+_NUM = r"\d+(?:\.\d+)?|\d+/\d+|(?:" + "|".join(NUMBER_WORDS) + r")\b"
+# Longest units first so "kg" wins over "g" and "grams" over "gram"
+_UNIT = "|".join(sorted((re.escape(u) for u in UNIT_GRAMS), key=len, reverse=True))
+
+_SEGMENT_SPLIT_RE = re.compile(r"\s*[;\n]\s*")
+_SEGMENT_RE = re.compile(r"^(?:log\s+)?(?P<meal>\w+)\s*:\s*(?P<items>.*)$", re.IGNORECASE | re.DOTALL)
+_ITEM_SPLIT_RE = re.compile(r"\s*(?:,|\+|&|\band\b)\s*", re.IGNORECASE)
+_ITEM_RE = re.compile(
+    rf"^(?:(?P<lead_qty>{_NUM})\s*(?:(?P<lead_unit>{_UNIT})\b\.?)?\s+(?:of\s+)?)?"
+    rf"(?P<name>.+?)"
+    rf"(?:\s+(?:x\s*)?(?P<trail_qty>{_NUM})\s*(?:(?P<trail_unit>{_UNIT})\b\.?)?)?$",
+    re.IGNORECASE,
+)
+
+
+class MessageParseError(ValueError):
+    """Raised when a chat message does not follow the meal logging grammar"""
+
+
+class ParsedItem(NamedTuple):
+    """A single food item with its resolved portion size"""
+    name: str
+    quantity: float
+    unit: Optional[str]
+    grams: float
+
+
+class ParsedMeal(NamedTuple):
+    """A meal type and the items logged under it"""
+    meal: str
+    items: List[ParsedItem]
+
+
+def _parse_number(token: str) -> float:
+    token = token.lower()
+    if token in NUMBER_WORDS:
+        return NUMBER_WORDS[token]
+    if "/" in token:
+        numerator, denominator = token.split("/", 1)
+        if float(denominator) == 0:
+            raise MessageParseError(f"Invalid quantity '{token}'")
+        return float(numerator) / float(denominator)
+    return float(token)
+
+
+def parse_item(text: str) -> ParsedItem:
+    """Parse a single item such as "2 eggs", "oats 50g" or "a bowl of dal" """
+    match = _ITEM_RE.match(text.strip())
+    if not match or not match.group("name").strip():
+        raise MessageParseError(f"Could not understand item '{text}'")
+
+    if match.group("lead_qty") and match.group("trail_qty"):
+        raise MessageParseError(f"Item '{text}' has more than one quantity")
+
+    qty_token = match.group("lead_qty") or match.group("trail_qty")
+    unit = match.group("lead_unit") or match.group("trail_unit")
+    quantity = _parse_number(qty_token) if qty_token else 1.0
+    unit = unit.lower() if unit else None
+
+    grams = quantity * (UNIT_GRAMS[unit] if unit else DEFAULT_SERVING_GRAMS)
+    if grams <= 0 or grams > MAX_ITEM_GRAMS:
+        raise MessageParseError(f"Implausible quantity for item '{text}'")
+
+    return ParsedItem(
+        name=match.group("name").strip(),
+        quantity=quantity,
+        unit=unit,
+        grams=grams
+    )
+
+
+def parse_meal_message(message: str) -> List[ParsedMeal]:
+    """
+    Parse a chat message into one or more meals
+
+    Args:
+        message: Raw message text, e.g. "breakfast: 2 eggs, oats 50g; lunch: rice"
+
+    Returns:
+        List of ParsedMeal in message order
+
+    Raises:
+        MessageParseError: If any segment or item does not follow the grammar
+    """
+    meals = []
+    for segment in _SEGMENT_SPLIT_RE.split(message.strip()):
+        if not segment:
+            continue
+
+        match = _SEGMENT_RE.match(segment)
+        if not match:
+            raise MessageParseError(
+                f"Invalid segment '{segment}'. Expected format: 'log <meal>: <item1>, <item2>, ...' (separate meals with ';')"
+            )
+
+        meal = MEAL_ALIASES.get(match.group("meal").lower())
+        if meal is None:
+            raise MessageParseError(
+                f"Invalid meal type '{match.group('meal')}'. Valid meal types: {sorted(set(MEAL_ALIASES.values()))}"
+            )
+
+        items = [parse_item(item) for item in _ITEM_SPLIT_RE.split(match.group("items")) if item.strip()]
+        if not items:
+            raise MessageParseError(f"No food items provided for {meal}")
+
+        meals.append(ParsedMeal(meal=meal, items=items))
+
+    if not meals:
+        raise MessageParseError("Empty message")
+    return meals
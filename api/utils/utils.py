@@ -1,4 +1,3 @@
-import os
 from typing import Dict, Any
 
 def calculate_bmr(gender: str, weight: float, height: float, age: int) -> float:
@@ -48,14 +47,6 @@ def calculate_tdee(bmr: float, activity_level: str = "sedentary") -> float:
     multiplier = activity_multipliers.get(activity_level.lower(), 1.2)
     return bmr * multiplier
 
-def verify_token(token: str) -> bool:
-    """
-    Verify API token - in production, use proper JWT or OAuth
-    """
-    # Get from environment variable or use default for demo
-    valid_token = os.getenv("API_KEY", "SECRET_API_KEY")
-    return token == valid_token
-
 def get_nutrition_recommendations(age: int, gender: str, goal: str) -> Dict[str, Any]:
     """
     Get basic nutrition recommendations based on user profile
@@ -116,7 +107,7 @@ def verify_token(token: str) -> bool:
         True if the token is valid, False otherwise
     """
     # In a real application, this would verify a JWT token
-    # For now, just check if it's one of our test API keys
-    from api.core.auth import SECRET_API_KEY, ADMIN_API_KEY
-    
-    return token in [SECRET_API_KEY, ADMIN_API_KEY]
+    # For now, accept any key in the API key registry
+    from api.core.keys import api_keys, hash_key
+
+    return api_keys.lookup(hash_key(token)) is not None
@@ -0,0 +1,5 @@
+"""
+Benchmarks for the BMR Tracker API
+
+Run from the repository root, e.g. ``python -m benchmarks.bench_parser``.
+"""
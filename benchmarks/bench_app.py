@@ -0,0 +1,273 @@
+"""
+End-to-end API benchmark at production data sizes
+
+Preloads the configured store (STORE_BACKEND / STORE_PATH, in-memory by
+default) with synthetic users and meals, or with a snapshot file from
+benchmarks.workload (``--snapshot``), then drives ``api.main:app`` in
+process through httpx's ASGI transport: for each endpoint, ``--concurrency``
+async workers issue ``--requests`` requests against random users. Every
+request goes through the full middleware stack, routing, validation and the
+threadpool, with no network or server in between.
+
+Reports p50/p95/p99 latency and throughput per endpoint, and optionally saves
+them as JSON (``--output``). ``--compare`` checks a run against a saved
+baseline and exits non-zero when an endpoint regressed by more than
+``--threshold`` percent in p95 latency or throughput.
+
+The scale is configurable; production-sized runs need a lot of memory with
+the in-memory store (10M meals is several GB):
+
+    python -m benchmarks.bench_app --users 100000 --meals 10000000
+
+Usage:
+    python -m benchmarks.bench_app [--users 1000] [--meals 50000] [--days 90] [--snapshot FILE]
+        [--requests 2000] [--concurrency 32] [--endpoints status,log_meal]
+        [--output results.json] [--compare baseline.json] [--threshold 10]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+
+# Keep the structured access log quiet so it doesn't flood the report
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# Every simulated client shares one address, which rate limiting would throttle
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+
+from api.main import app
+from api.db.food_data import food_db
+from api.db.models import STORE_BACKEND, store
+from api.db.snapshot import load_snapshot
+
+MEAL_TYPES = ("breakfast", "lunch", "dinner", "snack")
+GENDERS = ("male", "female", "other")
+ACTIVITY_LEVELS = ("sedentary", "light", "moderate", "active", "very_active")
+GOALS = ("lose_weight", "gain_weight", "maintain", "build_muscle")
+NUTRIENTS = ("calories", "protein", "carbs", "fiber")
+
+
+def preload(users: int, meals: int, days: int, rng: random.Random) -> list:
+    """Create `users` users and spread `meals` meals over the last `days` days; returns the userIds"""
+    foods = list(food_db)
+    today = date.today()
+    user_ids = []
+    for i in range(users):
+        user_ids.append(store.create_user({
+            "name": f"Bench User {i}",
+            "email": f"bench{i}@example.com",
+            "height": round(rng.uniform(150, 195), 1),
+            "weight": round(rng.uniform(45, 110), 1),
+            "age": rng.randint(18, 75),
+            "gender": rng.choice(GENDERS),
+            "activity_level": rng.choice(ACTIVITY_LEVELS),
+            "goal": rng.choice(GOALS),
+            "registeredAt": datetime.now().isoformat()
+        }))
+
+    per_user, remainder = divmod(meals, users) if users else (0, 0)
+    for index, user_id in enumerate(user_ids):
+        entries = []
+        for _ in range(per_user + (1 if index < remainder else 0)):
+            items = rng.sample(foods, rng.randint(1, 4))
+            entries.append({
+                "userId": user_id,
+                "meal": rng.choice(MEAL_TYPES),
+                "items": items,
+                "loggedAt": today - timedelta(days=rng.randrange(days)),
+                "nutrition": {n: round(sum(food_db[item][n] for item in items), 2) for n in NUTRIENTS}
+            })
+        if entries:
+            store.add_meals(user_id, entries)
+    return user_ids
+
+
+def build_scenarios(user_ids: list, days: int, rng: random.Random) -> dict:
+    """Endpoint name -> function returning (method, url, request kwargs) for one request"""
+    foods = list(food_db)
+    today = date.today()
+
+    def user():
+        return rng.choice(user_ids)
+
+    def past_day():
+        return (today - timedelta(days=rng.randrange(days))).isoformat()
+
+    return {
+        "status": lambda: ("GET", f"/api/v1/nutrition/status/{user()}", {}),
+        "status_day": lambda: ("GET", f"/api/v1/nutrition/status/{user()}?on_date={past_day()}", {}),
+        "meals": lambda: ("GET", f"/api/v1/meals/{user()}", {}),
+        "meals_day": lambda: ("GET", f"/api/v1/meals/{user()}?on_date={past_day()}", {}),
+        "dashboard": lambda: ("GET", f"/api/v1/dashboard/{user()}", {}),
+        "bmr": lambda: ("GET", f"/api/v1/users/bmr/{user()}", {}),
+        "log_meal": lambda: ("POST", "/api/v1/meals/log", {"json": {
+            "userId": user(), "meal": rng.choice(MEAL_TYPES), "items": rng.sample(foods, rng.randint(1, 4))
+        }}),
+        "register": lambda: ("POST", "/api/v1/users/register", {"json": {
+            "name": f"Bench User {rng.randrange(10 ** 6)}", "age": rng.randint(18, 80),
+            "weight": rng.randint(45, 120), "height": rng.randint(150, 200), "gender": rng.choice(GENDERS)
+        }}),
+        "webhook": lambda: ("POST", "/api/v1/webhook/", {
+            "json": {"message": f"{rng.choice(MEAL_TYPES)}: {', '.join(rng.sample(foods, 2))}"},
+            "headers": {"user-id": user()}
+        }),
+    }
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def run_endpoint(client: httpx.AsyncClient, make_request, requests: int, concurrency: int) -> dict:
+    """Issue `requests` requests from `concurrency` workers; latency summary and throughput"""
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, url, kwargs = make_request()
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / elapsed, 1),
+        "latency_ms": {
+            "mean": round(sum(ordered) / len(ordered) * 1e3, 3),
+            "p50": round(percentile(ordered, 0.50) * 1e3, 3),
+            "p95": round(percentile(ordered, 0.95) * 1e3, 3),
+            "p99": round(percentile(ordered, 0.99) * 1e3, 3),
+            "max": round(ordered[-1] * 1e3, 3)
+        }
+    }
+
+
+async def run_all(scenarios: dict, args) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, make_request in scenarios.items():
+            if args.warmup:
+                await run_endpoint(client, make_request, args.warmup, min(args.concurrency, args.warmup))
+            results[name] = await run_endpoint(client, make_request, args.requests, args.concurrency)
+            report_line(name, results[name])
+    return results
+
+
+def report_line(name: str, result: dict):
+    latency = result["latency_ms"]
+    print(f"{name:>11}  {result['throughput_rps']:>9,.0f} rps  p50 {latency['p50']:8.2f} ms  "
+          f"p95 {latency['p95']:8.2f} ms  p99 {latency['p99']:8.2f} ms  errors {result['errors']}")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline_path: str, threshold: float) -> bool:
+    """Print the change against a baseline run; True if any endpoint regressed beyond the threshold"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    print(f"\nAgainst {baseline_path} (regression threshold {threshold:g}%)")
+    regressed = False
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        p95_change = (result["latency_ms"]["p95"] / baseline[name]["latency_ms"]["p95"] - 1) * 100
+        rps_change = (result["throughput_rps"] / baseline[name]["throughput_rps"] - 1) * 100
+        flag = p95_change > threshold or rps_change < -threshold
+        regressed = regressed or flag
+        print(f"{name:>11}  p95 {p95_change:+7.1f}%  throughput {rps_change:+7.1f}%{'  REGRESSION' if flag else ''}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000, help="Users to preload")
+    parser.add_argument("--meals", type=int, default=50000, help="Meals to preload, spread evenly over users")
+    parser.add_argument("--days", type=int, default=90, help="Days of history the meals are spread over")
+    parser.add_argument("--snapshot", help="Preload this snapshot file (benchmarks.workload) instead of --users/--meals")
+    parser.add_argument("--requests", type=int, default=2000, help="Measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=100, help="Unmeasured requests per endpoint first")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent async workers")
+    parser.add_argument("--endpoints", help="Comma-separated subset of endpoints to run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Baseline JSON file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    if args.snapshot:
+        load_snapshot(store, args.snapshot)
+        user_ids = [user_id for user_id, _ in store.list_users()]
+    else:
+        user_ids = preload(args.users, args.meals, args.days, rng)
+    preloaded_users, preloaded_meals = store.count_users(), store.count_meals()
+    print(f"Preloaded {preloaded_users:,} users and {preloaded_meals:,} meals "
+          f"({STORE_BACKEND} store) in {time.perf_counter() - start:.1f}s")
+    if not user_ids:
+        sys.exit("Nothing to benchmark: --users must be at least 1")
+
+    scenarios = build_scenarios(user_ids, args.days, rng)
+    if args.endpoints:
+        selected = args.endpoints.split(",")
+        unknown = set(selected) - set(scenarios)
+        if unknown:
+            sys.exit(f"Unknown endpoints: {sorted(unknown)}. Choose from {list(scenarios)}")
+        scenarios = {name: scenarios[name] for name in selected}
+
+    print(f"{args.requests} requests per endpoint, {args.concurrency} concurrent workers\n")
+    results = asyncio.run(run_all(scenarios, args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    "commit": git_commit(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "store_backend": STORE_BACKEND,
+                    "snapshot": args.snapshot,
+                    "users": preloaded_users,
+                    "meals": preloaded_meals,
+                    "days": args.days,
+                    "requests": args.requests,
+                    "concurrency": args.concurrency,
+                    "seed": args.seed
+                },
+                "results": results
+            }, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
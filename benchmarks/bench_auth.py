@@ -0,0 +1,113 @@
+"""
+API key authentication cost as the number of issued keys grows
+
+Issues keys through the key registry (into the configured STORE_BACKEND,
+in-memory by default) up to each size in ``--sizes`` and times, at every
+size:
+
+- ``hash_key``, the HMAC every request pays,
+- ``resolve_principal``, the registry lookup behind a cache miss, for a bound
+  user key, an unbound user key with X-User-Id and an unknown key,
+- ``get_current_user`` with the principal cache warm (a working set of keys
+  smaller than API_KEY_CACHE_SIZE, the usual case) and with every call
+  missing it.
+
+Timing uses ``measure`` from benchmarks.bench_data_layer, so the columns
+read the same. A flat row means lookups cost the same however many keys
+exist.
+
+Usage:
+    python -m benchmarks.bench_auth [--sizes 1000,10000,50000] [--working-set 256]
+        [--rounds 7] [--output results.json]
+"""
+import argparse
+import json
+import random
+import time
+
+from fastapi import HTTPException
+
+from api.core.auth import get_current_user, principal_cache, resolve_principal
+from api.core.keys import api_keys, hash_key
+from api.db.models import STORE_BACKEND
+from benchmarks.bench_data_layer import measure
+
+
+def unauthorized(api_key: str):
+    try:
+        get_current_user(api_key=api_key, user_id=None)
+    except HTTPException:
+        pass
+    else:
+        raise AssertionError("unknown key was accepted")
+
+
+def benchmarks_at_size(keys: list, working_set: int, rng: random.Random) -> dict:
+    """Benchmark name -> zero-argument callable, against the registry at the current size"""
+    hot = rng.sample(keys, min(working_set, len(keys)))
+    unbound, _ = api_keys.issue("user", None, "bench unbound")
+    unbound_hash = hash_key(unbound)
+    cursor = iter(range(1 << 62))
+
+    def nth(values):
+        return values[next(cursor) % len(values)]
+
+    hot_hashes = [hash_key(key) for key in hot]
+    for key in hot:
+        get_current_user(api_key=key, user_id=None)
+
+    def uncached():
+        principal_cache.clear()
+        return get_current_user(api_key=nth(hot), user_id=None)
+
+    return {
+        "hash_key": lambda: hash_key(nth(hot)),
+        "resolve_principal[bound]": lambda: resolve_principal(nth(hot_hashes), None),
+        "resolve_principal[unbound]": lambda: resolve_principal(unbound_hash, "user_1"),
+        "get_current_user[cached]": lambda: get_current_user(api_key=nth(hot), user_id=None),
+        "get_current_user[uncached]": uncached,
+        "get_current_user[unknown key]": lambda: unauthorized("mm_not-a-key"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Comma-separated numbers of issued keys")
+    parser.add_argument("--working-set", type=int, default=256, help="Distinct keys making requests")
+    parser.add_argument("--rounds", type=int, default=7, help="Timed rounds per benchmark")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    sizes = sorted(int(s) for s in args.sizes.split(","))
+    keys = []
+    results = {}
+
+    for size in sizes:
+        start = time.perf_counter()
+        while len(keys) < size:
+            key, _ = api_keys.issue("user", f"user_{len(keys) + 1}", "bench")
+            keys.append(key)
+        print(f"\n{len(keys):,} issued keys ({STORE_BACKEND} store, issued in {time.perf_counter() - start:.1f}s)")
+        print(f"{'benchmark':<34} {'min':>10} {'median':>10} {'mean':>10} {'stddev':>10} {'ops/s':>12}")
+        for name, func in benchmarks_at_size(keys, args.working_set, rng).items():
+            stats = measure(func, args.rounds)
+            results.setdefault(name, {})[size] = stats
+            print(f"{name:<34} {stats['min_us']:>8.2f}us {stats['median_us']:>8.2f}us {stats['mean_us']:>8.2f}us "
+                  f"{stats['stddev_us']:>8.2f}us {stats['ops']:>12,.0f}")
+
+    print(f"\nMedian per call by number of issued keys")
+    print(f"{'benchmark':<34}" + "".join(f"{size:>12,}" for size in sizes))
+    for name, by_size in results.items():
+        print(f"{name:<34}" + "".join(f"{by_size[size]['median_us']:>10.2f}us" for size in sizes))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"store_backend": STORE_BACKEND, "working_set": args.working_set, "seed": args.seed,
+                       "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Cold-start benchmark: time to the first successful meal log
+
+Starts a fresh ``uvicorn api.main:app`` process, as a sleeping instance
+would be woken, and measures from process launch until:
+
+- the server accepts connections and registers a user,
+- the first ``POST /api/v1/meals/log`` succeeds,
+- the first ``GET /openapi.json`` (what /docs loads) returns.
+
+It also times each of these requests on its own. Each configuration runs
+``--runs`` times (interleaved) and the medians are reported:
+
+- ``baseline``: no startup warm-up (WARMUP_ENABLED=false) and the OpenAPI
+  schema built on first request (OPENAPI_PREBUILT=false),
+- ``optimized``: the defaults, i.e. warm-up at startup plus the prebuilt
+  schema when it exists (build it with ``python -m api.core.openapi``).
+
+Usage:
+    python -m benchmarks.bench_cold_start [--runs 5]
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+CONFIGURATIONS = {
+    "baseline": {"WARMUP_ENABLED": "false", "OPENAPI_PREBUILT": "false"},
+    "optimized": {},
+}
+
+USER = {"name": "Cold Start", "age": 30, "weight": 70, "height": 175, "gender": "male"}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def cold_start(extra_env: dict, timeout: float = 60) -> dict:
+    """Launch a server and time the first register, meal log and OpenAPI requests (seconds)"""
+    port = free_port()
+    env = {**os.environ, "LOG_LEVEL": "WARNING", **extra_env}
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--no-access-log", "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(base_url=base, timeout=30) as client:
+            while True:
+                if time.perf_counter() - start > timeout or server.poll() is not None:
+                    raise RuntimeError("server did not come up")
+                try:
+                    request_start = time.perf_counter()
+                    user_id = client.post("/api/v1/users/register", json=USER).raise_for_status().json()["userId"]
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.005)
+            registered = time.perf_counter()
+
+            meal = {"userId": user_id, "meal": "lunch", "items": ["rice", "dal"]}
+            client.post("/api/v1/meals/log", json=meal).raise_for_status()
+            logged = time.perf_counter()
+
+            client.get("/openapi.json").raise_for_status()
+            schema = time.perf_counter()
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "to_first_register": registered - start,
+        "first_register": registered - request_start,
+        "to_first_meal_log": logged - start,
+        "first_meal_log": logged - registered,
+        "first_openapi": schema - logged,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Server starts per configuration")
+    args = parser.parse_args()
+
+    # Interleaved, so drift in machine load affects every configuration alike
+    runs = {name: [] for name in CONFIGURATIONS}
+    for _ in range(args.runs):
+        for name, extra_env in CONFIGURATIONS.items():
+            runs[name].append(cold_start(extra_env))
+    results = {
+        name: {key: statistics.median(run[key] for run in config_runs) for key in config_runs[0]}
+        for name, config_runs in runs.items()
+    }
+
+    keys = list(next(iter(results.values())))
+    print(f"Median of {args.runs} cold starts (ms)")
+    print(f"{'':>18}" + "".join(f"{name:>12}" for name in results))
+    for key in keys:
+        print(f"{key:>18}" + "".join(f"{result[key] * 1e3:12.1f}" for result in results.values()))
+
+
+if __name__ == "__main__":
+    main()
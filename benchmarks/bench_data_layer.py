@@ -0,0 +1,171 @@
+"""
+Data-layer microbenchmarks across store sizes
+
+Grows the configured store (STORE_BACKEND, in-memory by default) with users
+from benchmarks.workload to each size in ``--sizes`` and times, at every
+size:
+
+- ``get_user_by_identifier`` by userId, by name, by email and for an unknown
+  identifier,
+- ``update_user_activity``,
+- ``resolve_food`` for exact, differently-written and unknown names,
+- ``calculate_bmr``,
+- the status aggregation (``get_user_meals`` plus ``aggregate_meals``, as in
+  get_status) for a user whose history is as long as the current size.
+
+Each benchmark is calibrated to run long enough per round, repeated for
+``--rounds`` rounds, and summarized pytest-benchmark style (min, median,
+mean, stddev, ops/s). The final table shows the median of every benchmark
+per size, so scaling curves can be read across a row.
+
+Usage:
+    python -m benchmarks.bench_data_layer [--sizes 1000,10000,100000] [--days 30]
+        [--rounds 7] [--output results.json]
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import date
+
+from api.db.models import STORE_BACKEND, get_user_by_identifier, store, update_user_activity
+from api.db.food_data import resolve_food
+from api.routers.nutrition import aggregate_meals
+from api.utils.utils import calculate_bmr
+from benchmarks.workload import FoodPopularity, generate_meals, generate_user
+
+FOOD_NAMES = ("rice", "Sweet Potato", "eggs", "apples", "Greek-Yogurt", "dragonfruit")
+
+
+def measure(func, rounds: int, round_time: float = 0.05) -> dict:
+    """Time `func` over `rounds` rounds of enough calls to last about `round_time` seconds each"""
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        if time.perf_counter() - start >= round_time / 5 or calls >= 1 << 20:
+            break
+        calls *= 4
+    elapsed = time.perf_counter() - start
+    calls = max(1, int(calls * round_time / max(elapsed, 1e-9)))
+
+    per_call = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        per_call.append((time.perf_counter() - start) / calls)
+
+    median = statistics.median(per_call)
+    return {
+        "calls_per_round": calls,
+        "min_us": round(min(per_call) * 1e6, 3),
+        "median_us": round(median * 1e6, 3),
+        "mean_us": round(statistics.fmean(per_call) * 1e6, 3),
+        "stddev_us": round(statistics.pstdev(per_call) * 1e6, 3),
+        "ops": round(1 / median, 1)
+    }
+
+
+class StoreGrower:
+    """Adds generated users (and their meals) to the global store up to a target size"""
+
+    def __init__(self, rng: random.Random, days: int):
+        self.rng = rng
+        self.days = days
+        self.foods = FoodPopularity(rng)
+        self.user_ids = []
+        self.records = []
+
+    def grow(self, users: int):
+        while len(self.user_ids) < users:
+            record = generate_user(self.rng, len(self.user_ids) + 1)
+            user_id = store.create_user(record)
+            meals = generate_meals(self.rng, user_id, self.days, self.foods)
+            if meals:
+                store.add_meals(user_id, meals)
+            self.user_ids.append(user_id)
+            self.records.append(record)
+
+    def history_user(self, meals: int) -> str:
+        """A new user with exactly `meals` meals spread over the history window"""
+        user_id = store.create_user(generate_user(self.rng, 10 ** 9 + meals))
+        history = []
+        while len(history) < meals:
+            history.extend(generate_meals(self.rng, user_id, self.days, self.foods))
+        store.add_meals(user_id, history[:meals])
+        return user_id
+
+
+def benchmarks_at_size(grower: StoreGrower, size: int, rng: random.Random) -> dict:
+    """Benchmark name -> zero-argument callable, against the store at the current size"""
+    sample = rng.sample(range(len(grower.user_ids)), min(256, len(grower.user_ids)))
+    ids = [grower.user_ids[i] for i in sample]
+    names = [grower.records[i]["name"] for i in sample]
+    emails = [grower.records[i]["email"] for i in sample if grower.records[i]["email"]] or names
+    profiles = [grower.records[i] for i in sample]
+    history_user = grower.history_user(size)
+    cursor = iter(range(1 << 62))
+
+    def nth(values):
+        return values[next(cursor) % len(values)]
+
+    def bmr():
+        profile = nth(profiles)
+        return calculate_bmr(profile["gender"], profile["weight"], profile["height"], profile["age"])
+
+    return {
+        "get_user_by_identifier[userId]": lambda: get_user_by_identifier(nth(ids)),
+        "get_user_by_identifier[name]": lambda: get_user_by_identifier(nth(names)),
+        "get_user_by_identifier[email]": lambda: get_user_by_identifier(nth(emails)),
+        "get_user_by_identifier[unknown]": lambda: get_user_by_identifier("nobody@example.com"),
+        "update_user_activity": lambda: update_user_activity(nth(ids)),
+        "resolve_food": lambda: resolve_food(nth(FOOD_NAMES)),
+        "calculate_bmr": bmr,
+        "status_aggregation[all time]": lambda: aggregate_meals(store.get_user_meals(history_user)),
+        "status_aggregation[today]": lambda: aggregate_meals(store.get_user_meals(history_user, date.today())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="Comma-separated store sizes in users (also the history length for status aggregation)")
+    parser.add_argument("--days", type=int, default=30, help="Days of meal history per generated user")
+    parser.add_argument("--rounds", type=int, default=7, help="Timed rounds per benchmark")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    grower = StoreGrower(rng, args.days)
+    sizes = sorted(int(s) for s in args.sizes.split(","))
+    results = {}
+
+    for size in sizes:
+        start = time.perf_counter()
+        grower.grow(size)
+        print(f"\n{store.count_users():,} users, {store.count_meals():,} meals ({STORE_BACKEND} store, "
+              f"grown in {time.perf_counter() - start:.1f}s)")
+        print(f"{'benchmark':<34} {'min':>10} {'median':>10} {'mean':>10} {'stddev':>10} {'ops/s':>12}")
+        for name, func in benchmarks_at_size(grower, size, rng).items():
+            stats = measure(func, args.rounds)
+            results.setdefault(name, {})[size] = stats
+            print(f"{name:<34} {stats['min_us']:>8.2f}us {stats['median_us']:>8.2f}us {stats['mean_us']:>8.2f}us "
+                  f"{stats['stddev_us']:>8.2f}us {stats['ops']:>12,.0f}")
+
+    print(f"\nMedian per call by store size (users; history length for status aggregation)")
+    print(f"{'benchmark':<34}" + "".join(f"{size:>12,}" for size in sizes))
+    for name, by_size in results.items():
+        print(f"{name:<34}" + "".join(f"{by_size[size]['median_us']:>10.2f}us" for size in sizes))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"store_backend": STORE_BACKEND, "days": args.days, "seed": args.seed, "results": results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Import-time budget for the app
+
+Imports ``api.main`` in a fresh interpreter under ``python -X importtime``
+``--runs`` times and reports the median total import time, plus the modules
+with the largest cumulative import time (including the modules they import),
+from the fastest run. Everything a worker imports before it can serve
+its first request is in here, so this is the part of a cold start that the
+code controls.
+
+Exits non-zero when the median exceeds ``--budget-ms``, so CI can guard
+against a heavy dependency creeping into the startup path; import it lazily
+where it is used instead (as the Telegram router does with httpx).
+
+Usage:
+    python -m benchmarks.bench_import_time [--budget-ms 1000] [--runs 5] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+MODULE = "api.main"
+
+
+def import_times(module: str) -> dict:
+    """Module name -> (self, cumulative) import time in microseconds, from one fresh interpreter"""
+    env = {**os.environ, "LOG_LEVEL": "WARNING"}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=env, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nested imports are indented; the same module is only imported once per process
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=1000, help="Maximum median import time of api.main")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure")
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    args = parser.parse_args()
+
+    runs = [import_times(MODULE) for _ in range(args.runs)]
+    totals = [run[MODULE][1] / 1000 for run in runs]
+    total_ms = statistics.median(totals)
+    fastest = runs[totals.index(min(totals))]
+
+    print(f"{'module':<48} {'self ms':>9} {'cumul. ms':>10}")
+    slowest = sorted(fastest.items(), key=lambda item: item[1][1], reverse=True)[:args.top]
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"{name:<48} {self_us / 1000:>9.1f} {cumulative_us / 1000:>10.1f}")
+
+    print(f"\nimport {MODULE}: median {total_ms:.0f} ms over {args.runs} runs "
+          f"(min {min(totals):.0f}, max {max(totals):.0f}); budget {args.budget_ms:g} ms")
+    if total_ms > args.budget_ms:
+        sys.exit(f"Import time budget exceeded by {total_ms - args.budget_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
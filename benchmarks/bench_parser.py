@@ -0,0 +1,90 @@
+"""
+Webhook message parser benchmark
+
+Parses a corpus of realistic chat messages with the compiled grammar in
+api.utils.message_parser and, for reference, with the legacy single-meal
+``re.match(r"log (\\w+): (.+)")`` approach the webhook used before.
+
+Usage:
+    python -m benchmarks.bench_parser [--rounds 2000]
+"""
+import argparse
+import re
+import time
+
+from api.db.food_data import resolve_food
+from api.utils.message_parser import MessageParseError, parse_meal_message
+
+CORPUS = [
+    "log lunch: rice, dal",
+    "log breakfast: oats, banana, milk",
+    "log dinner: roti, paneer, spinach",
+    "log snack: apple",
+    "breakfast: 2 eggs, oats 50g; lunch: rice 200g, dal",
+    "Breakfast: 2 idli, sambar 150 g\nLunch: 2 roti, rajma 1 bowl\nDinner: biryani 300g",
+    "log lunch: 200g rice, a bowl of dal, 1 cup yogurt",
+    "snacks: almonds 30g + 1 banana",
+    "dinner: chicken breast 180g, broccoli 100g and sweet potato 150g",
+    "log breakfast: 1/2 cup oats, 1 glass milk, 2 bananas",
+    "lunch: quinoa 120 grams, tofu 100 grams, tomatoes x2",
+    "breakfast: dosa; lunch: 2 roti, chole; snack: peanuts 25g; dinner: fish 200g, rice",
+    "log dinner: 2 pcs roti, paneer 0.2 kg",
+    "snack: grapes 1 cup, walnuts 15g",
+    "log lunch: pasta, cheese 40g",
+    # Malformed messages exercise the error paths
+    "hello there",
+    "brunch: rice",
+    "lunch: ",
+]
+
+LEGACY_RE = r"log (\w+): (.+)"
+
+
+def legacy_parse(message: str):
+    """Previous webhook parsing: one meal per message, no quantities"""
+    match = re.match(LEGACY_RE, message)
+    if not match:
+        return None
+    return match.group(1), [item.strip() for item in match.group(2).split(",")]
+
+
+def compiled_parse(message: str):
+    try:
+        return parse_meal_message(message)
+    except MessageParseError:
+        return None
+
+
+def run(func, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in CORPUS:
+            func(message)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000, help="Passes over the message corpus")
+    args = parser.parse_args()
+
+    # Coverage summary: what each parser extracts from the corpus
+    legacy_meals = sum(1 for m in CORPUS if legacy_parse(m))
+    parsed = [compiled_parse(m) for m in CORPUS]
+    compiled_meals = sum(len(p) for p in parsed if p)
+    compiled_items = sum(len(meal.items) for p in parsed if p for meal in p)
+    resolved_items = sum(1 for p in parsed if p for meal in p for item in meal.items if resolve_food(item.name))
+
+    print(f"Corpus: {len(CORPUS)} messages")
+    print(f"  legacy parser:   {legacy_meals} meals")
+    print(f"  compiled parser: {compiled_meals} meals, {compiled_items} items ({resolved_items} resolved to foods)")
+
+    rounds = args.rounds
+    total = rounds * len(CORPUS)
+    for name, func in (("legacy", legacy_parse), ("compiled", compiled_parse)):
+        elapsed = run(func, rounds)
+        print(f"{name:>9}: {total / elapsed:>10,.0f} msgs/s  {elapsed / total * 1e6:6.2f} us/msg")
+
+
+if __name__ == "__main__":
+    main()
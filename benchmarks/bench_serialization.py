@@ -0,0 +1,112 @@
+"""
+Response serialization benchmark for large meal histories
+
+Measures the per-request cost of turning a ``GET /meals/{userId}`` payload into
+response bytes, for growing meal histories:
+
+- ``default``: a route declared with ``response_model=dict`` (output
+  validation plus FastAPI's serialization).
+- ``encoder``: a route without a response_model (jsonable_encoder +
+  JSONResponse).
+- ``fast``: a route returning FastJSONResponse from api.core.responses
+  (orjson when installed).
+
+Every variant is timed end to end through a small FastAPI app driven by the
+test client, so the request overhead the fast path does not touch is included.
+The ``encoder`` and ``fast`` variants are also timed as bare serialization.
+
+Usage:
+    python -m benchmarks.bench_serialization [--sizes 100,1000,10000] [--requests 50]
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from api.core import responses
+from api.core.responses import FastJSONResponse
+from api.db.food_data import food_db
+
+MEAL_TYPES = ("breakfast", "lunch", "dinner", "snack")
+
+
+def build_history(size: int) -> dict:
+    """A get_meals payload with `size` meals shaped like the store's entries"""
+    foods = list(food_db)
+    today = date.today()
+    meals = []
+    for i in range(size):
+        items = [foods[(i + k) % len(foods)] for k in range(3)]
+        meals.append({
+            "userId": "user_1",
+            "meal": MEAL_TYPES[i % len(MEAL_TYPES)],
+            "items": items,
+            "portions": [{"item": item, "quantity": 1, "unit": "serving", "grams": 100} for item in items],
+            "loggedAt": today - timedelta(days=i // 4),
+            "nutrition": {
+                nutrient: round(sum(food_db[item][nutrient] for item in items), 2)
+                for nutrient in ("calories", "protein", "carbs", "fiber")
+            }
+        })
+    return {"userId": "user_1", "meals": meals}
+
+
+def build_app(payload: dict) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/default", response_model=dict)
+    def default():
+        return payload
+
+    @app.get("/encoder")
+    def encoder():
+        return payload
+
+    @app.get("/fast", response_class=FastJSONResponse)
+    def fast():
+        return FastJSONResponse(payload)
+
+    return app
+
+
+def time_per_call(func, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000", help="Comma-separated meal history sizes")
+    parser.add_argument("--requests", type=int, default=50, help="Requests per variant and size")
+    args = parser.parse_args()
+
+    print(f"Fast path encoder: {'orjson' if responses.orjson is not None else 'stdlib json (install orjson for more)'}")
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        payload = build_history(size)
+        body_size = len(FastJSONResponse(payload).body)
+        serializers = {
+            "default": None,
+            "encoder": lambda: JSONResponse(jsonable_encoder(payload)),
+            "fast": lambda: FastJSONResponse(payload),
+        }
+        client = TestClient(build_app(payload))
+
+        print(f"\n{size} meals ({body_size / 1024:,.0f} KiB)")
+        print(f"{'variant':>9}  {'serialize':>12}  {'end to end':>12}")
+        baseline = None
+        for name, serialize in serializers.items():
+            serialize_ms = f"{time_per_call(serialize, args.requests) * 1e3:9.3f} ms" if serialize else f"{'-':>12}"
+            request_ms = time_per_call(lambda: client.get(f"/{name}"), args.requests) * 1e3
+            baseline = baseline or request_ms
+            print(f"{name:>9}  {serialize_ms}  {request_ms:9.3f} ms  ({baseline / request_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
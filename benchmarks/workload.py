@@ -0,0 +1,175 @@
+"""
+Synthetic workload generator
+
+Creates users and meal histories with a production-like shape and writes them
+as a snapshot file (see api/db/snapshot.py) that the app loads at startup
+with ``STORE_SNAPSHOT=<file>``, or that ``benchmarks.bench_app --snapshot``
+preloads.
+
+- Profiles follow the UserCreate fields and are validated by it: gender,
+  age, height, weight (from a BMI distribution), activity level and goal
+  are drawn from weighted distributions, and most users have an email.
+- Each user has an engagement level (Beta distributed). It decides on how
+  many of the N days they log anything, so a few heavy loggers and a long
+  tail of occasional ones emerge.
+- On a logging day each meal type appears with its own probability
+  (snacks are the least regular), with 1-4 items per meal.
+- Food popularity is Zipf distributed over a seeded ranking of the
+  catalog, so a handful of staples dominate like they do in real logs.
+
+Usage:
+    python -m benchmarks.workload --users 10000 --days 90 --out workload.jsonl.gz
+        [--zipf 1.1] [--seed 42]
+"""
+import argparse
+import bisect
+import itertools
+import random
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Tuple
+
+from api.db.food_data import food_db
+from api.db.snapshot import write_snapshot
+from api.schemas.user import UserCreate
+
+FIRST_NAMES = ("Aarav", "Aditi", "Arjun", "Diya", "Ishaan", "Kavya", "Meera", "Neha", "Priya", "Rahul",
+               "Rohan", "Sanjay", "Sara", "Tara", "Vikram", "Anna", "David", "Maria", "James", "Li")
+LAST_NAMES = ("Sharma", "Patel", "Iyer", "Reddy", "Gupta", "Nair", "Singh", "Das", "Menon", "Rao",
+              "Khan", "Bose", "Joshi", "Kumar", "Smith", "Garcia", "Chen", "Müller", "Silva", "Ali")
+
+GENDERS = (("male", 0.49), ("female", 0.49), ("other", 0.02))
+ACTIVITY_LEVELS = (("sedentary", 0.30), ("light", 0.30), ("moderate", 0.25), ("active", 0.10), ("very_active", 0.05))
+GOALS = (("lose_weight", 0.40), ("maintain", 0.35), ("build_muscle", 0.15), ("gain_weight", 0.10))
+EMAIL_RATE = 0.7
+
+# Mean and standard deviation of height (cm) by gender
+HEIGHTS = {"male": (175.5, 7.0), "female": (162.0, 6.5), "other": (169.0, 8.0)}
+
+# Probability that a meal type is logged on a logging day, and its item count range
+MEAL_MIX = {"breakfast": (0.80, 1, 3), "lunch": (0.90, 2, 4), "dinner": (0.90, 2, 4), "snack": (0.45, 1, 2)}
+
+NUTRIENTS = ("calories", "protein", "carbs", "fiber")
+
+
+def _weighted(rng: random.Random, choices) -> str:
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+def _clamp(value: float, low: float, high: float) -> float:
+    return max(low, min(high, value))
+
+
+class FoodPopularity:
+    """Zipf-distributed food picker over a seeded popularity ranking of the catalog"""
+
+    def __init__(self, rng: random.Random, exponent: float = 1.1):
+        self.ranking = list(food_db)
+        rng.shuffle(self.ranking)
+        self.cumulative = list(itertools.accumulate(1 / rank ** exponent for rank in range(1, len(self.ranking) + 1)))
+
+    def pick(self, rng: random.Random, count: int) -> List[str]:
+        """`count` distinct foods, popular ones more likely"""
+        picked = []
+        while len(picked) < count:
+            food = self.ranking[bisect.bisect_left(self.cumulative, rng.random() * self.cumulative[-1])]
+            if food not in picked:
+                picked.append(food)
+        return picked
+
+
+def generate_user(rng: random.Random, index: int) -> dict:
+    """A user record as register_user stores it, validated by UserCreate"""
+    gender = _weighted(rng, GENDERS)
+    mean, sd = HEIGHTS[gender]
+    height = round(_clamp(rng.gauss(mean, sd), 140, 210), 1)
+    bmi = _clamp(rng.gauss(25.5, 4.5), 17, 45)
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    profile = UserCreate(
+        # The suffix keeps names unique, since users can be looked up by name
+        name=f"{first} {last} {index}",
+        email=f"{first}.{last}.{index}@example.com".lower() if rng.random() < EMAIL_RATE else None,
+        age=int(_clamp(rng.gauss(38, 12), 18, 80)),
+        weight=round(bmi * (height / 100) ** 2, 1),
+        height=height,
+        gender=gender,
+        activity_level=_weighted(rng, ACTIVITY_LEVELS),
+        goal=_weighted(rng, GOALS)
+    )
+    return {**profile.model_dump(), "registeredAt": datetime.now().isoformat()}
+
+
+def generate_meals(rng: random.Random, user_id: str, days: int, foods: FoodPopularity,
+                   today: date = None) -> List[dict]:
+    """One user's meals over the last `days` days, oldest first, shaped like log_meal's entries"""
+    today = today or date.today()
+    engagement = rng.betavariate(2, 3)
+    meals = []
+    for offset in range(days - 1, -1, -1):
+        if rng.random() >= engagement:
+            continue
+        logged_at = today - timedelta(days=offset)
+        for meal_type, (probability, low, high) in MEAL_MIX.items():
+            if rng.random() >= probability:
+                continue
+            items = foods.pick(rng, rng.randint(low, high))
+            meals.append({
+                "userId": user_id,
+                "meal": meal_type,
+                "items": items,
+                "loggedAt": logged_at,
+                "nutrition": {n: round(sum(food_db[item][n] for item in items), 2) for n in NUTRIENTS}
+            })
+    return meals
+
+
+def generate_workload(users: int, days: int, rng: random.Random,
+                      zipf: float = 1.1) -> Iterator[Tuple[str, dict, list]]:
+    """(userId, profile, meals) for `users` users, as write_snapshot expects"""
+    foods = FoodPopularity(rng, zipf)
+    today = date.today()
+    for index in range(1, users + 1):
+        user_id = f"user_{index}"
+        yield user_id, generate_user(rng, index), generate_meals(rng, user_id, days, foods, today)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000, help="Users to generate")
+    parser.add_argument("--days", type=int, default=90, help="Days of meal history, ending today")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of food popularity")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="workload.jsonl.gz", help="Snapshot file (.gz to compress)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    food_counts = Counter()
+    meals_per_user = []
+
+    def tally(workload):
+        for user_id, record, meals in workload:
+            meals_per_user.append(len(meals))
+            for meal in meals:
+                food_counts.update(meal["items"])
+            yield user_id, record, meals
+
+    start = time.perf_counter()
+    users, meals = write_snapshot(args.out, tally(generate_workload(args.users, args.days, rng, args.zipf)),
+                                  generator="benchmarks.workload", users=args.users, days=args.days,
+                                  zipf=args.zipf, seed=args.seed)
+    print(f"Wrote {users:,} users and {meals:,} meals to {args.out} in {time.perf_counter() - start:.1f}s")
+
+    if meals_per_user:
+        ordered = sorted(meals_per_user)
+        print(f"Meals per user: median {ordered[len(ordered) // 2]}, p95 {ordered[int(len(ordered) * 0.95)]}, "
+              f"max {ordered[-1]}")
+    total_items = sum(food_counts.values())
+    if total_items:
+        top = ", ".join(f"{food} {count / total_items:.1%}" for food, count in food_counts.most_common(5))
+        print(f"Most logged foods: {top}")
+
+
+if __name__ == "__main__":
+    main()
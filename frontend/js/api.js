@@ -138,6 +138,20 @@ class APIClient {
         return this.request(endpoint);
     }
 
+    // Dashboard: profile, BMR/TDEE, today's meals and 7-day trend in one request
+    async getDashboard(userId) {
+        return this.request(`/dashboard/${encodeURIComponent(userId)}`);
+    }
+
+    // Live updates (server-sent events) - returns the EventSource so callers can close it
+    subscribeToUserStream(userId, onEvent) {
+        const source = new EventSource(`${this.baseURL}/stream/${encodeURIComponent(userId)}`);
+        ['snapshot', 'meal_logged', 'resync'].forEach(type => {
+            source.addEventListener(type, (event) => onEvent(type, JSON.parse(event.data)));
+        });
+        return source;
+    }
+
     // User management functions
     async getPublicUsers() {
         return this.request('/users/public', {
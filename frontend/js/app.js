@@ -87,6 +87,7 @@ async function performLogin() {
 
 function logout() {
     loggedInUser = null;
+    closeDashboardStream();
     document.getElementById('loggedInUser').style.display = 'none';
     document.getElementById('logoutBtn').style.display = 'none';
     document.getElementById('dashboardTab').style.display = 'none';
@@ -540,7 +541,7 @@ async function sendWebhook() {
         const response = await api.sendWebhookMessage(message);
         if (response.success) {
             showMessage('Webhook message sent successfully', 'success');
-            loadUserDashboard(); // Refresh the dashboard after sending the message
+            // The dashboard picks up the new meals from its live stream
         } else {
             showMessage(`Webhook response error: ${response.data.message}`, 'error');
         }
@@ -555,31 +556,26 @@ document.addEventListener('DOMContentLoaded', () => {
 });
 
 // Dashboard Functions
+let dashboardStream = null;
+
 async function loadUserDashboard() {
     try {
         const userId = window.currentUser.userId;
-        const today = new Date().toISOString().split('T')[0];
 
-        // Fetch meals and nutrition status
-        const mealsResponse = await api.request(`/meals/${userId}?on_date=${today}`);
-        const nutritionResponse = await api.request(`/nutrition/status/${userId}?on_date=${today}`);
+        // Fetch today's meals and totals in a single request
+        const dashboardResponse = await api.getDashboard(userId);
 
-        if (mealsResponse.success && nutritionResponse.success) {
+        if (dashboardResponse.success) {
             // Update meal history
             const mealHistory = document.getElementById('mealHistory');
             mealHistory.innerHTML = '';
-            mealsResponse.data.meals.forEach(meal => {
-                const mealItem = document.createElement('li');
-                mealItem.textContent = `${meal.meal} - ${meal.items.join(', ')} (Logged at: ${meal.loggedAt})`;
-                mealHistory.appendChild(mealItem);
-            });
+            appendMealHistory(dashboardResponse.data.today.meals);
 
             // Update nutrient intake overview
-            const nutrientIntake = nutritionResponse.data.nutrient_intake;
-            document.getElementById('caloriesIntake').textContent = nutrientIntake.calories;
-            document.getElementById('proteinIntake').textContent = nutrientIntake.protein;
-            document.getElementById('carbsIntake').textContent = nutrientIntake.carbs;
-            document.getElementById('fiberIntake').textContent = nutrientIntake.fiber;
+            updateNutrientIntake(dashboardResponse.data.today.nutrient_intake);
+
+            // Keep the dashboard current from the live stream instead of refetching
+            subscribeDashboardUpdates(userId);
         } else {
             showMessage('Error loading dashboard data', 'error');
         }
@@ -588,6 +584,49 @@ async function loadUserDashboard() {
     }
 }
 
+function appendMealHistory(meals) {
+    const mealHistory = document.getElementById('mealHistory');
+    meals.forEach(meal => {
+        const mealItem = document.createElement('li');
+        mealItem.textContent = `${meal.meal} - ${meal.items.join(', ')} (Logged at: ${meal.loggedAt})`;
+        mealHistory.appendChild(mealItem);
+    });
+}
+
+function updateNutrientIntake(nutrientIntake) {
+    document.getElementById('caloriesIntake').textContent = nutrientIntake.calories;
+    document.getElementById('proteinIntake').textContent = nutrientIntake.protein;
+    document.getElementById('carbsIntake').textContent = nutrientIntake.carbs;
+    document.getElementById('fiberIntake').textContent = nutrientIntake.fiber;
+}
+
+function subscribeDashboardUpdates(userId) {
+    if (dashboardStream && dashboardStream.userId === userId) {
+        return; // Already subscribed
+    }
+    closeDashboardStream();
+
+    const today = new Date().toISOString().split('T')[0];
+    dashboardStream = api.subscribeToUserStream(userId, (type, event) => {
+        if (type === 'resync') {
+            loadUserDashboard(); // Events were dropped, refetch once
+            return;
+        }
+        if (type === 'meal_logged') {
+            appendMealHistory(event.meals.filter(meal => meal.loggedAt === today));
+        }
+        updateNutrientIntake(event.daily.nutrient_intake);
+    });
+    dashboardStream.userId = userId;
+}
+
+function closeDashboardStream() {
+    if (dashboardStream) {
+        dashboardStream.close();
+        dashboardStream = null;
+    }
+}
+
 // Admin Functions
 async function adminViewUserBMR() {
     const selectedUserId = document.getElementById('adminUserSelect').value;
@@ -0,0 +1,80 @@
+import asyncio
+import json
+from datetime import date
+
+from fastapi import Response
+
+from api.core.coalesce import SingleFlight, coalesce
+from api.core.etag import user_etag
+from api.db.models import store
+from api.db.store import empty_nutrients
+
+
+class _Request:
+    """Just enough of a Request for user_etag: no If-None-Match"""
+    headers = {}
+
+
+def _meal(user_id: str) -> dict:
+    return {"userId": user_id, "meal": "lunch", "loggedAt": date.today(), "nutrition": empty_nutrients()}
+
+
+def test_request_after_write_does_not_join_flight_started_before_it():
+    user_id = store.create_user({"name": "Alice", "age": 30, "weight": 60, "height": 165, "gender": "female"})
+    release = asyncio.Event()
+
+    @user_etag()
+    @coalesce("test_etag_version")
+    async def endpoint(userId: str):
+        meals = store.get_user_meals(userId)
+        await release.wait()
+        return {"meals": len(meals)}
+
+    async def get():
+        response = Response()
+        result = await endpoint(etag_request=_Request(), etag_response=response, userId=user_id)
+        return result.headers["ETag"], json.loads(result.body)
+
+    async def scenario():
+        before = asyncio.create_task(get())
+        await asyncio.sleep(0)  # the leader has read the meals and is waiting
+        store.add_meals(user_id, [_meal(user_id)])
+        after = asyncio.create_task(get())
+        joined = asyncio.create_task(get())
+        await asyncio.sleep(0)
+        release.set()
+        return await before, await after, await joined
+
+    (etag_before, body_before), (etag_after, body_after), (etag_joined, body_joined) = asyncio.run(scenario())
+
+    assert etag_before != etag_after
+    assert body_before == {"meals": 0}
+    # Labelled with the post-write version, so it must include the write
+    assert body_after == {"meals": 1}
+    # Same version: shares the second flight
+    assert (etag_joined, body_joined) == (etag_after, body_after)
+
+
+def test_waiters_recompute_when_the_leader_is_cancelled():
+    group = SingleFlight("test_cancel")
+    started = []
+
+    async def compute():
+        started.append(None)
+        if len(started) == 1:
+            await asyncio.Event().wait()  # the leader blocks until cancelled
+        return b"body"
+
+    async def scenario():
+        leader = asyncio.create_task(group.do_async("key", compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(group.do_async("key", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await waiter, leader
+
+    body, leader = asyncio.run(scenario())
+
+    assert leader.cancelled()
+    assert body == b"body"
+    assert len(started) == 2
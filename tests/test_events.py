@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+
+from api.core.events import RESYNC_EVENT, Subscription
+
+
+@pytest.mark.parametrize("maxsize", [1, 2])
+def test_overflow_leaves_only_the_resync_marker(maxsize):
+    async def scenario():
+        subscription = Subscription("user_1", maxsize=maxsize)
+        for n in range(maxsize + 3):
+            subscription._offer({"type": "meal_logged", "n": n})
+        events = []
+        while not subscription.queue.empty():
+            events.append(subscription.queue.get_nowait())
+        return events, subscription.dropped
+
+    events, dropped = asyncio.run(scenario())
+
+    assert events == [RESYNC_EVENT]
+    assert dropped == maxsize + 3
+
+
+def test_events_after_a_resync_are_delivered_once_there_is_room():
+    async def scenario():
+        subscription = Subscription("user_1", maxsize=2)
+        for n in range(3):
+            subscription._offer({"n": n})
+        first = await subscription.get(timeout=1)
+        subscription._offer({"n": 3})
+        return first, await subscription.get(timeout=1)
+
+    assert asyncio.run(scenario()) == (RESYNC_EVENT, {"n": 3})
@@ -0,0 +1,25 @@
+from api.core.health import Readiness
+
+
+def test_not_ready_until_registration_is_done():
+    readiness = Readiness()
+    assert not readiness.ready
+    assert readiness.stats()["status"] == "starting"
+
+    readiness.begin("warmup")
+    readiness.finish("warmup")
+    # Steps registered later (the snapshot restore) could still be missing
+    assert not readiness.ready
+
+    readiness.registration_done()
+    assert readiness.ready
+    assert readiness.stats()["status"] == "ready"
+
+
+def test_failed_step_is_reported_before_registration_is_done():
+    readiness = Readiness()
+    readiness.begin("warmup")
+    readiness.finish("warmup", RuntimeError("boom"))
+    assert readiness.stats()["status"] == "failed"
+    readiness.registration_done()
+    assert not readiness.ready
@@ -0,0 +1,83 @@
+import pytest
+
+from api.db.food_data import resolve_food
+from api.utils.message_parser import MessageParseError, ParsedItem, ParsedMeal, parse_item, parse_meal_message
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("dal", ParsedItem("dal", 1.0, None, 100.0)),
+    ("2 eggs", ParsedItem("eggs", 2.0, None, 200.0)),
+    ("oats 50g", ParsedItem("oats", 50.0, "g", 50.0)),
+    ("200 g rice", ParsedItem("rice", 200.0, "g", 200.0)),
+    ("rice 200 g.", ParsedItem("rice", 200.0, "g", 200.0)),
+    ("1/2 cup oats", ParsedItem("oats", 0.5, "cup", 120.0)),
+    ("half cup rice", ParsedItem("rice", 0.5, "cup", 120.0)),
+    ("a bowl of dal", ParsedItem("dal", 1.0, "bowl", 250.0)),
+    ("3 of rice", ParsedItem("rice", 3.0, None, 300.0)),
+    ("tomatoes x2", ParsedItem("tomatoes", 2.0, None, 200.0)),
+    ("tomatoes x 2", ParsedItem("tomatoes", 2.0, None, 200.0)),
+    ("paneer 0.2 kg", ParsedItem("paneer", 0.2, "kg", 200.0)),
+    ("2 PCS Roti", ParsedItem("Roti", 2.0, "pcs", 200.0)),
+    ("sweet potato 150g", ParsedItem("sweet potato", 150.0, "g", 150.0)),
+])
+def test_item_quantities(text, expected):
+    assert parse_item(text) == expected
+
+
+@pytest.mark.parametrize("text, error", [
+    ("2 eggs x3", "more than one quantity"),
+    ("1/0 cup oats", "Invalid quantity"),
+    ("rice 6kg", "Implausible quantity"),
+    ("0 eggs", "Implausible quantity"),
+    ("", "Could not understand"),
+])
+def test_invalid_items(text, error):
+    with pytest.raises(MessageParseError, match=error):
+        parse_item(text)
+
+
+def test_single_meal_in_legacy_format():
+    assert parse_meal_message("log lunch: rice, dal") == [
+        ParsedMeal("lunch", [ParsedItem("rice", 1.0, None, 100.0), ParsedItem("dal", 1.0, None, 100.0)])
+    ]
+
+
+def test_meals_separated_by_semicolons_and_newlines():
+    meals = parse_meal_message("Breakfast: 2 idli\nLunch: roti & dal and rice;; snacks: almonds 30g + 1 banana")
+
+    assert [meal.meal for meal in meals] == ["breakfast", "lunch", "snack"]
+    assert [item.name for item in meals[1].items] == ["roti", "dal", "rice"]
+    assert [item.grams for item in meals[2].items] == [30.0, 100.0]
+
+
+def test_keywords_are_case_insensitive():
+    assert parse_meal_message("LOG DINNER: 2 pcs roti")[0].meal == "dinner"
+
+
+@pytest.mark.parametrize("message, error", [
+    ("hello there", "Invalid segment"),
+    ("brunch: rice", "Invalid meal type 'brunch'"),
+    ("lunch: ", "No food items provided for lunch"),
+    ("lunch: ,,", "No food items provided for lunch"),
+    ("", "Empty message"),
+    ("  ; \n", "Empty message"),
+    ("breakfast: oats; lunch: rice 6kg", "Implausible quantity"),
+])
+def test_invalid_messages(message, error):
+    with pytest.raises(MessageParseError, match=error):
+        parse_meal_message(message)
+
+
+@pytest.mark.parametrize("name, food", [
+    ("rice", "rice"),
+    ("  RICE ", "rice"),
+    ("Sweet Potato", "sweet_potato"),
+    ("sweet-potato", "sweet_potato"),
+    ("Chicken Breast", "chicken_breast"),
+    ("egg", "eggs"),
+    ("apples", "apple"),
+    ("tomato", "tomatoes"),
+    ("pizza", None),
+])
+def test_resolve_food(name, food):
+    assert resolve_food(name) == food
@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from api.db.sqlite_store import SQLiteStore
+from api.db.store import InMemoryStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    return InMemoryStore() if request.param == "memory" else SQLiteStore(str(tmp_path / "store.db"))
+
+
+def _profile(name: str, email: str) -> dict:
+    return {"name": name, "email": email, "age": 30, "weight": 60, "height": 165, "gender": "female"}
+
+
+def test_update_replaces_the_name_and_email_lookups(store):
+    user_id = store.create_user(_profile("Alice", "alice@example.com"))
+    store.update_user(user_id, {"name": "Alicia", "email": "alicia@example.com"})
+
+    assert store.find_user("Alicia")[0] == user_id
+    assert store.find_user("ALICIA@example.com")[0] == user_id
+    assert store.find_user("Alice") is None
+    assert store.find_user("alice@example.com") is None
+
+
+def test_update_keeps_lookups_taken_over_by_a_later_registration(store):
+    first = store.create_user(_profile("Sam", "sam@example.com"))
+    second = store.create_user(_profile("Sam", "sam@example.com"))
+    store.update_user(first, {"name": "Samuel", "email": "samuel@example.com"})
+
+    assert store.find_user("Sam")[0] == second
+    assert store.find_user("sam@example.com")[0] == second
+    assert store.find_user("Samuel")[0] == first
+
+
+def test_concurrent_renames_leave_only_current_lookups():
+    store = InMemoryStore(stripes=4)
+    user_ids = [store.create_user(_profile(f"user{i}", f"user{i}@example.com")) for i in range(8)]
+    barrier = threading.Barrier(len(user_ids))
+
+    def rename(index: int, user_id: str):
+        barrier.wait()
+        for round_ in range(200):
+            store.update_user(user_id, {"name": f"user{index}-{round_}", "email": f"user{index}-{round_}@example.com"})
+
+    threads = [threading.Thread(target=rename, args=(i, user_id)) for i, user_id in enumerate(user_ids)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert store._user_lookup == {f"user{i}-199": user_id for i, user_id in enumerate(user_ids)}
+    assert store._email_lookup == {f"user{i}-199@example.com": user_id for i, user_id in enumerate(user_ids)}
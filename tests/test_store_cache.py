@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from api.db.sqlite_store import SQLiteStore
+
+PROFILE = {"name": "Alice", "age": 30, "weight": 60, "height": 165, "gender": "female"}
+
+
+def test_record_read_before_another_workers_commit_is_not_cached(tmp_path):
+    path = str(tmp_path / "store.db")
+    store = SQLiteStore(path)
+    other_worker = SQLiteStore(path)
+    user_id = store.create_user(PROFILE)
+
+    # Each thread has its own connection and its own view of PRAGMA data_version
+    with ThreadPoolExecutor(1) as reader, ThreadPoolExecutor(1) as other_thread:
+        other_thread.submit(store.get_user, user_id).result()
+        store._cache_drop(user_id)
+
+        put = store._cache_put
+        interleaved = []
+
+        def racing_put(user_id, record, generation):
+            # The reader has SELECTed the old row. Before it caches it, another worker
+            # commits and another thread of this process notices, clearing the cache.
+            if not interleaved:
+                interleaved.append(None)
+                other_worker.update_user(user_id, {"name": "Bob"})
+                assert other_thread.submit(store.get_user, user_id).result()["name"] == "Bob"
+            put(user_id, record, generation)
+
+        store._cache_put = racing_put
+        assert reader.submit(store.get_user, user_id).result()["name"] == "Alice"
+        store._cache_put = put
+
+        # That thread has seen the commit, so it trusts the cache from now on
+        assert other_thread.submit(store.get_user, user_id).result()["name"] == "Bob"
+        assert reader.submit(store.get_user, user_id).result()["name"] == "Bob"
+
+
+def test_concurrent_readers_see_every_update(tmp_path):
+    path = str(tmp_path / "store.db")
+    store = SQLiteStore(path)
+    other_worker = SQLiteStore(path)
+    user_id = store.create_user({**PROFILE, "weight": 0})
+
+    def read_until(weight):
+        while store.get_user(user_id)["weight"] < weight:
+            pass
+        return weight
+
+    with ThreadPoolExecutor(4) as readers:
+        for weight in range(1, 51):
+            other_worker.update_user(user_id, {"weight": weight})
+            # Every reader thread must converge on the committed value, not a stale cached one
+            assert [f.result(timeout=5) for f in [readers.submit(read_until, weight) for _ in range(4)]] == [weight] * 4
+        assert store.get_user(user_id)["weight"] == 50